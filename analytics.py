@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+import cache
+import db
+import ledger
+import metrics
+import queries
+import rollups
+
+# --- Trend Analytics --- #
+# The database aggregates to one row per day and transaction type; everything
+# else (weekly/monthly resampling, running balance, forecast) is vectorised
+# pandas/NumPy over those buckets, so cost grows with days, not transactions.
+# Only the open fiscal period is read; balances start from the last close.
+# Every function takes the caller's fund scope (None for every fund).
+
+FREQUENCIES = {"Monthly": "MS", "Weekly": "W"}
+
+
+@metrics.timed("analytics.daily_cash_flow")
+@cache.cached(tags=("income", "expenses"))
+def daily_cash_flow(fund_ids=None):
+    fund_sql, fund_params = queries.fund_clause(fund_ids)
+    where = f"WHERE {fund_sql}" if fund_sql else ""
+    df = db.read_frame(f"""
+        SELECT 'income' AS transaction_type, date, SUM(amount) AS total_amount
+        FROM income {where} GROUP BY date
+        UNION ALL
+        SELECT 'expense' AS transaction_type, date, SUM(amount) AS total_amount
+        FROM expenses {where} GROUP BY date
+    """, fund_params * 2)
+    if df.empty:
+        return pd.DataFrame({"income": [], "expense": []}, index=pd.DatetimeIndex([], name="date"))
+    df["date"] = pd.to_datetime(df["date"])
+    df["total_amount"] = pd.to_numeric(df["total_amount"]).astype(float)
+    daily = df.pivot_table(index="date", columns="transaction_type", values="total_amount",
+                           aggfunc="sum", fill_value=0.0)
+    daily = daily.reindex(columns=["income", "expense"], fill_value=0.0).sort_index()
+    daily.columns.name = None
+    return daily
+
+
+def cash_flow(freq="MS", fund_ids=None):
+    flow = daily_cash_flow(fund_ids).resample(freq).sum()
+    flow["net"] = flow["income"] - flow["expense"]
+    flow["balance"] = float(ledger.opening_balance(fund_ids)) + flow["net"].cumsum()
+    return flow
+
+
+def monthly_history(fund_ids=None):
+    # Every month on record, closed fiscal years included, from the rollups.
+    df = rollups.monthly_totals(fund_ids)
+    if df.empty:
+        return pd.DataFrame(columns=["income", "expense", "net", "balance"])
+    df["total_amount"] = pd.to_numeric(df["total_amount"]).astype(float)
+    df["month"] = pd.to_datetime(df["month"] + "-01")
+    flow = df.pivot_table(index="month", columns="transaction_type", values="total_amount",
+                          aggfunc="sum", fill_value=0.0)
+    flow = flow.reindex(columns=["income", "expense"], fill_value=0.0)
+    flow = flow.resample("MS").sum()
+    flow.columns.name = None
+    flow["net"] = flow["income"] - flow["expense"]
+    flow["balance"] = flow["net"].cumsum()
+    return flow
+
+
+def department_heatmap(transaction_type, fund_ids=None):
+    df = rollups.matrix(transaction_type, "department", "type", fund_ids)
+    if df.empty:
+        return pd.DataFrame()
+    df["total_amount"] = pd.to_numeric(df["total_amount"]).astype(float)
+    return df.pivot_table(index="department", columns="type", values="total_amount",
+                          aggfunc="sum", fill_value=0.0)
+
+
+def forecast_balance(periods=6, fund_ids=None):
+    """Seasonal forecast of the fund balance for the next `periods` months.
+
+    Each future month's net cash flow is the average net for that calendar
+    month (shrunk towards the overall mean, since most months have only a few
+    years of history), so fee-collection peaks repeat. The band widens with
+    the residual spread. History comes from the rollups so that closed
+    fiscal years still count.
+    """
+    monthly = monthly_history(fund_ids)
+    if len(monthly) < 2:
+        return pd.DataFrame(columns=["net", "balance", "lower", "upper"])
+
+    net = monthly["net"].to_numpy()
+    months = monthly.index.month.to_numpy()
+    overall = net.mean()
+    sums = np.bincount(months, weights=net, minlength=13)
+    counts = np.bincount(months, minlength=13)
+    profile = (sums + overall) / (counts + 1)
+
+    future = pd.date_range(monthly.index[-1] + pd.offsets.MonthBegin(1), periods=periods, freq="MS")
+    forecast_net = profile[future.month.to_numpy()]
+    residuals = net - profile[months]
+    sigma = residuals.std(ddof=1) if len(net) > 2 else 0.0
+    balance = monthly["balance"].iloc[-1] + np.cumsum(forecast_net)
+    spread = sigma * np.sqrt(np.arange(1, periods + 1))
+    return pd.DataFrame(
+        {"net": forecast_net, "balance": balance, "lower": balance - spread, "upper": balance + spread},
+        index=future,
+    )
@@ -0,0 +1,476 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+import pandas as pd
+from aiohttp import web
+
+import artifacts
+import auth
+import events
+import exporter
+import frames
+import importer
+import ledger
+import metrics
+import queries
+import receipts
+import rollups
+import schema
+import tenants
+
+# --- JSON API --- #
+# A headless aiohttp server over the same data layer as the Streamlit app.
+# Database calls are blocking, so every handler runs them on the default
+# thread pool and the event loop stays free for other requests.
+
+API_SECRET = os.environ.get("FUNDS_API_SECRET") or secrets.token_hex(32)
+TOKEN_TTL = int(os.environ.get("FUNDS_API_TOKEN_TTL", "3600"))
+MAX_PAGE_SIZE = 500
+MAX_BULK_ROWS = 10000
+# Room for MAX_BULK_ROWS records with long descriptions; aiohttp's own
+# default (1 MiB) would refuse a bulk body at a few thousand rows.
+MAX_BODY_BYTES = MAX_BULK_ROWS * 1024
+WRITE_ROLES = ("accountant", "admin")
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialise {type(value).__name__}")
+
+
+def json_response(data, status=200):
+    return web.json_response(data, status=status, dumps=lambda obj: json.dumps(obj, default=_json_default))
+
+
+def error(status, message):
+    return json_response({"error": message}, status=status)
+
+
+def _frame_records(df):
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+async def blocking(func, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(None, lambda: func(*args, **kwargs))
+
+
+# --- Tokens --- #
+# Stateless bearer tokens: "user_id:role:institution:expiry" signed with
+# HMAC-SHA256, so a request costs one HMAC instead of a password hash. An
+# empty institution means the user may see every campus.
+def _sign(payload):
+    return hmac.new(API_SECRET.encode(), payload.encode(), hashlib.sha256).hexdigest()
+
+
+def issue_token(user_id, role, institution_id=None):
+    institution = "" if institution_id is None else institution_id
+    payload = f"{user_id}:{role}:{institution}:{int(time.time()) + TOKEN_TTL}"
+    return base64.urlsafe_b64encode(f"{payload}:{_sign(payload)}".encode()).decode()
+
+
+def read_token(token):
+    try:
+        fields = base64.urlsafe_b64decode(token.encode()).decode().split(":")
+        user_id, role, institution, expires, signature = fields
+    except (ValueError, UnicodeDecodeError):
+        return None
+    payload = f"{user_id}:{role}:{institution}:{expires}"
+    if not hmac.compare_digest(signature.encode(), _sign(payload).encode()) or int(expires) < time.time():
+        return None
+    return {"user_id": int(user_id), "role": role, "institution_id": int(institution) if institution else None}
+
+
+@web.middleware
+async def auth_middleware(request, handler):
+    if request.path == "/api/token":
+        return await handler(request)
+    header = request.headers.get("Authorization", "")
+    user = read_token(header[7:]) if header.startswith("Bearer ") else None
+    if user is None:
+        return error(401, "Missing or invalid bearer token")
+    if request.method != "GET" and user["role"] not in WRITE_ROLES:
+        return error(403, "This account is read-only")
+    request["user"] = user
+    return await handler(request)
+
+
+@web.middleware
+async def metrics_middleware(request, handler):
+    route = request.match_info.route.resource
+    name = f"api.{route.canonical if route is not None else 'unmatched'}"
+    with metrics.span(name):
+        return await handler(request)
+
+
+# --- Request Parsing --- #
+def _list_param(request, name):
+    return [value for item in request.query.getall(name, []) for value in item.split(",") if value]
+
+
+def _date_param(request, name):
+    value = request.query.get(name)
+    return date.fromisoformat(value) if value else None
+
+
+async def fund_scope(request):
+    # The caller's funds, optionally narrowed with ?fund=1,2; never wider
+    # than their institution.
+    scope = await blocking(tenants.fund_scope, request["user"]["institution_id"])
+    requested = [int(value) for value in _list_param(request, "fund")]
+    if not requested:
+        return scope
+    return [fund_id for fund_id in requested if scope is None or fund_id in scope]
+
+
+async def parse_filters(request):
+    return queries.make_filters(
+        _list_param(request, "transaction_type"), _list_param(request, "type"),
+        _list_param(request, "department"), _list_param(request, "status"),
+        _date_param(request, "start"), _date_param(request, "end"),
+        request.query.get("include_archived", "").lower() in ("1", "true", "yes"),
+        await fund_scope(request),
+    )
+
+
+def encode_cursor(cursor):
+    if cursor is None:
+        return None
+    last_date, kind, row_id = cursor
+    return base64.urlsafe_b64encode(json.dumps([last_date.isoformat(), kind, row_id]).encode()).decode()
+
+
+def decode_cursor(value):
+    last_date, kind, row_id = json.loads(base64.urlsafe_b64decode(value.encode()))
+    return date.fromisoformat(last_date), kind, int(row_id)
+
+
+# --- Handlers --- #
+routes = web.RouteTableDef()
+
+
+@routes.post("/api/token")
+async def create_token(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    if not isinstance(body, dict) or not all(isinstance(body.get(field, ""), str)
+                                             for field in ("username", "password")):
+        return error(400, "Expected a JSON body with username and password")
+    try:
+        ip = auth.client_ip(request.headers.get("X-Forwarded-For"), request.remote)
+        user = await blocking(auth.authenticate, body.get("username", ""), body.get("password", ""), ip)
+    except auth.LoginThrottled as e:
+        return error(429, str(e))
+    except auth.AuthBusy as e:
+        return error(503, str(e))
+    if not user:
+        return error(401, "Invalid credentials")
+    return json_response({"token": issue_token(user[0], user[2], user[3]), "expires_in": TOKEN_TTL})
+
+
+@routes.get("/api/funds")
+async def get_funds(request):
+    funds = await blocking(tenants.list_funds, request["user"]["institution_id"])
+    return json_response(_frame_records(funds))
+
+
+@routes.get("/api/balance")
+async def get_balance(request):
+    try:
+        scope = await fund_scope(request)
+    except ValueError as e:
+        return error(400, f"Invalid query: {e}")
+    balance = await blocking(ledger.get_fund_balance, scope)
+    departments = await blocking(ledger.get_department_balances, scope)
+    return json_response({"balance": balance, "departments": _frame_records(departments)})
+
+
+@routes.get("/api/breakdown/{transaction_type:income|expense}")
+async def get_breakdown(request):
+    column = request.query.get("by", "type")
+    if column not in rollups.GROUP_COLUMNS:
+        return error(400, f"'by' must be one of: {', '.join(rollups.GROUP_COLUMNS)}")
+    try:
+        scope = await fund_scope(request)
+    except ValueError as e:
+        return error(400, f"Invalid query: {e}")
+    df = await blocking(rollups.breakdown, request.match_info["transaction_type"], column, scope)
+    return json_response(_frame_records(df))
+
+
+@routes.get("/api/transactions")
+async def list_transactions(request):
+    try:
+        filters = await parse_filters(request)
+        limit = min(int(request.query.get("limit", 50)), MAX_PAGE_SIZE)
+        after = decode_cursor(request.query["cursor"]) if request.query.get("cursor") else None
+    except ValueError as e:
+        return error(400, f"Invalid query: {e}")
+    df, next_cursor = await blocking(queries.fetch_page, filters, after, limit)
+    return json_response({"items": _frame_records(frames.for_display(df)), "next_cursor": encode_cursor(next_cursor)})
+
+
+@routes.get("/api/transactions/summary")
+async def summarize_transactions(request):
+    try:
+        filters = await parse_filters(request)
+    except ValueError as e:
+        return error(400, f"Invalid query: {e}")
+    return json_response(await blocking(queries.summarize, filters))
+
+
+@routes.get("/api/transactions/export.csv")
+async def export_transactions(request):
+    try:
+        filters = await parse_filters(request)
+    except ValueError as e:
+        return error(400, f"Invalid query: {e}")
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/csv",
+        "Content-Disposition": 'attachment; filename="transactions.csv"',
+    })
+    await response.prepare(request)
+    chunks = exporter.iter_csv(filters)
+    sentinel = object()
+    try:
+        while True:
+            chunk = await blocking(next, chunks, sentinel)
+            if chunk is sentinel:
+                break
+            await response.write(chunk)
+    finally:
+        chunks.close()
+    await response.write_eof()
+    return response
+
+
+async def _records(request, single=False):
+    try:
+        body = await request.json()
+    except ValueError:
+        raise ValueError("Expected a JSON body")
+    if single:
+        if not isinstance(body, dict) or not body:
+            raise ValueError("Expected one JSON object; send lists of records to /api/transactions/bulk")
+        return [body]
+    records = body if isinstance(body, list) else [body]
+    if not records or not all(isinstance(record, dict) for record in records):
+        raise ValueError("Expected a non-empty JSON list of objects")
+    return records
+
+
+async def _validated(records, kind=None):
+    if len(records) > MAX_BULK_ROWS:
+        raise web.HTTPRequestEntityTooLarge(max_size=MAX_BULK_ROWS, actual_size=len(records))
+    chunk = pd.DataFrame.from_records(records).astype(object)
+    closed_through = await blocking(ledger.closed_through)
+    return importer.validate(chunk.where(chunk.notna(), None), kind, closed_through)
+
+
+def _rejections(rejected):
+    return [{"index": int(row) - 2, "reason": reason} for row, reason in zip(rejected["row"], rejected["reason"])]
+
+
+async def _target_fund(request):
+    # Writes go to ?fund_id=, defaulting to the first fund the caller may use.
+    scope = await blocking(tenants.fund_scope, request["user"]["institution_id"])
+    if request.query.get("fund_id"):
+        fund_id = int(request.query["fund_id"])
+    else:
+        fund_id = scope[0] if scope else ledger.FUND_ID
+    await blocking(tenants.check_fund, fund_id, request["user"]["institution_id"])
+    return fund_id
+
+
+async def _create(request, kind):
+    try:
+        fund_id = await _target_fund(request)
+        clean, rejected = await _validated(await _records(request, single=True), kind)
+    except ledger.UnknownFund as e:
+        return error(404, str(e))
+    except ValueError as e:
+        return error(400, str(e))
+    if not rejected.empty:
+        return json_response({"error": "Invalid record", "rejected": _rejections(rejected)}, status=422)
+    row = clean.iloc[0]
+    record = ledger.record_income if kind == "income" else ledger.record_expense
+    try:
+        record_id = await blocking(
+            record, row["name"], request["user"]["user_id"], row["type"], row["description"],
+            float(row["amount"]), row["date"], row["department"], row["status"], row["receipt_path"], fund_id
+        )
+    except ledger.UnknownFund as e:
+        return error(404, str(e))
+    except (ledger.InsufficientFunds, ledger.PeriodClosed) as e:
+        return error(409, str(e))
+    return json_response({"id": record_id, "transaction_type": kind}, status=201)
+
+
+@routes.post("/api/income")
+async def create_income(request):
+    return await _create(request, "income")
+
+
+@routes.post("/api/expenses")
+async def create_expense(request):
+    return await _create(request, "expense")
+
+
+@routes.post("/api/transactions/bulk")
+async def create_bulk(request):
+    # Records carry their own transaction_type; valid rows are written as one
+    # batch, exactly like the file importer.
+    try:
+        fund_id = await _target_fund(request)
+        clean, rejected = await _validated(await _records(request))
+    except ledger.UnknownFund as e:
+        return error(404, str(e))
+    except ValueError as e:
+        return error(400, str(e))
+    if not clean.empty:
+        try:
+            await blocking(importer.load_batch, clean, request["user"]["user_id"], fund_id)
+        except ledger.UnknownFund as e:
+            return error(404, str(e))
+        except (ledger.InsufficientFunds, ledger.PeriodClosed) as e:
+            return error(409, str(e))
+    return json_response({"imported": len(clean), "rejected": _rejections(rejected)},
+                         status=201 if not clean.empty else 422)
+
+
+PATH_KINDS = {"income": "income", "expenses": "expense"}
+
+
+async def _change(request, change, **fields):
+    # Status changes and reversals, limited to the caller's funds.
+    kind = PATH_KINDS[request.match_info["kind"]]
+    transaction_id = int(request.match_info["transaction_id"])
+    message = f"Expected a JSON object with string {', '.join(fields.values())}"
+    try:
+        body = await request.json()
+    except ValueError:
+        return error(400, message)
+    if not isinstance(body, dict) or not all(isinstance(body.get(field), str) for field in fields.values()):
+        return error(400, message)
+    args = [body[field] for field in fields.values()]
+    scope = await blocking(tenants.fund_scope, request["user"]["institution_id"])
+    try:
+        await blocking(change, kind, transaction_id, *args, user_id=request["user"]["user_id"], fund_ids=scope)
+    except ledger.UnknownTransaction as e:
+        return error(404, str(e))
+    except (ledger.InsufficientFunds, ledger.PeriodClosed) as e:
+        return error(409, str(e))
+    except ValueError as e:
+        return error(400, str(e))
+    return json_response({"id": transaction_id, "transaction_type": kind, **dict(zip(fields, args))})
+
+
+@routes.post(r"/api/{kind:income|expenses}/{transaction_id:\d+}/status")
+async def change_status(request):
+    return await _change(request, ledger.set_status, status="status")
+
+
+@routes.post(r"/api/{kind:income|expenses}/{transaction_id:\d+}/reverse")
+async def reverse_transaction(request):
+    return await _change(request, ledger.reverse, reason="reason")
+
+
+@routes.get(r"/api/{kind:income|expenses}/{transaction_id:\d+}/history")
+async def transaction_history(request):
+    scope = await blocking(tenants.fund_scope, request["user"]["institution_id"])
+    df = await blocking(
+        events.history, PATH_KINDS[request.match_info["kind"]], int(request.match_info["transaction_id"]), scope
+    )
+    if df.empty:
+        return error(404, "Unknown transaction")
+    return json_response(_frame_records(df))
+
+
+@routes.get("/api/events")
+async def tail_events(request):
+    # Change feed: pass next_after back as ?after= to continue.
+    try:
+        after = int(request.query.get("after", 0))
+        limit = min(int(request.query.get("limit", MAX_PAGE_SIZE)), MAX_PAGE_SIZE)
+        scope = await fund_scope(request)
+    except ValueError as e:
+        return error(400, f"Invalid query: {e}")
+    items, next_after = await blocking(events.tail, after, limit, scope)
+    return json_response({"items": items, "next_after": next_after})
+
+
+@routes.get("/api/receipts/{key}")
+async def get_receipt(request):
+    # FileResponse streams with sendfile and answers Range/If-None-Match itself.
+    # Only served to callers who may see a transaction that references it.
+    key = request.match_info["key"]
+    if not receipts.exists(key) or not await blocking(tenants.may_see_receipt, key, request["user"]["institution_id"]):
+        return error(404, "Unknown receipt")
+    return web.FileResponse(receipts.path_for(key), headers={
+        "Content-Type": receipts.content_type(key),
+        "Cache-Control": "private, max-age=31536000, immutable",
+    })
+
+
+@routes.get("/api/reports/{kind}/{period}.{format:pdf|csv}")
+async def get_report(request):
+    # Prebuilt by the scheduler; built on the spot only when missing or stale.
+    kind, period, fmt = (request.match_info[key] for key in ("kind", "period", "format"))
+    if kind not in artifacts.KINDS:
+        return error(404, "Unknown report")
+    try:
+        scope = await fund_scope(request)
+        if scope is not None and not scope:
+            return error(404, "Unknown report")
+        artifact = await blocking(artifacts.get, kind, period, fmt, scope)
+    except ValueError as e:
+        return error(400, f"Invalid query: {e}")
+    return web.FileResponse(artifact["path"], headers={
+        "Content-Type": artifacts.FORMATS[fmt][0],
+        "Content-Disposition": f'attachment; filename="{kind}_report_{period}.{fmt}"',
+        "Cache-Control": "private, no-cache",
+    })
+
+
+@routes.get("/api/metrics")
+async def get_metrics(request):
+    if request["user"]["role"] != "admin":
+        return error(403, "Admin only")
+    return web.Response(text=metrics.prometheus_text(), content_type="text/plain")
+
+
+def create_app():
+    app = web.Application(middlewares=[metrics_middleware, auth_middleware], client_max_size=MAX_BODY_BYTES)
+    app.add_routes(routes)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the university funds JSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    if "FUNDS_API_SECRET" not in os.environ:
+        print("FUNDS_API_SECRET is not set; tokens will not survive a restart.")
+    schema.ensure_schema()
+    if events.FOLLOW_ENABLED:
+        events.follow()
+    web.run_app(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
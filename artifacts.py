@@ -0,0 +1,319 @@
+import argparse
+import hashlib
+import os
+import tempfile
+import threading
+from datetime import date, timedelta
+
+import cache
+import db
+import events
+import exporter
+import fiscal
+import metrics
+import queries
+import reports
+import schema
+import tenants
+
+# --- Prebuilt Report Artifacts --- #
+# A scheduler builds the daily, monthly and fiscal-year reports (PDF and CSV)
+# ahead of time for every campus. Each file is stored once under its SHA-256
+# digest, e.g. artifacts/3f/3fa9...c2.pdf, and `report_artifacts` records
+# which file answers (kind, period, fund scope, format) along with the
+# transaction event seq it was built from. Downloads are served straight from
+# disk until an event lands in the period; the artifact is then stale and is
+# rebuilt by the next scheduler pass, or on request.
+
+ARTIFACT_DIR = os.environ.get("FUNDS_ARTIFACT_DIR", "artifacts")
+SCHEDULER_ENABLED = os.environ.get("FUNDS_REPORT_SCHEDULER", "0") == "1"
+SCHEDULE_INTERVAL = float(os.environ.get("FUNDS_REPORT_SCHEDULE_INTERVAL", "900"))
+
+KINDS = ("daily", "monthly", "fiscal")
+FORMATS = {"pdf": ("application/pdf", ".pdf"), "csv": ("text/csv", ".csv")}
+
+UPSERT_ARTIFACT = {
+    "mysql": """
+        INSERT INTO report_artifacts
+            (kind, period, scope, format, content_hash, watermark, size_bytes, row_count)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            content_hash = VALUES(content_hash), watermark = VALUES(watermark),
+            size_bytes = VALUES(size_bytes), row_count = VALUES(row_count),
+            generated_at = CURRENT_TIMESTAMP
+    """,
+    "sqlite": """
+        INSERT INTO report_artifacts
+            (kind, period, scope, format, content_hash, watermark, size_bytes, row_count)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT(kind, period, scope, format) DO UPDATE SET
+            content_hash = excluded.content_hash, watermark = excluded.watermark,
+            size_bytes = excluded.size_bytes, row_count = excluded.row_count,
+            generated_at = CURRENT_TIMESTAMP
+    """,
+}
+
+
+# --- Periods --- #
+# Periods are labelled "2024-05-17" (daily), "2024-05" (monthly) and "2024"
+# (the fiscal year starting in 2024).
+def period_bounds(kind, period):
+    if kind == "daily":
+        day = date.fromisoformat(period)
+        return day, day
+    if kind == "monthly":
+        start = date.fromisoformat(f"{period}-01")
+        next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return start, next_month - timedelta(days=1)
+    if kind == "fiscal":
+        return fiscal.period(int(period))
+    raise ValueError(f"Unknown report kind '{kind}'")
+
+
+def label(kind, period):
+    if kind == "fiscal":
+        return fiscal.label(int(period))
+    if kind == "monthly":
+        return date.fromisoformat(f"{period}-01").strftime("%B %Y")
+    return date.fromisoformat(period).strftime("%d %B %Y")
+
+
+def due_periods(today=None):
+    # What the scheduler keeps warm: the current and the previous day, month
+    # and fiscal year.
+    today = today or date.today()
+    last_month = today.replace(day=1) - timedelta(days=1)
+    fiscal_year = fiscal.fiscal_year_of(today)
+    return [
+        ("daily", (today - timedelta(days=1)).isoformat()), ("daily", today.isoformat()),
+        ("monthly", last_month.strftime("%Y-%m")), ("monthly", today.strftime("%Y-%m")),
+        ("fiscal", str(fiscal_year - 1)), ("fiscal", str(fiscal_year)),
+    ]
+
+
+def scope_key(fund_ids):
+    fund_ids = queries.scope(fund_ids)
+    return "all" if fund_ids is None else ",".join(map(str, fund_ids))
+
+
+def filters_for(kind, period, fund_ids=None):
+    # Closed years are read from the archives, so old periods still report.
+    start, end = period_bounds(kind, period)
+    return queries.make_filters(start_date=start, end_date=end, include_archived=True, fund_ids=fund_ids)
+
+
+def stale(artifact, fund_ids=None):
+    # The watermark is the event seq the artifact was built from; any later
+    # event dated inside the period (an insert, status change or reversal)
+    # makes it stale.
+    start, end = period_bounds(artifact["kind"], artifact["period"])
+    return events.changed_since(int(artifact["watermark"]), start, end, fund_ids)
+
+
+# --- Storage --- #
+def path_for(content_hash, fmt):
+    return os.path.join(ARTIFACT_DIR, content_hash[:2], content_hash + FORMATS[fmt][1])
+
+
+def _store(data, fmt):
+    digest = hashlib.sha256(data).hexdigest()
+    path = path_for(digest, fmt)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    return digest
+
+
+def render(kind, period, fmt, fund_ids=None):
+    # Returns (file bytes, transaction rows covered).
+    filters = filters_for(kind, period, fund_ids)
+    if fmt == "csv":
+        export_file, count = exporter.export(filters, "csv")
+        with export_file:
+            return export_file.read(), count
+    if fmt == "pdf":
+        pdf = reports.generate_financial_pdf(
+            reports.breakdown("income", filters=filters), reports.breakdown("expense", filters=filters),
+            f"{label(kind, period)} Financial Report", include_details=True, filters=filters
+        )
+        return pdf, queries.summarize.uncached(filters)["count"]
+    raise ValueError(f"Unknown report format '{fmt}'")
+
+
+def lookup(kind, period, fmt, fund_ids=None):
+    row = db.fetch_one("""
+        SELECT content_hash, watermark, size_bytes, row_count, generated_at FROM report_artifacts
+        WHERE kind = %s AND period = %s AND scope = %s AND format = %s
+    """, (kind, period, scope_key(fund_ids), fmt))
+    if row is None:
+        return None
+    content_hash, mark, size, count, generated_at = row
+    return {"kind": kind, "period": period, "format": fmt, "content_hash": content_hash, "watermark": mark,
+            "size_bytes": size, "row_count": count, "generated_at": generated_at,
+            "path": path_for(content_hash, fmt)}
+
+
+def fresh(kind, period, fmt, fund_ids=None):
+    # The stored artifact if nothing has changed in its period since, else None.
+    artifact = lookup(kind, period, fmt, fund_ids)
+    if artifact is None or not os.path.exists(artifact["path"]):
+        return None
+    return None if stale(artifact, fund_ids) else artifact
+
+
+@metrics.timed("artifacts.build", rows=None)
+def build(kind, period, fmt, fund_ids=None, force=False):
+    # Returns (artifact, rebuilt).
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown report format '{fmt}'")
+    # Taken before rendering: a transaction landing mid-build leaves the
+    # artifact marked stale rather than silently missing from it.
+    mark = events.high_water()
+    current = lookup(kind, period, fmt, fund_ids)
+    if not force and current is not None and os.path.exists(current["path"]) and not stale(current, fund_ids):
+        return current, False
+    data, count = render(kind, period, fmt, fund_ids)
+    digest = _store(data, fmt)
+    with db.transaction() as cursor:
+        cursor.execute(UPSERT_ARTIFACT[db.backend_name()],
+                       (kind, period, scope_key(fund_ids), fmt, digest, mark, len(data), count))
+    cache.invalidate("report_artifacts")
+    return lookup(kind, period, fmt, fund_ids), True
+
+
+def get(kind, period, fmt, fund_ids=None):
+    # The fresh artifact, building it first if it is missing or stale.
+    return fresh(kind, period, fmt, fund_ids) or build(kind, period, fmt, fund_ids)[0]
+
+
+@metrics.timed("artifacts.list_artifacts")
+@cache.cached(tags=("report_artifacts",))
+def list_artifacts(fund_ids=None):
+    return db.read_frame("""
+        SELECT kind, period, format, size_bytes, row_count, generated_at FROM report_artifacts
+        WHERE scope = %s ORDER BY kind, period DESC, format
+    """, (scope_key(fund_ids),))
+
+
+def prune():
+    # Deletes stored files no artifact row points at any more.
+    referenced = {path_for(content_hash, fmt) for content_hash, fmt in
+                  db.fetch_all("SELECT content_hash, format FROM report_artifacts")}
+    removed = 0
+    for root, _, files in os.walk(ARTIFACT_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            if path not in referenced and not name.endswith(".part"):
+                os.unlink(path)
+                removed += 1
+    return removed
+
+
+# --- Scheduler --- #
+def scopes():
+    # Every fund together, plus each campus on its own.
+    result = [None]
+    for institution_id in tenants.list_institutions()["id"].tolist():
+        fund_ids = tenants.fund_scope(institution_id)
+        if fund_ids:
+            result.append(fund_ids)
+    return result
+
+
+@metrics.timed("artifacts.run_once", rows=None)
+def run_once(today=None):
+    # Rebuilds whatever is missing or stale; returns how many files were built.
+    built = 0
+    for fund_ids in scopes():
+        for kind, period in due_periods(today):
+            for fmt in FORMATS:
+                _, rebuilt = build(kind, period, fmt, fund_ids)
+                built += rebuilt
+    return built
+
+
+class Scheduler:
+    def __init__(self, interval=SCHEDULE_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"runs": 0, "built": 0, "errors": 0}
+        self.last_error = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="report-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            try:
+                self.stats["built"] += run_once()
+                self.stats["runs"] += 1
+            except Exception as e:
+                # Database or disk trouble: try again on the next pass.
+                self.stats["errors"] += 1
+                self.last_error = str(e)
+            if self._stop.wait(self.interval):
+                return
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    # Started once per process.
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler().start()
+    return _scheduler
+
+
+def _scheduler_metrics():
+    if _scheduler is None:
+        return []
+    return [(f"funds_report_scheduler_{key}", {}, value) for key, value in _scheduler.stats.items()]
+
+
+metrics.register_collector(_scheduler_metrics)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the daily, monthly and fiscal-year report artifacts")
+    parser.add_argument("--loop", action="store_true", help="keep rebuilding every FUNDS_REPORT_SCHEDULE_INTERVAL")
+    parser.add_argument("--prune", action="store_true", help="delete stored files no artifact refers to")
+    args = parser.parse_args()
+
+    schema.ensure_schema()
+    if args.loop:
+        scheduler = Scheduler().start()
+        try:
+            scheduler._thread.join()
+        except KeyboardInterrupt:
+            scheduler.stop()
+        return
+    print(f"Built {run_once()} report artifacts")
+    if args.prune:
+        print(f"Removed {prune()} unreferenced files")
+    for row in list_artifacts().itertuples():
+        print(f"{row.kind:<8} {row.period:<10} {row.format:<4} {row.row_count:>8,} rows  {row.size_bytes:>10,} bytes  "
+              f"{row.generated_at}")
+
+
+if __name__ == "__main__":
+    main()
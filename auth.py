@@ -0,0 +1,195 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import db
+import metrics
+
+# --- Password Hashing --- #
+# Passwords are stored as "scrypt$n$r$p$salt$hash". Rows still holding the
+# old unsalted SHA-256 hex digest are verified once and rehashed on login.
+
+SCRYPT_N = int(os.environ.get("FUNDS_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.environ.get("FUNDS_SCRYPT_R", "8"))
+SCRYPT_P = int(os.environ.get("FUNDS_SCRYPT_P", "1"))
+SALT_BYTES = 16
+KEY_BYTES = 64
+
+# hashlib.scrypt releases the GIL, so a few threads hash in parallel without
+# blocking the Streamlit script thread or taking every core.
+KDF_WORKERS = int(os.environ.get("FUNDS_KDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+KDF_MAX_PENDING = int(os.environ.get("FUNDS_KDF_MAX_PENDING", str(KDF_WORKERS * 4)))
+KDF_TIMEOUT = 30
+
+_kdf_executor = ThreadPoolExecutor(max_workers=KDF_WORKERS, thread_name_prefix="kdf")
+_kdf_slots = threading.BoundedSemaphore(KDF_MAX_PENDING)
+
+
+class AuthBusy(Exception):
+    pass
+
+
+class LoginThrottled(Exception):
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"Too many login attempts. Try again in {int(retry_after) + 1} seconds.")
+
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=128 * r * n * 2, dklen=KEY_BYTES)
+
+
+def _run_kdf(func, *args):
+    if not _kdf_slots.acquire(blocking=False):
+        raise AuthBusy("Authentication service is busy, please retry shortly.")
+    try:
+        return _kdf_executor.submit(func, *args).result(timeout=KDF_TIMEOUT)
+    except TimeoutError:
+        raise AuthBusy("Authentication service is busy, please retry shortly.")
+    finally:
+        _kdf_slots.release()
+
+
+def _hash(password):
+    salt = secrets.token_bytes(SALT_BYTES)
+    key = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(key)}"
+
+
+def _verify(password, stored):
+    # Returns (matches, needs_rehash).
+    if stored.startswith("scrypt$"):
+        _, n, r, p, salt, key = stored.split("$")
+        n, r, p = int(n), int(r), int(p)
+        candidate = _scrypt(password, base64.b64decode(salt), n, r, p)
+        matches = hmac.compare_digest(candidate, base64.b64decode(key))
+        return matches, matches and (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    legacy = hashlib.sha256(password.encode()).hexdigest()
+    matches = hmac.compare_digest(legacy, stored)
+    return matches, matches
+
+
+def hash_password(password):
+    return _run_kdf(_hash, password)
+
+
+def verify_password(password, stored):
+    return _run_kdf(_verify, password, stored)
+
+
+# --- Login Throttling --- #
+# Failed attempts are counted in a sliding window per username and per client
+# address; a throttled login is rejected before any hashing happens. Keys are
+# kept in order of their latest failure, so expired ones are dropped from the
+# front and sprayed usernames cannot grow the table past MAX_TRACKED_KEYS.
+
+THROTTLE_WINDOW = float(os.environ.get("FUNDS_LOGIN_WINDOW", "300"))
+MAX_FAILURES_PER_USER = int(os.environ.get("FUNDS_LOGIN_MAX_PER_USER", "5"))
+MAX_FAILURES_PER_IP = int(os.environ.get("FUNDS_LOGIN_MAX_PER_IP", "20"))
+MAX_TRACKED_KEYS = int(os.environ.get("FUNDS_LOGIN_MAX_TRACKED", "100000"))
+# Reverse proxies in front of the app that append to X-Forwarded-For. With
+# none, the header is client-supplied and ignored.
+TRUSTED_PROXY_HOPS = int(os.environ.get("FUNDS_TRUSTED_PROXY_HOPS", "0"))
+
+_failures = OrderedDict()
+_failures_lock = threading.Lock()
+
+
+def client_ip(forwarded_for, peer):
+    # The address the outermost trusted proxy saw; earlier entries can be forged.
+    hops = [hop.strip() for hop in (forwarded_for or "").split(",") if hop.strip()]
+    if not TRUSTED_PROXY_HOPS or not hops:
+        return peer
+    return hops[-min(TRUSTED_PROXY_HOPS, len(hops))]
+
+
+def _throttle_keys(username, ip):
+    keys = [(f"user:{username.lower()}", MAX_FAILURES_PER_USER)]
+    if ip:
+        keys.append((f"ip:{ip}", MAX_FAILURES_PER_IP))
+    return keys
+
+
+def check_throttle(username, ip=None):
+    now = time.monotonic()
+    with _failures_lock:
+        for key, limit in _throttle_keys(username, ip):
+            attempts = _failures.get(key)
+            if attempts is None:
+                continue
+            while attempts and now - attempts[0] > THROTTLE_WINDOW:
+                attempts.popleft()
+            if not attempts:
+                del _failures[key]
+            elif len(attempts) >= limit:
+                raise LoginThrottled(THROTTLE_WINDOW - (now - attempts[0]))
+
+
+def record_failure(username, ip=None):
+    now = time.monotonic()
+    with _failures_lock:
+        for key, _ in _throttle_keys(username, ip):
+            _failures.setdefault(key, deque()).append(now)
+            _failures.move_to_end(key)
+        while _failures:
+            oldest = next(iter(_failures.values()))
+            if now - oldest[-1] <= THROTTLE_WINDOW and len(_failures) <= MAX_TRACKED_KEYS:
+                break
+            _failures.popitem(last=False)
+
+
+def clear_failures(username):
+    with _failures_lock:
+        _failures.pop(f"user:{username.lower()}", None)
+
+
+# --- Users --- #
+# Verified against when the username does not exist, so unknown and known
+# usernames take the same time to reject.
+_DUMMY_HASH = None
+
+USER_LOOKUP = "SELECT id, username, role, password_hash, institution_id FROM users WHERE username = %s"
+
+
+def _dummy_hash():
+    global _DUMMY_HASH
+    if _DUMMY_HASH is None:
+        _DUMMY_HASH = hash_password(secrets.token_hex(8))
+    return _DUMMY_HASH
+
+
+def create_user(username, password, role='accountant', institution_id=None):
+    password_hash = hash_password(password)
+    with db.transaction() as cursor:
+        cursor.execute("""
+            INSERT INTO users (username, password_hash, role, institution_id)
+            VALUES (%s, %s, %s, %s)
+        """, (username, password_hash, role, institution_id))
+
+
+@metrics.timed("auth.authenticate", rows=None)
+def authenticate(username, password, ip=None):
+    check_throttle(username, ip)
+    row = db.fetch_one(USER_LOOKUP, (username,))
+    matches, needs_rehash = verify_password(password, row[3] if row else _dummy_hash())
+    if not row or not matches:
+        record_failure(username, ip)
+        return None
+
+    clear_failures(username)
+    if needs_rehash:
+        new_hash = hash_password(password)
+        with db.transaction() as cursor:
+            cursor.execute("UPDATE users SET password_hash = %s WHERE id = %s", (new_hash, row[0]))
+    return row[0], row[1], row[2], row[4]
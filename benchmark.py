@@ -0,0 +1,337 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import cache
+import constants
+import db
+import exporter
+import importer
+import ledger
+import queries
+import reports
+import rollups
+import schema
+import tenants
+import writequeue
+
+# --- Benchmark Harness --- #
+# Seeds a database with synthetic income/expense rows and times the data
+# access paths the app uses. Results are printed (or written) as JSON so runs
+# can be diffed between commits.
+
+
+def seed(rows, chunk_size=10000, seed_value=42, start=date(2018, 4, 1)):
+    rng = np.random.default_rng(seed_value)
+    days = (date.today() - start).days or 1
+    written = 0
+    while written < rows:
+        n = min(chunk_size, rows - written)
+        # Incomes are larger than expenses so every batch nets positive.
+        is_income = rng.random(n) < 0.6
+        chunk = pd.DataFrame({
+            "transaction_type": np.where(is_income, "income", "expense"),
+            "name": [f"Synthetic {written + i}" for i in range(n)],
+            "type": np.where(
+                is_income,
+                rng.choice(constants.INCOME_TYPES, n),
+                rng.choice(constants.EXPENSE_TYPES, n),
+            ),
+            "description": "benchmark row",
+            "amount": np.where(
+                is_income, rng.uniform(1000, 50000, n), rng.uniform(100, 5000, n)
+            ).round(2),
+            "date": [start + timedelta(days=int(d)) for d in rng.integers(0, days, n)],
+            "department": rng.choice(constants.DEPARTMENTS, n),
+            "status": np.where(
+                is_income,
+                rng.choice(constants.INCOME_STATUSES, n),
+                rng.choice(constants.EXPENSE_STATUSES, n),
+            ),
+            "receipt_path": None,
+        })
+        importer.load_batch(chunk)
+        written += n
+    return written
+
+
+def ensure_funds(count):
+    # The default fund plus benchmark funds on a campus of their own.
+    fund_ids = sorted(int(fund_id) for fund_id in tenants.list_funds()["id"])
+    if len(fund_ids) < count:
+        institution_id = tenants.create_institution(f"BENCH{len(fund_ids)}", "Benchmark Campus")
+        fund_ids += [tenants.create_fund(institution_id, f"Benchmark Fund {n}") for n in range(len(fund_ids), count)]
+    return fund_ids[:count]
+
+
+def summarize_timings(timings):
+    ordered = sorted(timings)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] * 1000
+
+    return {
+        "samples": len(ordered),
+        "min_ms": ordered[0] * 1000,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": ordered[-1] * 1000,
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+    }
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(func, iterations, warmup=1):
+    # Caches are cleared so every sample measures the database path.
+    for _ in range(warmup):
+        cache.clear()
+        func()
+    timings = []
+    for _ in range(iterations):
+        cache.clear()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    cache.clear()
+    result = summarize_timings(timings)
+    # Measured separately: tracemalloc slows everything it traces.
+    result["peak_memory_bytes"] = peak_memory(func)
+    return result
+
+
+def measure_concurrent_writes(writers, writes_per_writer, queue=None, fund_ids=(ledger.FUND_ID,)):
+    # With a write queue, latency is the time to journal and acknowledge, and
+    # drain_seconds is how long the worker then took to commit the backlog.
+    # Writers are spread round-robin over `fund_ids`.
+    timings = []
+    timings_lock = threading.Lock()
+    rejected = [0]
+
+    def writer(worker):
+        local = []
+        fund_id = fund_ids[worker % len(fund_ids)]
+        for i in range(writes_per_writer):
+            started = time.perf_counter()
+            try:
+                if queue is not None:
+                    queue.submit(*(("income", f"Writer {worker}", None, "Admission Fees", "benchmark",
+                                    1000, date.today(), "Science", "Received") if i % 2 == 0 else
+                                   ("expense", f"Writer {worker}", None, "Maintenance", "benchmark",
+                                    500, date.today(), "Engineering", "Paid")), fund_id=fund_id)
+                elif i % 2 == 0:
+                    ledger.record_income(f"Writer {worker}", None, "Admission Fees", "benchmark",
+                                         1000, date.today(), "Science", "Received", fund_id=fund_id)
+                else:
+                    ledger.record_expense(f"Writer {worker}", None, "Maintenance", "benchmark",
+                                          500, date.today(), "Engineering", "Paid", fund_id=fund_id)
+            except ledger.InsufficientFunds:
+                with timings_lock:
+                    rejected[0] += 1
+            local.append(time.perf_counter() - started)
+        with timings_lock:
+            timings.extend(local)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    result = summarize_timings(timings)
+    result.update(writers=writers, funds=len(fund_ids), seconds=elapsed,
+                  writes_per_second=len(timings) / elapsed, rejected=rejected[0])
+    if queue is not None:
+        queue.flush()
+        result.update(drain_seconds=time.perf_counter() - started - elapsed,
+                      batches=queue.stats["batches"], rejected=queue.stats["rejected"])
+    return result
+
+
+# Cold imports, each in a fresh interpreter: what a Streamlit server pays
+# before it can paint the login page, and what each heavy page adds on top.
+# A profile is the modules to import plus code to run after them; the login
+# profiles include one poll of the cache follower, which runs in every app
+# process.
+FOLLOWER_POLL = "import events; events.Follower().poll()"
+
+IMPORT_PROFILES = {
+    "login": (["main"], FOLLOWER_POLL),
+    "data_layer": (["auth", "ledger", "schema", "tenants", "writequeue", "receipts", "artifacts", "events"],
+                   FOLLOWER_POLL),
+    "financial_analysis": (["views.analysis"], ""),
+    "pdf_report": (["pdfreport"], ""),
+}
+
+HEAVY_MODULES = ("pandas", "numpy", "pyarrow", "plotly", "reportlab", "openpyxl", "mysql.connector", "PIL")
+
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+try:
+    for name in sys.argv[3:]:
+        __import__(name)
+except ImportError as e:
+    print(json.dumps({"skipped": str(e)}))
+else:
+    exec(sys.argv[2])
+    seconds = time.perf_counter() - started
+    print(json.dumps({"seconds": seconds, "loaded": [m for m in sys.argv[1].split(",") if m in sys.modules]}))
+"""
+
+
+def _probe_env():
+    # Point the probes at the benchmark's database.
+    backend = db.get_pool().backend
+    env = dict(os.environ, FUNDS_DB_BACKEND=backend.name)
+    if backend.name == "sqlite":
+        env["FUNDS_SQLITE_PATH"] = os.path.abspath(backend.path)
+    else:
+        env["FUNDS_DB_NAME"] = backend.params["database"]
+    return env
+
+
+def measure_imports(runs, profiles=IMPORT_PROFILES):
+    results = {}
+    env = _probe_env()
+    for profile, (modules, code) in profiles.items():
+        timings = []
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, "-c", IMPORT_PROBE, ",".join(HEAVY_MODULES), code] + modules,
+                cwd=os.path.dirname(os.path.abspath(__file__)), env=env, capture_output=True, text=True, check=True
+            ).stdout
+            sample = json.loads(output)
+            if "skipped" in sample:
+                results[profile] = sample
+                break
+            timings.append(sample["seconds"])
+        else:
+            results[profile] = summarize_timings(timings)
+            results[profile]["heavy_modules"] = sample["loaded"]
+    return results
+
+
+def _export_csv():
+    export_file, _ = exporter.export(queries.make_filters(), "csv")
+    export_file.close()
+
+
+def _generate_pdf(filters):
+    reports.generate_financial_pdf(
+        rollups.breakdown("income"), rollups.breakdown("expense"),
+        "Benchmark Report", include_details=True, filters=filters
+    )
+
+
+def run(rows, iterations, writers, writes_per_writer, pdf_days, funds=1, import_runs=5):
+    results = {}
+    started = time.perf_counter()
+    results["seed"] = {"rows": seed(rows), "seconds": time.perf_counter() - started}
+    if import_runs:
+        results["imports"] = measure_imports(import_runs)
+
+    all_rows = queries.make_filters()
+    recent = queries.make_filters(start_date=date.today() - timedelta(days=pdf_days))
+    benchmarks = {
+        "fetch_page": lambda: queries.fetch_page(all_rows),
+        "summarize": lambda: queries.summarize(all_rows),
+        "income_breakdown": lambda: rollups.breakdown("income"),
+        "expense_breakdown": lambda: rollups.breakdown("expense"),
+        "export_csv": _export_csv,
+        "generate_pdf": lambda: _generate_pdf(recent),
+    }
+    try:
+        import main
+    except ImportError as e:
+        results["fetch_all_transactions"] = {"skipped": str(e)}
+    else:
+        benchmarks["fetch_all_transactions"] = main.fetch_all_transactions.uncached
+
+    for name, func in benchmarks.items():
+        results[name] = measure(func, iterations)
+    results["concurrent_writes"] = measure_concurrent_writes(writers, writes_per_writer)
+    if funds > 1:
+        # Same load spread over several funds: postings lock different rows.
+        results["multi_fund_writes"] = measure_concurrent_writes(
+            writers, writes_per_writer, fund_ids=ensure_funds(funds)
+        )
+    queue = writequeue.WriteQueue(os.path.join(tempfile.mkdtemp(prefix="funds-journal-"), "bench.log")).start()
+    results["queued_writes"] = measure_concurrent_writes(writers, writes_per_writer, queue)
+    queue.stop()
+    results["reconciliation_drift"] = {
+        f"{fund_id}/{department or 'total'}": [str(v) for v in values]
+        for (fund_id, department), values in ledger.reconcile().items()
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the data access functions against synthetic data")
+    parser.add_argument("--rows", type=int, default=50000, help="synthetic rows to seed")
+    parser.add_argument("--iterations", type=int, default=10, help="timed runs per benchmark")
+    parser.add_argument("--writers", type=int, default=8, help="concurrent writer threads")
+    parser.add_argument("--writes", type=int, default=50, help="inserts per writer thread")
+    parser.add_argument("--pdf-days", type=int, default=90, help="days of transactions in the PDF benchmark")
+    parser.add_argument("--funds", type=int, default=4, help="funds to spread the multi-fund write benchmark over")
+    parser.add_argument("--import-runs", type=int, default=5,
+                        help="fresh interpreters per import-time profile (0 to skip)")
+    parser.add_argument("--backend", choices=["sqlite", "mysql"], default="sqlite",
+                        help="mysql seeds --mysql-database on the server configured via FUNDS_DB_* variables")
+    parser.add_argument("--mysql-database", help="throwaway MySQL database to seed (required with --backend mysql)")
+    parser.add_argument("--sqlite-path", help="SQLite file to use (default: a fresh temporary file)")
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    if args.backend == "sqlite":
+        path = args.sqlite_path or os.path.join(tempfile.mkdtemp(prefix="funds-bench-"), "bench.db")
+        backend = db.SQLiteBackend(path)
+    elif not args.mysql_database:
+        parser.error("--backend mysql needs --mysql-database naming a throwaway database")
+    else:
+        backend = db.MySQLBackend(database=args.mysql_database)
+    db.configure(backend, size=args.writers + 2)
+    schema.ensure_schema()
+    # Seeding posts synthetic balances that nothing undoes.
+    tables = [*queries.TABLES.values(), *queries.ARCHIVE_TABLES.values()]
+    if any(db.fetch_one(f"SELECT 1 FROM {table} LIMIT 1") for table in tables):
+        parser.error("the benchmark database already holds transactions; use an empty one")
+
+    results = {
+        "backend": backend.name,
+        "rows": args.rows,
+        "iterations": args.iterations,
+        "python": sys.version.split()[0],
+        "results": run(args.rows, args.iterations, args.writers, args.writes, args.pdf_days, args.funds,
+                       args.import_runs),
+    }
+    output = json.dumps(results, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+# --- Query Cache --- #
+# A process-wide LRU with per-entry TTL, shared by every Streamlit session.
+# Entries are tagged with the tables they were read from; writers call
+# invalidate() with the tables they touched after committing.
+
+DEFAULT_TTL = float(os.environ.get("FUNDS_CACHE_TTL", "300"))
+MAX_ENTRIES = int(os.environ.get("FUNDS_CACHE_MAX_ENTRIES", "512"))
+
+
+class QueryCache:
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._tag_index = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "expired": 0}
+
+    def generation(self, tags):
+        with self._lock:
+            return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return False, None
+            value, expires_at, tags = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return True, value
+
+    def put(self, key, value, ttl, tags, generation):
+        with self._lock:
+            # A write landed while the value was being computed; it may be stale.
+            if tuple(self._generations.get(tag, 0) for tag in tags) != generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl, tags)
+            for tag in tags:
+                self._tag_index.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.counters["evictions"] += 1
+
+    def _remove(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tag_index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+                for key in list(self._tag_index.pop(tag, ())):
+                    if key in self._entries:
+                        self._remove(key)
+                        self.counters["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tag_index.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters, size=len(self._entries))
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+_cache = QueryCache()
+
+
+def _copy(value):
+    # DataFrames are mutable; hand each caller its own copy.
+    return value.copy() if hasattr(value, "copy") and hasattr(value, "columns") else value
+
+
+def cached(tags, ttl=DEFAULT_TTL):
+    tags = tuple(tags)
+
+    def decorator(func):
+        prefix = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (prefix, repr(args), repr(sorted(kwargs.items())))
+            found, value = _cache.get(key)
+            if found:
+                return _copy(value)
+            generation = _cache.generation(tags)
+            value = func(*args, **kwargs)
+            _cache.put(key, value, ttl, tags, generation)
+            return _copy(value)
+
+        wrapper.uncached = func
+        return wrapper
+
+    return decorator
+
+
+def _cache_metrics():
+    return [(f"funds_cache_{key}", {}, value) for key, value in stats().items()]
+
+
+metrics.register_collector(_cache_metrics)
+
+
+def invalidate(*tags):
+    _cache.invalidate(*tags)
+
+
+def clear():
+    _cache.clear()
+
+
+def stats():
+    return _cache.stats()
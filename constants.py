@@ -0,0 +1,17 @@
+# --- Categories --- #
+INCOME_TYPES = ["Admission Fees", "Government Donation", "Hostel Fees", "Other Income"]
+
+EXPENSE_TYPES = [
+    "Teacher Salary", "Non-Teaching Salary", "Lab Equipment",
+    "Library Supplies", "Maintenance", "Other Expense"
+]
+
+DEPARTMENTS = ["Science", "Arts", "Engineering", "Medicine", "Administration"]
+
+INCOME_STATUSES = ["Pending", "Received"]
+
+EXPENSE_STATUSES = ["Pending", "Paid"]
+
+TYPES = {"income": INCOME_TYPES, "expense": EXPENSE_TYPES}
+
+STATUSES = {"income": INCOME_STATUSES, "expense": EXPENSE_STATUSES}
@@ -0,0 +1,358 @@
+import contextvars
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+
+import metrics
+
+# --- Configuration --- #
+# Everything can be overridden from the environment so the same code runs
+# against the production MySQL server or a local SQLite file.
+DB_BACKEND = os.environ.get("FUNDS_DB_BACKEND", "mysql")
+DB_HOST = os.environ.get("FUNDS_DB_HOST", "localhost")
+DB_USER = os.environ.get("FUNDS_DB_USER", "root")
+DB_PASSWORD = os.environ.get("FUNDS_DB_PASSWORD", "Ayush@1802")
+DB_NAME = os.environ.get("FUNDS_DB_NAME", "university_funds")
+SQLITE_PATH = os.environ.get("FUNDS_SQLITE_PATH", "university_funds.db")
+POOL_SIZE = int(os.environ.get("FUNDS_DB_POOL_SIZE", "5"))
+POOL_TIMEOUT = float(os.environ.get("FUNDS_DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = float(os.environ.get("FUNDS_DB_POOL_RECYCLE", "3600"))
+HEALTH_CHECK_INTERVAL = float(os.environ.get("FUNDS_DB_HEALTH_CHECK_INTERVAL", "30"))
+
+
+# Lock wait timeout, deadlock, can't connect, server gone away, lost connection.
+MYSQL_TRANSIENT_ERRNOS = {1205, 1213, 2002, 2003, 2006, 2013, 2055}
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# --- Backends --- #
+class MySQLBackend:
+    name = "mysql"
+
+    def __init__(self, host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME):
+        self.params = dict(host=host, user=user, password=password, database=database)
+
+    def connect(self):
+        import mysql.connector
+        return mysql.connector.connect(**self.params)
+
+    def is_alive(self, conn):
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def integrity_errors(self):
+        import mysql.connector
+        return (mysql.connector.IntegrityError,)
+
+    def is_transient(self, error):
+        # Lost connections, lock wait timeouts and deadlocks: retrying the
+        # same statement later can succeed. mysql.connector raises the lock
+        # errors as InternalError/DatabaseError, so they go by errno.
+        import mysql.connector
+        return (isinstance(error, (mysql.connector.OperationalError, mysql.connector.InterfaceError, PoolTimeout))
+                or getattr(error, "errno", None) in MYSQL_TRANSIENT_ERRNOS)
+
+
+class _SQLiteCursor:
+    # SQLite uses qmark parameters; the app's queries are written with %s.
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(sql.replace("%s", "?"), tuple(params))
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(sql.replace("%s", "?"), [tuple(p) for p in seq_of_params])
+        return self
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _SQLiteConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return _SQLiteCursor(self._conn.cursor())
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(sep=" "))
+
+
+class SQLiteBackend:
+    name = "sqlite"
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=POOL_TIMEOUT, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return _SQLiteConnection(conn)
+
+    def is_alive(self, conn):
+        try:
+            conn.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def integrity_errors(self):
+        return (sqlite3.IntegrityError,)
+
+    def is_transient(self, error):
+        # "database is locked" and I/O errors.
+        return isinstance(error, (sqlite3.OperationalError, PoolTimeout))
+
+
+def make_backend(name=None):
+    name = name or DB_BACKEND
+    if name == "mysql":
+        return MySQLBackend()
+    if name == "sqlite":
+        return SQLiteBackend()
+    raise ValueError(f"Unknown database backend: {name}")
+
+
+# --- Connection Pool --- #
+class _PooledConnection:
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    def __init__(self, backend, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 recycle=POOL_RECYCLE, health_check_interval=HEALTH_CHECK_INTERVAL):
+        self.backend = backend
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.health_check_interval = health_check_interval
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "reused": 0, "discarded": 0, "checkouts": 0, "waits": 0}
+
+    def _bump(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _discard(self, pooled):
+        self._bump("discarded")
+        try:
+            pooled.conn.close()
+        except Exception:
+            pass
+
+    def _checkout(self):
+        now = time.monotonic()
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if now - pooled.created_at > self.recycle:
+                self._discard(pooled)
+                continue
+            if now - pooled.last_used > self.health_check_interval and not self.backend.is_alive(pooled.conn):
+                self._discard(pooled)
+                continue
+            self._bump("reused")
+            return pooled
+        with metrics.span("db.connect"):
+            pooled = _PooledConnection(self.backend.connect())
+        self._bump("created")
+        return pooled
+
+    def _checkin(self, pooled, broken):
+        if not broken:
+            try:
+                # Never hand the next caller an open transaction.
+                pooled.conn.rollback()
+            except Exception:
+                broken = True
+        if broken:
+            self._discard(pooled)
+            return
+        pooled.last_used = time.monotonic()
+        self._idle.put(pooled)
+
+    @contextmanager
+    def connection(self):
+        if not self._slots.acquire(blocking=False):
+            self._bump("waits")
+            with metrics.span("db.checkout_wait"):
+                if not self._slots.acquire(timeout=self.timeout):
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+        pooled = None
+        broken = False
+        try:
+            pooled = self._checkout()
+            self._bump("checkouts")
+            yield pooled.conn
+        except Exception:
+            broken = pooled is not None and not self.backend.is_alive(pooled.conn)
+            raise
+        finally:
+            if pooled is not None:
+                self._checkin(pooled, broken)
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+# --- Process-wide Pool --- #
+# Module state survives Streamlit reruns, so every session shares one pool.
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(make_backend())
+    return _pool
+
+
+def configure(backend=None, **pool_options):
+    global _pool
+    if isinstance(backend, str) or backend is None:
+        backend = make_backend(backend)
+    with _pool_lock:
+        old, _pool = _pool, ConnectionPool(backend, **pool_options)
+    if old is not None:
+        old.close()
+    return _pool
+
+
+def backend_name():
+    return get_pool().backend.name
+
+
+def integrity_errors():
+    return get_pool().backend.integrity_errors()
+
+
+def is_transient(error):
+    return get_pool().backend.is_transient(error)
+
+
+@contextmanager
+def connection():
+    with get_pool().connection() as conn:
+        yield conn
+
+
+@contextmanager
+def transaction():
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+
+def _pool_metrics():
+    if _pool is None:
+        return []
+    labels = {"backend": _pool.backend.name}
+    gauges = [("funds_db_pool_size", labels, _pool.size), ("funds_db_pool_idle", labels, _pool._idle.qsize())]
+    gauges += [(f"funds_db_pool_{key}_total", labels, value) for key, value in dict(_pool.stats).items()]
+    return gauges
+
+
+metrics.register_collector(_pool_metrics)
+
+
+# --- Query Helpers --- #
+_captured = contextvars.ContextVar("captured_queries", default=None)
+
+
+@contextmanager
+def capture_queries():
+    # Collects (query, params) for every helper call below; see explain.py.
+    captured = []
+    token = _captured.set(captured)
+    try:
+        yield captured
+    finally:
+        _captured.reset(token)
+
+
+def _capture(query, params):
+    captured = _captured.get()
+    if captured is not None:
+        captured.append((query, tuple(params)))
+
+
+@metrics.timed("db.query.fetch_one", rows=lambda row: 1 if row else 0)
+def fetch_one(query, params=()):
+    _capture(query, params)
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        row = cursor.fetchone()
+        cursor.close()
+        return row
+
+
+@metrics.timed("db.query.fetch_all")
+def fetch_all(query, params=()):
+    _capture(query, params)
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+
+
+@metrics.timed("db.query.read_frame")
+def read_frame(query, params=()):
+    import pandas as pd
+
+    _capture(query, params)
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        columns = [col[0] for col in cursor.description]
+        rows = cursor.fetchall()
+        cursor.close()
+    return pd.DataFrame.from_records(rows, columns=columns)
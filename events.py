@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+import threading
+import time
+
+import cache
+import db
+import metrics
+import queries
+import schema
+
+# --- Transaction Events --- #
+# transaction_events is an append-only log of every insert, status change and
+# reversal, written in the same database transaction as the change itself.
+# Readers tail it by sequence number: the cache drops exactly the tags an
+# event touches (so writes made by another process - the API, the importer,
+# the write-behind queue - show up within POLL_INTERVAL instead of after the
+# cache TTL), and report artifacts are stale only when an event has landed in
+# their period since they were built.
+#
+# seq is allocated when the event row is inserted, not when its transaction
+# commits, so a slow MySQL transaction can commit seq 41 after seq 42 is
+# already visible. high_water() therefore stops below any gap younger than
+# GAP_GRACE seconds; older gaps are rolled-back transactions and are skipped.
+
+POLL_INTERVAL = float(os.environ.get("FUNDS_EVENT_POLL_INTERVAL", "1"))
+GAP_GRACE = int(os.environ.get("FUNDS_EVENT_GAP_GRACE", "10"))
+FOLLOW_ENABLED = os.environ.get("FUNDS_CACHE_FOLLOW_EVENTS", "1") == "1"
+GAP_WINDOW = 1000
+
+EVENTS = ("insert", "status", "reverse")
+
+COLUMNS = ("seq, event, transaction_type, transaction_id, fund_id, type, department, date, amount, "
+           "old_status, new_status, user_id, detail, created_at")
+COLUMN_NAMES = [column.strip() for column in COLUMNS.split(",")]
+
+INSERT_EVENT = """
+    INSERT INTO transaction_events
+        (event, transaction_type, transaction_id, fund_id, type, department, date, amount,
+         old_status, new_status, user_id, detail)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+# Seconds since an event row was written, by the database's own clock.
+EVENT_AGE = {
+    "mysql": "TIMESTAMPDIFF(SECOND, created_at, CURRENT_TIMESTAMP)",
+    "sqlite": "CAST((julianday('now') - julianday(created_at)) * 86400 AS INTEGER)",
+}
+
+# Cache tags each kind of transaction is read through.
+TAGS = {
+    "income": ("income", "funds", "department_balances"),
+    "expense": ("expenses", "funds", "department_balances"),
+}
+
+
+# --- Writing --- #
+def record(cursor, event, kind, transaction_id, fund_id, t_type, department, date, amount,
+           old_status=None, new_status=None, user_id=None, detail=None):
+    cursor.execute(INSERT_EVENT, (
+        event, kind, transaction_id, fund_id, t_type, department, date, amount, old_status, new_status,
+        user_id, json.dumps(detail, default=str) if detail is not None else None,
+    ))
+
+
+def last_id(cursor, kind):
+    # Read before a bulk insert. On MySQL this also opens the transaction's
+    # snapshot, so rows other transactions commit meanwhile stay invisible.
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {queries.TABLES[kind]}")
+    return cursor.fetchone()[0]
+
+
+def record_inserts(cursor, kind, after_id, count):
+    # Logs the `count` rows a bulk insert just added. They are the newest
+    # rows above `after_id` this transaction can see: SQLite holds its write
+    # lock from the insert until commit, and MySQL's snapshot hides everyone
+    # else's.
+    cursor.execute(f"""
+        SELECT id, fund_id, type, department, date, amount, status, user_id
+        FROM {queries.TABLES[kind]} WHERE id > %s ORDER BY id DESC LIMIT %s
+    """, (after_id, count))
+    rows = cursor.fetchall()[::-1]
+    cursor.executemany(INSERT_EVENT, [
+        ("insert", kind, row_id, fund_id, t_type, department, date, amount, None, status, user_id, None)
+        for row_id, fund_id, t_type, department, date, amount, status, user_id in rows
+    ])
+
+
+# --- Reading --- #
+# Last answer of high_water() per connection pool; everything at or below
+# it is settled, so later calls only read the events after it.
+_settled = {"pool": None, "seq": 0}
+_settled_lock = threading.Lock()
+
+
+def high_water():
+    # Highest seq below which every event is either committed or long gone.
+    # An idle poll costs one MAX(seq) lookup.
+    top = int(db.fetch_one("SELECT MAX(seq) FROM transaction_events")[0] or 0)
+    pool = db.get_pool()
+    with _settled_lock:
+        settled = _settled["seq"] if _settled["pool"] is pool else 0
+    if settled == top:
+        return top
+    floor = max(top - GAP_WINDOW, min(settled, top))
+    expected = floor + 1
+    for seq, age in db.fetch_all(f"""
+        SELECT seq, {EVENT_AGE[db.backend_name()]} FROM transaction_events WHERE seq > %s ORDER BY seq
+    """, (floor,)):
+        if seq != expected and (age or 0) < GAP_GRACE:
+            break
+        expected = seq + 1
+    with _settled_lock:
+        if _settled["pool"] is not pool:
+            _settled.update(pool=pool, seq=0)
+        _settled["seq"] = max(_settled["seq"], expected - 1)
+    return expected - 1
+
+
+@metrics.timed("events.tail")
+def tail(after=0, limit=1000, fund_ids=None):
+    """Events after seq `after`, oldest first, for the funds in scope.
+
+    Returns (events, next_after), each event a dict keyed by COLUMN_NAMES;
+    pass next_after back to continue. It moves past events outside the scope
+    as well, so a narrow reader keeps up. Plain dicts rather than a frame:
+    the cache follower calls this every second and should not need pandas.
+    """
+    through = high_water()
+    fund_sql, fund_params = queries.fund_clause(fund_ids)
+    scope = f"AND {fund_sql}" if fund_sql else ""
+    rows = db.fetch_all(f"""
+        SELECT {COLUMNS} FROM transaction_events
+        WHERE seq > %s AND seq <= %s {scope}
+        ORDER BY seq
+        LIMIT %s
+    """, [after, through] + fund_params + [limit])
+    events = [dict(zip(COLUMN_NAMES, row)) for row in rows]
+    next_after = int(events[-1]["seq"]) if len(events) == limit else max(after, through)
+    return events, next_after
+
+
+@metrics.timed("events.history")
+def history(kind, transaction_id, fund_ids=None):
+    fund_sql, fund_params = queries.fund_clause(fund_ids)
+    scope = f"AND {fund_sql}" if fund_sql else ""
+    return db.read_frame(f"""
+        SELECT {COLUMNS} FROM transaction_events
+        WHERE transaction_type = %s AND transaction_id = %s {scope}
+        ORDER BY seq
+    """, [kind, transaction_id] + fund_params)
+
+
+@metrics.timed("events.changed_since", rows=None)
+def changed_since(seq, start, end, fund_ids=None):
+    # Whether any event after `seq` touched a transaction dated start..end.
+    # Walks the primary key from `seq` on, so it costs the events since then.
+    fund_sql, fund_params = queries.fund_clause(fund_ids)
+    scope = f"AND {fund_sql}" if fund_sql else ""
+    row = db.fetch_one(f"""
+        SELECT 1 FROM transaction_events
+        WHERE seq > %s AND date >= %s AND date <= %s {scope}
+        LIMIT 1
+    """, [seq, start, end] + fund_params)
+    return row is not None
+
+
+# --- Cache Follower --- #
+class Follower:
+    # Tails the log and invalidates the cache tags each event touches.
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+        self.after = high_water()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"polls": 0, "events": 0, "errors": 0}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="event-follower", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def poll(self):
+        events, self.after = tail(self.after)
+        tags = {tag for event in events for tag in TAGS[event["transaction_type"]]}
+        if tags:
+            cache.invalidate(*sorted(tags))
+        self.stats["polls"] += 1
+        self.stats["events"] += len(events)
+        return len(events)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                # Catch up in full before sleeping again.
+                while self.poll():
+                    pass
+            except Exception:
+                self.stats["errors"] += 1
+
+
+_follower = None
+_follower_lock = threading.Lock()
+
+
+def follow():
+    # Started once per process.
+    global _follower
+    with _follower_lock:
+        if _follower is None:
+            _follower = Follower().start()
+    return _follower
+
+
+def _follower_metrics():
+    if _follower is None:
+        return []
+    return [(f"funds_event_follower_{key}", {}, value) for key, value in _follower.stats.items()] + [
+        ("funds_event_follower_seq", {}, _follower.after)
+    ]
+
+
+metrics.register_collector(_follower_metrics)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the transaction event log")
+    parser.add_argument("--after", type=int, default=0, help="start after this sequence number")
+    parser.add_argument("--follow", action="store_true", help="keep printing new events as they arrive")
+    parser.add_argument("--history", nargs=2, metavar=("TRANSACTION_TYPE", "ID"),
+                        help="every event for one income/expense row")
+    args = parser.parse_args()
+
+    schema.ensure_schema()
+    if args.history:
+        print(history(args.history[0], int(args.history[1])).to_string(index=False))
+        return
+    after = args.after
+    while True:
+        events, after = tail(after)
+        for row in events:
+            if row["event"] == "insert":
+                status = row["new_status"]
+            else:
+                status = f"{row['old_status']} -> {row['new_status'] if row['event'] == 'status' else 'reversed'}"
+            print(f"{row['seq']:>8}  {row['created_at']}  {row['event']:<7} {row['transaction_type']:<7} "
+                  f"#{row['transaction_id']:<8} fund {row['fund_id']}  {row['department']:<14} "
+                  f"Rs.{float(row['amount']):,.2f}  {status}")
+        if not events:
+            if not args.follow:
+                return
+            time.sleep(POLL_INTERVAL)
+
+
+if __name__ == "__main__":
+    main()
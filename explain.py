@@ -0,0 +1,152 @@
+import argparse
+import re
+import sys
+from datetime import date, timedelta
+
+import analytics
+import auth
+import constants
+import db
+import events
+import ledger
+import queries
+import rollups
+import schema
+
+# --- Query Plan Check --- #
+# Runs the app's read paths with query capture on, EXPLAINs every statement
+# they issue and flags full table scans. Scans of the small bookkeeping
+# tables, and of workloads that aggregate every row by design, are reported
+# but not counted as failures.
+
+SMALL_TABLES = {
+    "funds", "department_balances", "transaction_rollups", "journal_checkpoints", "schema_migrations",
+    "fiscal_periods", "closing_balances", "closing_totals", "institutions", "report_artifacts",
+}
+
+# Workloads that read every row on purpose.
+WHOLE_TABLE = {"analytics.daily_cash_flow", "ledger.reconcile", "queries.summarize[all]"}
+
+_SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+
+
+def _uncached(func):
+    return getattr(func, "uncached", func)
+
+
+def workloads():
+    recent = date.today() - timedelta(days=30)
+    department, status = constants.DEPARTMENTS[0], constants.INCOME_STATUSES[0]
+    filters = {
+        "all": queries.make_filters(),
+        "date_range": queries.make_filters(start_date=recent, end_date=date.today()),
+        "type": queries.make_filters(types=[constants.INCOME_TYPES[0], constants.EXPENSE_TYPES[0]]),
+        "department_status": queries.make_filters(departments=[department], statuses=[status]),
+        "status": queries.make_filters(statuses=[status]),
+        "income_only": queries.make_filters(transaction_types=["income"], start_date=recent),
+        "archived": queries.make_filters(departments=[department], statuses=[status], include_archived=True),
+        "fund": queries.make_filters(fund_ids=[ledger.FUND_ID]),
+        "fund_date_range": queries.make_filters(start_date=recent, fund_ids=[ledger.FUND_ID]),
+        "fund_department_status": queries.make_filters(departments=[department], statuses=[status],
+                                                       fund_ids=[ledger.FUND_ID]),
+        "fund_status": queries.make_filters(statuses=[status], fund_ids=[ledger.FUND_ID]),
+    }
+    checks = {}
+    for label, f in filters.items():
+        checks[f"queries.fetch_page[{label}]"] = lambda f=f: _uncached(queries.fetch_page)(f)
+        checks[f"queries.fetch_page[{label}, next]"] = (
+            lambda f=f: _uncached(queries.fetch_page)(f, after=(recent, "income", 1))
+        )
+        checks[f"queries.summarize[{label}]"] = lambda f=f: _uncached(queries.summarize)(f)
+    checks.update({
+        "queries.fetch_descriptions": lambda: queries.fetch_descriptions([("income", 1), ("expense", 1)]),
+        "queries.get_filter_options": _uncached(queries.get_filter_options),
+        "queries.receipt_funds": lambda: queries.receipt_funds("0" * 64 + ".pdf"),
+        "rollups.breakdown": lambda: rollups.breakdown("income", "department"),
+        "rollups.breakdown[fund]": lambda: rollups.breakdown("income", "department", [ledger.FUND_ID]),
+        "rollups.breakdown[open]": lambda: rollups.breakdown("income", "department", None, "2024-03"),
+        "analytics.daily_cash_flow[fund]": lambda: _uncached(analytics.daily_cash_flow)([ledger.FUND_ID]),
+        "analytics.daily_cash_flow": _uncached(analytics.daily_cash_flow),
+        "ledger.get_fund_balance": _uncached(ledger.get_fund_balance),
+        "ledger.get_department_balances": _uncached(ledger.get_department_balances),
+        "ledger.get_fund_balance[fund]": lambda: _uncached(ledger.get_fund_balance)([ledger.FUND_ID]),
+        "ledger.reconcile": ledger.reconcile,
+        "auth.user_lookup": lambda: db.fetch_one(auth.USER_LOOKUP, ("nobody",)),
+        "events.high_water": events.high_water,
+        "events.tail": lambda: events.tail(events.high_water() - 100),
+        "events.tail[fund]": lambda: events.tail(events.high_water() - 100, fund_ids=[ledger.FUND_ID]),
+        "events.history": lambda: events.history("income", 1),
+        "events.changed_since": lambda: events.changed_since(events.high_water() - 100, recent, date.today()),
+    })
+    return checks
+
+
+def _tables(cursor):
+    # Real tables only; derived tables and subquery aliases also show up as scans.
+    if db.backend_name() == "mysql":
+        cursor.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = DATABASE()")
+    else:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def full_scans(query, params):
+    # Returns [(table, plan detail)] for every full table scan in the plan.
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        tables = _tables(cursor)
+        if db.backend_name() == "mysql":
+            cursor.execute("EXPLAIN " + query, params)
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            scans = [(row["table"], f"type=ALL rows={row.get('rows')}") for row in rows if row.get("type") == "ALL"]
+        else:
+            cursor.execute("EXPLAIN QUERY PLAN " + query, params)
+            scans = []
+            for row in cursor.fetchall():
+                match = _SQLITE_SCAN.match(row[-1])
+                if match:
+                    scans.append((match.group(1), row[-1]))
+        cursor.close()
+    return [(table, detail) for table, detail in scans if table in tables]
+
+
+def check(selected=None):
+    findings = []
+    for name, func in workloads().items():
+        if selected and not any(name.startswith(prefix) for prefix in selected):
+            continue
+        with db.capture_queries() as captured:
+            func()
+        seen = set()
+        for query, params in captured:
+            if query in seen:
+                continue
+            seen.add(query)
+            for table, detail in full_scans(query, params):
+                expected = table in SMALL_TABLES or name in WHOLE_TABLE
+                findings.append({"workload": name, "table": table, "detail": detail,
+                                 "expected": expected, "query": " ".join(query.split())})
+    return findings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag full table scans in the app's queries")
+    parser.add_argument("workloads", nargs="*", help="only check workloads starting with these names")
+    parser.add_argument("--verbose", action="store_true", help="also print the offending SQL")
+    args = parser.parse_args()
+
+    schema.ensure_schema()
+    findings = check(args.workloads)
+    unexpected = [finding for finding in findings if not finding["expected"]]
+    for finding in findings:
+        label = "ok  " if finding["expected"] else "SCAN"
+        print(f"{label} {finding['workload']}: {finding['table']} ({finding['detail']})")
+        if args.verbose and not finding["expected"]:
+            print(f"     {finding['query']}")
+    print(f"{len(unexpected)} unexpected full scan(s)")
+    sys.exit(1 if unexpected else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import csv
+import gzip
+import io
+import tempfile
+from datetime import date, datetime
+
+import db
+import metrics
+import queries
+
+# --- Streaming Export --- #
+# Rows are read a keyset page at a time, the same way the transaction views
+# page, and written straight to a spooled temporary file, so neither a full
+# DataFrame nor the full CSV string is ever built in memory. The pooled
+# connection goes back between pages: a slow download never holds one, at the
+# cost of each page seeing the rows committed when it is read.
+
+CHUNK_SIZE = 5000
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+FORMATS = {
+    "csv": ("text/csv", ".csv"),
+    "csv.gz": ("application/gzip", ".csv.gz"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+}
+
+COLUMN_NAMES = ["transaction_type"] + [column.strip() for column in queries.COLUMNS.split(",")]
+# The (date, transaction_type, id) keyset cursor of a row.
+KEY_COLUMNS = [COLUMN_NAMES.index(name) for name in ("date", "transaction_type", "id")]
+
+
+def iter_chunks(filters, chunk_size=CHUNK_SIZE):
+    after = None
+    while True:
+        query, params = queries.build_page_query(filters, after, chunk_size)
+        rows = db.fetch_all(query, params)
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        after = tuple(rows[-1][index] for index in KEY_COLUMNS)
+
+
+def write_csv(filters, fileobj, chunk_size=CHUNK_SIZE):
+    text = io.TextIOWrapper(fileobj, encoding="utf-8", newline="", write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(COLUMN_NAMES)
+    count = 0
+    for rows in iter_chunks(filters, chunk_size):
+        writer.writerows(rows)
+        count += len(rows)
+    text.flush()
+    # Leave the underlying file open for the caller.
+    text.detach()
+    return count
+
+
+def iter_csv(filters, chunk_size=CHUNK_SIZE):
+    # Generator form for callers that stream the response themselves.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMN_NAMES)
+    for rows in iter_chunks(filters, chunk_size):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _as_date(value):
+    return date.fromisoformat(value[:10]) if isinstance(value, str) else value
+
+
+def _as_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def write_parquet(filters, fileobj, chunk_size=CHUNK_SIZE):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires the pyarrow package")
+
+    arrow_schema = pa.schema([
+        ("transaction_type", pa.string()), ("id", pa.int64()), ("fund_id", pa.int64()), ("name", pa.string()),
+        ("user_id", pa.int64()), ("type", pa.string()), ("description", pa.string()),
+        ("amount", pa.float64()), ("date", pa.date32()), ("department", pa.string()),
+        ("status", pa.string()), ("created_at", pa.timestamp("s")),
+    ])
+    amount, day, created = (COLUMN_NAMES.index(name) for name in ("amount", "date", "created_at"))
+    count = 0
+    with pq.ParquetWriter(fileobj, arrow_schema) as writer:
+        for rows in iter_chunks(filters, chunk_size):
+            columns = [list(column) for column in zip(*rows)]
+            columns[amount] = [float(value) if value is not None else None for value in columns[amount]]
+            columns[day] = [_as_date(value) for value in columns[day]]
+            columns[created] = [_as_datetime(value) for value in columns[created]]
+            writer.write_table(pa.Table.from_arrays(columns, schema=arrow_schema))
+            count += len(rows)
+    return count
+
+
+@metrics.timed("exporter.export", rows=lambda result: result[1])
+def export(filters, fmt="csv", chunk_size=CHUNK_SIZE):
+    """Write the filtered transactions to a rewound spooled temp file.
+
+    Returns (file, row_count); the caller owns and closes the file.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode="w+b")
+    try:
+        if fmt == "csv":
+            count = write_csv(filters, spool, chunk_size)
+        elif fmt == "csv.gz":
+            with gzip.GzipFile(fileobj=spool, mode="wb") as compressed:
+                count = write_csv(filters, compressed, chunk_size)
+        else:
+            count = write_parquet(filters, spool, chunk_size)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, count
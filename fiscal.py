@@ -0,0 +1,177 @@
+import argparse
+import os
+from datetime import date, timedelta
+from decimal import Decimal
+
+import cache
+import db
+import ledger
+import metrics
+import queries
+import schema
+
+# --- Fiscal Year Close --- #
+# Closing a fiscal year snapshots the closing balance of every fund's
+# departments and the year's totals per (fund, transaction_type, type,
+# department, status), then moves the year's rows from income/expenses into
+# the archive tables in the same transaction. Day-to-day queries therefore
+# only ever read the open period; reconciliation starts from the last
+# snapshot. Every campus closes the same fiscal year together.
+#
+# Years are labelled by the calendar year they start in: with the default
+# April start, fiscal year 2023 runs 2023-04-01 to 2024-03-31.
+
+START_MONTH = int(os.environ.get("FUNDS_FISCAL_YEAR_START_MONTH", "4"))
+
+ARCHIVE_COLUMNS = ("id, fund_id, name, user_id, type, description, amount, date, department, status, "
+                   "receipt_path, created_at")
+
+
+def fiscal_year_of(day):
+    return day.year if day.month >= START_MONTH else day.year - 1
+
+
+def period(fiscal_year):
+    start = date(fiscal_year, START_MONTH, 1)
+    end = date(fiscal_year + 1, START_MONTH, 1) - timedelta(days=1) if START_MONTH > 1 else date(fiscal_year, 12, 31)
+    return start, end
+
+
+def label(fiscal_year):
+    if START_MONTH == 1:
+        return f"FY {fiscal_year}"
+    return f"FY {fiscal_year}-{(fiscal_year + 1) % 100:02d}"
+
+
+@metrics.timed("fiscal.closed_periods")
+@cache.cached(tags=("fiscal",))
+def closed_periods():
+    return db.read_frame("""
+        SELECT fiscal_year, start_date, end_date, closing_balance, income_rows, expense_rows, closed_at
+        FROM fiscal_periods ORDER BY fiscal_year
+    """)
+
+
+def next_closable():
+    # The earliest year with live rows, provided it has already ended.
+    row = db.fetch_one("SELECT MIN(date) FROM (SELECT MIN(date) AS date FROM income "
+                       "UNION ALL SELECT MIN(date) FROM expenses) firsts")
+    if not row or row[0] is None:
+        return None
+    fiscal_year = fiscal_year_of(date.fromisoformat(str(row[0])[:10]))
+    return fiscal_year if period(fiscal_year)[1] < date.today() else None
+
+
+def _count(cursor, sql, params):
+    cursor.execute(sql, params)
+    return int(cursor.fetchone()[0])
+
+
+@metrics.timed("fiscal.close_year", rows=None)
+def close_year(fiscal_year, user_id=None, allow_pending=False):
+    start, end = period(fiscal_year)
+    if end >= date.today():
+        raise ValueError(f"{label(fiscal_year)} has not ended yet")
+
+    with db.transaction() as cursor:
+        # Hold every fund's row lock for the whole close: postings wait, and
+        # ledger.ensure_open() sees the new period once they resume.
+        cursor.execute("UPDATE funds SET balance = balance")
+
+        cursor.execute("SELECT MAX(fiscal_year) FROM fiscal_periods")
+        last_closed = cursor.fetchone()[0]
+        if last_closed is not None and fiscal_year <= last_closed:
+            raise ValueError(f"{label(fiscal_year)} is already closed")
+        for table in queries.TABLES.values():
+            if _count(cursor, f"SELECT COUNT(*) FROM {table} WHERE date < %s", (start,)):
+                raise ValueError(f"{table} has rows before {label(fiscal_year)}; close the earlier year first")
+        if not allow_pending:
+            pending = sum(
+                _count(cursor, f"SELECT COUNT(*) FROM {table} WHERE date <= %s AND status = %s", (end, "Pending"))
+                for table in queries.TABLES.values()
+            )
+            if pending:
+                raise ValueError(f"{pending:,} transactions in {label(fiscal_year)} are still Pending")
+
+        # Closing balances: the previous snapshot plus this year's movements.
+        cursor.execute("""
+            SELECT fund_id, department, SUM(amount) FROM (
+                SELECT fund_id, department, balance AS amount FROM closing_balances WHERE fiscal_year = %s
+                UNION ALL
+                SELECT fund_id, department, amount FROM income WHERE date <= %s
+                UNION ALL
+                SELECT fund_id, department, -amount FROM expenses WHERE date <= %s
+            ) movements
+            GROUP BY fund_id, department
+        """, (last_closed, end, end))
+        balances = {(fund_id, department): Decimal(str(total or 0)).quantize(ledger.CENT)
+                    for fund_id, department, total in cursor.fetchall()}
+        cursor.executemany(
+            "INSERT INTO closing_balances (fiscal_year, fund_id, department, balance) VALUES (%s, %s, %s, %s)",
+            [(fiscal_year, fund_id, department, balance) for (fund_id, department), balance in balances.items()],
+        )
+
+        counts = {}
+        for kind, table in queries.TABLES.items():
+            cursor.execute(f"""
+                INSERT INTO closing_totals
+                    (fiscal_year, fund_id, transaction_type, type, department, status, total_amount, row_count)
+                SELECT %s, fund_id, '{kind}', type, department, status, SUM(amount), COUNT(*)
+                FROM {table} WHERE date <= %s
+                GROUP BY fund_id, type, department, status
+            """, (fiscal_year, end))
+            cursor.execute(f"""
+                INSERT INTO {queries.ARCHIVE_TABLES[kind]} ({ARCHIVE_COLUMNS})
+                SELECT {ARCHIVE_COLUMNS} FROM {table} WHERE date <= %s
+            """, (end,))
+            cursor.execute(f"DELETE FROM {table} WHERE date <= %s", (end,))
+            counts[kind] = cursor.rowcount
+
+        closing_balance = sum(balances.values(), Decimal("0"))
+        cursor.execute("""
+            INSERT INTO fiscal_periods
+                (fiscal_year, start_date, end_date, closing_balance, income_rows, expense_rows, closed_by)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, (fiscal_year, start, end, closing_balance, counts["income"], counts["expense"], user_id))
+
+    cache.invalidate("fiscal", "income", "expenses")
+    return {"fiscal_year": fiscal_year, "closing_balance": closing_balance,
+            "income_rows": counts["income"], "expense_rows": counts["expense"]}
+
+
+@metrics.timed("fiscal.closing_snapshot", rows=None)
+@cache.cached(tags=("fiscal",))
+def closing_snapshot(fiscal_year):
+    balances = db.read_frame("""
+        SELECT fund_id, department, balance FROM closing_balances WHERE fiscal_year = %s
+        ORDER BY fund_id, department
+    """, (fiscal_year,))
+    totals = db.read_frame("""
+        SELECT fund_id, transaction_type, type, department, status, total_amount, row_count
+        FROM closing_totals WHERE fiscal_year = %s
+        ORDER BY fund_id, transaction_type, type, department, status
+    """, (fiscal_year,))
+    return balances, totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Close fiscal years and archive their transactions")
+    parser.add_argument("--close", type=int, metavar="YEAR", help="close the fiscal year starting in YEAR")
+    parser.add_argument("--allow-pending", action="store_true", help="close even with Pending transactions")
+    args = parser.parse_args()
+
+    schema.ensure_schema()
+    if args.close is not None:
+        result = close_year(args.close, allow_pending=args.allow_pending)
+        print(f"Closed {label(args.close)}: archived {result['income_rows']:,} income and "
+              f"{result['expense_rows']:,} expense rows, closing balance Rs.{result['closing_balance']:,.2f}")
+    periods = closed_periods()
+    for row in periods.itertuples():
+        print(f"{label(row.fiscal_year)}  {row.start_date} to {row.end_date}  "
+              f"closing Rs.{float(row.closing_balance):,.2f}")
+    next_year = next_closable()
+    print(f"Next year to close: {label(next_year)}" if next_year is not None else "No ended year left to close")
+
+
+if __name__ == "__main__":
+    main()
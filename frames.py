@@ -0,0 +1,56 @@
+import pandas as pd
+
+import constants
+
+# --- Compact Transaction Frames --- #
+# Low-cardinality text columns become categoricals (filters then compare
+# integer codes), amounts become exact int64 paise, dates are parsed once and
+# ids are downcast. Descriptions are not loaded here; see
+# queries.fetch_descriptions().
+
+CATEGORIES = {
+    "transaction_type": ["income", "expense"],
+    "type": constants.INCOME_TYPES + constants.EXPENSE_TYPES,
+    "department": constants.DEPARTMENTS,
+    "status": sorted(set(constants.INCOME_STATUSES + constants.EXPENSE_STATUSES)),
+}
+
+
+def _categorical(series, known):
+    # Keep values outside the known lists (e.g. legacy rows) instead of NaN-ing them.
+    extra = sorted(set(series.dropna().astype(str)) - set(known))
+    return pd.Categorical(series, categories=known + extra)
+
+
+def to_paise(amounts):
+    return pd.to_numeric(amounts).mul(100).round().astype("int64")
+
+
+def compact(df):
+    df = df.copy()
+    for column, known in CATEGORIES.items():
+        if column in df.columns:
+            df[column] = _categorical(df[column], known)
+    if "amount" in df.columns:
+        df.insert(df.columns.get_loc("amount"), "amount_paise", to_paise(df["amount"]))
+        df = df.drop(columns="amount")
+    for column in ("date", "created_at"):
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column])
+    if "name" in df.columns:
+        df["name"] = df["name"].astype("string")
+    for column in ("id", "fund_id"):
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], downcast="integer")
+    if "user_id" in df.columns:
+        df["user_id"] = df["user_id"].astype("Int32")
+    return df
+
+
+def for_display(df):
+    # Rupee amounts for the handful of rows actually shown on screen.
+    if "amount_paise" not in df.columns:
+        return df
+    df = df.copy()
+    df.insert(df.columns.get_loc("amount_paise"), "amount", df["amount_paise"] / 100)
+    return df.drop(columns="amount_paise")
@@ -0,0 +1,242 @@
+import argparse
+import sys
+import time
+
+import pandas as pd
+
+import cache
+import constants
+import db
+import events
+import ledger
+import metrics
+import rollups
+import schema
+
+# --- Bulk Import --- #
+# Files are read in chunks, each chunk is validated with vectorised pandas
+# checks, and the valid rows of a chunk are written in one transaction with
+# executemany plus a single balance adjustment for the whole batch. The fund
+# is therefore only checked for overdraft at batch boundaries. A file is
+# always imported into a single fund.
+
+CHUNK_SIZE = 5000
+
+TEXT_COLUMNS = ["name", "type", "description", "department", "status", "receipt_path", "transaction_type"]
+REQUIRED_COLUMNS = ["name", "type", "amount", "date", "department", "status"]
+# Column sizes from schema.py: MySQL in strict mode refuses anything larger.
+# VARCHAR lengths count characters, the TEXT description counts bytes.
+MAX_LENGTHS = {"name": 255, "receipt_path": 255}
+MAX_DESCRIPTION_BYTES = 65535
+MAX_AMOUNT = 999999999999.99
+
+
+def read_chunks(source, chunk_size=CHUNK_SIZE, filename=None):
+    name = str(filename or getattr(source, "name", source)).lower()
+    if name.endswith((".xlsx", ".xlsm")):
+        yield from _read_excel_chunks(source, chunk_size)
+    else:
+        yield from pd.read_csv(source, chunksize=chunk_size, dtype=str)
+
+
+def _read_excel_chunks(source, chunk_size):
+    # pandas cannot stream Excel files; openpyxl's read-only mode can.
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else "" for cell in next(rows, [])]
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == chunk_size:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+
+
+def validate(chunk, kind=None, closed_through=None):
+    df = chunk.rename(columns=lambda column: str(column).strip().lower())
+    required = REQUIRED_COLUMNS if kind else REQUIRED_COLUMNS + ["transaction_type"]
+    missing = [column for column in required if column not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+    text = {
+        column: df[column].fillna("").astype(str).str.strip() if column in df.columns
+        else pd.Series("", index=df.index)
+        for column in TEXT_COLUMNS
+    }
+    kinds = pd.Series(kind, index=df.index) if kind else text["transaction_type"].str.lower()
+    amount = pd.to_numeric(df["amount"], errors="coerce").round(2)
+    dates = pd.to_datetime(df["date"], errors="coerce")
+
+    reasons = pd.Series("", index=df.index)
+
+    def reject(mask, reason):
+        reasons[mask] = reasons[mask] + reason + "; "
+
+    is_income = kinds.eq("income")
+    is_expense = kinds.eq("expense")
+    reject(~(is_income | is_expense), "unknown transaction_type")
+    reject(text["name"].eq(""), "missing name")
+    reject(amount.isna(), "amount is not a number")
+    reject(amount <= 0, "amount must be positive")
+    reject(amount > MAX_AMOUNT, "amount is too large")
+    reject(dates.isna(), "invalid date")
+    for column, length in MAX_LENGTHS.items():
+        reject(text[column].str.len() > length, f"{column} is longer than {length} characters")
+    reject(text["description"].str.encode("utf-8").str.len() > MAX_DESCRIPTION_BYTES, "description is too long")
+    if closed_through is not None:
+        reject(dates.dt.date <= pd.Timestamp(closed_through).date(), "date is in a closed fiscal year")
+    reject(
+        ~((is_income & text["type"].isin(constants.INCOME_TYPES))
+          | (is_expense & text["type"].isin(constants.EXPENSE_TYPES))),
+        "unknown type",
+    )
+    reject(~text["department"].isin(constants.DEPARTMENTS), "unknown department")
+    reject(
+        ~((is_income & text["status"].isin(constants.INCOME_STATUSES))
+          | (is_expense & text["status"].isin(constants.EXPENSE_STATUSES))),
+        "unknown status",
+    )
+
+    ok = reasons.eq("")
+    clean = pd.DataFrame({
+        "transaction_type": kinds,
+        "name": text["name"],
+        "type": text["type"],
+        "description": text["description"],
+        "amount": amount,
+        "date": dates.dt.date,
+        "department": text["department"],
+        "status": text["status"],
+        "receipt_path": text["receipt_path"].where(text["receipt_path"] != "", None),
+    })[ok]
+    rejected = chunk[~ok].assign(row=chunk.index[~ok] + 2, reason=reasons[~ok].str.rstrip("; "))
+    return clean, rejected
+
+
+def load_batch(clean, user_id=None, fund_id=ledger.FUND_ID):
+    with db.transaction() as cursor:
+        inserted = {}
+        for kind in ("income", "expense"):
+            rows = clean[clean["transaction_type"] == kind]
+            if rows.empty:
+                continue
+            inserted[kind] = (events.last_id(cursor, kind), len(rows))
+            cursor.executemany(ledger.INSERT_TRANSACTION[kind], list(zip(
+                rows["name"].tolist(), [user_id] * len(rows), rows["type"].tolist(),
+                rows["description"].tolist(), rows["amount"].tolist(), rows["date"].tolist(),
+                rows["department"].tolist(), rows["status"].tolist(), rows["receipt_path"].tolist(),
+                [fund_id] * len(rows),
+            )))
+
+        months = clean["date"].map(rollups.month_of)
+        grouped = clean.groupby(
+            [clean["transaction_type"], clean["type"], clean["department"], clean["status"], months]
+        )["amount"].agg(["sum", "count"])
+        rollups.apply_many(cursor, [
+            (fund_id, *key, round(float(total), 2), int(count))
+            for key, total, count in zip(grouped.index, grouped["sum"], grouped["count"])
+        ])
+
+        signed = clean["amount"].where(clean["transaction_type"] == "income", -clean["amount"])
+        deltas = signed.groupby(clean["department"]).sum().round(2)
+        ledger.post_batch(cursor, {(fund_id, department): float(delta) for department, delta in deltas.items()})
+        ledger.ensure_open(cursor, clean["date"].min())
+        # Events last: their seqs are allocated only once the fund lock is
+        # held, so a batch queued behind it leaves no gap in the log.
+        for kind, (after_id, count) in inserted.items():
+            events.record_inserts(cursor, kind, after_id, count)
+    cache.invalidate("income", "expenses", "funds", "department_balances")
+
+
+def load_each(clean, user_id=None, fund_id=ledger.FUND_ID):
+    # Row by row, so only the rows the database refuses are rejected;
+    # returns {index: reason} for those.
+    reasons = {}
+    for index in clean.index:
+        try:
+            load_batch(clean.loc[[index]], user_id, fund_id)
+        except Exception as e:
+            if db.is_transient(e):
+                raise
+            reasons[index] = str(e)
+    return reasons
+
+
+@metrics.timed("importer.run_import", rows=lambda result: result[0]["imported"])
+def run_import(source, kind=None, user_id=None, chunk_size=CHUNK_SIZE, filename=None, progress=None,
+               fund_id=ledger.FUND_ID):
+    stats = {"read": 0, "imported": 0, "rejected": 0, "batches": 0}
+    rejects = []
+    start = time.perf_counter()
+    closed_through = ledger.closed_through()
+
+    for chunk in read_chunks(source, chunk_size, filename):
+        chunk.index = pd.RangeIndex(stats["read"], stats["read"] + len(chunk))
+        stats["read"] += len(chunk)
+        clean, rejected = validate(chunk, kind, closed_through)
+        if not clean.empty:
+            try:
+                load_batch(clean, user_id, fund_id)
+                stats["imported"] += len(clean)
+                stats["batches"] += 1
+            except (ledger.InsufficientFunds, ledger.PeriodClosed) as e:
+                failed = chunk.loc[clean.index]
+                rejected = pd.concat([rejected, failed.assign(row=failed.index + 2, reason=f"batch rejected: {e}")])
+            except Exception as e:
+                if db.is_transient(e):
+                    raise
+                # A value validate() let through and the database refused.
+                reasons = load_each(clean, user_id, fund_id)
+                stats["imported"] += len(clean) - len(reasons)
+                stats["batches"] += len(clean) - len(reasons)
+                failed = chunk.loc[list(reasons)]
+                rejected = pd.concat([rejected, failed.assign(row=failed.index + 2, reason=list(reasons.values()))])
+        if not rejected.empty:
+            stats["rejected"] += len(rejected)
+            rejects.append(rejected)
+        if progress is not None:
+            progress(stats)
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["rows_per_second"] = stats["imported"] / stats["seconds"] if stats["seconds"] else 0.0
+    rejected = pd.concat(rejects).sort_values("row") if rejects else pd.DataFrame(columns=["row", "reason"])
+    return stats, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import income and expense records from CSV or Excel")
+    parser.add_argument("path", help="CSV or .xlsx file to import")
+    parser.add_argument("--kind", choices=["income", "expense"],
+                        help="record type for every row; omit to read a transaction_type column")
+    parser.add_argument("--user-id", type=int, help="user the records are attributed to")
+    parser.add_argument("--fund-id", type=int, default=ledger.FUND_ID, help="fund the records are posted to")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows per batch transaction")
+    parser.add_argument("--rejects", default="rejected_rows.csv", help="where to write rejected rows")
+    args = parser.parse_args()
+
+    schema.ensure_schema()
+
+    def progress(stats):
+        print(f"\r{stats['read']:,} read, {stats['imported']:,} imported, {stats['rejected']:,} rejected",
+              end="", file=sys.stderr)
+
+    stats, rejected = run_import(args.path, args.kind, args.user_id, args.chunk_size, progress=progress,
+                                 fund_id=args.fund_id)
+    print(file=sys.stderr)
+    print(f"Imported {stats['imported']:,} of {stats['read']:,} rows in {stats['batches']:,} batches, "
+          f"{stats['seconds']:.2f}s ({stats['rows_per_second']:,.0f} rows/s)")
+    if not rejected.empty:
+        rejected.to_csv(args.rejects, index=False)
+        print(f"{stats['rejected']:,} rows rejected; see {args.rejects}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+import argparse
+from decimal import Decimal
+
+import cache
+import constants
+import db
+import events
+import metrics
+import queries
+import rollups
+import schema
+
+# --- Ledger --- #
+# Each fund's balance is materialised in its `funds` row and split per
+# department in `department_balances`, keyed by fund. Every posting happens
+# inside the caller's transaction and locks only its own fund's row, touched
+# last so the lock is only held for the tail end of the transaction; postings
+# to different funds never wait on each other.
+
+# The default institution's General Fund, used when no fund is given.
+FUND_ID = 1
+
+CENT = Decimal("0.01")
+
+UPSERT_DEPARTMENT = {
+    "mysql": """
+        INSERT INTO department_balances (fund_id, department, balance) VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE balance = balance + VALUES(balance)
+    """,
+    "sqlite": """
+        INSERT INTO department_balances (fund_id, department, balance) VALUES (%s, %s, %s)
+        ON CONFLICT(fund_id, department) DO UPDATE SET balance = balance + excluded.balance
+    """,
+}
+
+
+class UnknownFund(ValueError):
+    def __init__(self, fund_id):
+        self.fund_id = fund_id
+        super().__init__(f"Fund {fund_id} does not exist")
+
+
+class InsufficientFunds(Exception):
+    def __init__(self, amount, balance):
+        self.amount = amount
+        self.balance = balance
+        super().__init__(
+            f"Expense amount (Rs.{float(amount):,.2f}) exceeds available balance (Rs.{float(balance):,.2f})"
+        )
+
+
+class UnknownTransaction(ValueError):
+    def __init__(self, kind, transaction_id):
+        self.kind = kind
+        self.transaction_id = transaction_id
+        super().__init__(f"No {kind} transaction {transaction_id}")
+
+
+class PeriodClosed(ValueError):
+    def __init__(self, date, closed_through):
+        self.date = date
+        self.closed_through = closed_through
+        super().__init__(f"{date} falls in a closed fiscal year (closed through {closed_through})")
+
+
+@cache.cached(tags=("fiscal",))
+def closed_through():
+    # End date of the last closed fiscal year, or None.
+    row = db.fetch_one("SELECT MAX(end_date) FROM fiscal_periods")
+    return row[0] if row else None
+
+
+# A locking read on MySQL: a plain SELECT would answer from the snapshot the
+# transaction opened on its first read (events.last_id in the bulk paths),
+# which predates a close the caller waited out on the funds lock. SQLite
+# writers are serialised and always read the latest data.
+CLOSED_THROUGH = {
+    "mysql": "SELECT MAX(end_date) FROM fiscal_periods LOCK IN SHARE MODE",
+    "sqlite": "SELECT MAX(end_date) FROM fiscal_periods",
+}
+
+
+def ensure_open(cursor, date):
+    # Called after the funds row is locked: a fiscal close holds that lock
+    # for its whole transaction, so it cannot commit between check and insert.
+    cursor.execute(CLOSED_THROUGH[db.backend_name()])
+    closed_through = cursor.fetchone()[0]
+    if closed_through is not None and str(date)[:10] <= str(closed_through)[:10]:
+        raise PeriodClosed(date, closed_through)
+
+
+def _adjust_department(cursor, fund_id, department, delta):
+    cursor.execute(UPSERT_DEPARTMENT[db.backend_name()], (fund_id, department, delta))
+
+
+def _credit_fund(cursor, amount, fund_id=FUND_ID):
+    cursor.execute("UPDATE funds SET balance = balance + %s WHERE id = %s", (amount, fund_id))
+    if cursor.rowcount == 0:
+        # MySQL also reports no affected rows for a zero amount.
+        cursor.execute("SELECT 1 FROM funds WHERE id = %s", (fund_id,))
+        if cursor.fetchone() is None:
+            raise UnknownFund(fund_id)
+
+
+def credit(cursor, amount, department, fund_id=FUND_ID):
+    _adjust_department(cursor, fund_id, department, amount)
+    _credit_fund(cursor, amount, fund_id)
+
+
+def _debit_fund(cursor, amount, fund_id=FUND_ID):
+    # Check and update in one statement: the row lock taken by the UPDATE makes
+    # the balance test atomic, so concurrent expenses can never overdraw.
+    cursor.execute(
+        "UPDATE funds SET balance = balance - %s WHERE id = %s AND balance >= %s",
+        (amount, fund_id, amount),
+    )
+    if cursor.rowcount == 0:
+        cursor.execute("SELECT balance FROM funds WHERE id = %s", (fund_id,))
+        row = cursor.fetchone()
+        if row is None:
+            raise UnknownFund(fund_id)
+        if row[0] < amount:
+            raise InsufficientFunds(amount, row[0])
+
+
+def debit(cursor, amount, department, fund_id=FUND_ID):
+    _adjust_department(cursor, fund_id, department, -amount)
+    _debit_fund(cursor, amount, fund_id)
+
+
+def post_batch(cursor, department_deltas):
+    # department_deltas: {(fund_id, department): delta}. Bulk loads apply one
+    # adjustment per department and a single update per fund; a negative net
+    # is checked exactly like a debit. Funds are locked in id order so two
+    # batches spanning the same funds cannot deadlock.
+    cursor.executemany(
+        UPSERT_DEPARTMENT[db.backend_name()],
+        [(fund_id, department, delta) for (fund_id, department), delta in sorted(department_deltas.items())],
+    )
+    nets = {}
+    for (fund_id, _), delta in department_deltas.items():
+        nets[fund_id] = nets.get(fund_id, 0) + delta
+    for fund_id, net in sorted(nets.items()):
+        if net >= 0:
+            _credit_fund(cursor, net, fund_id)
+        else:
+            _debit_fund(cursor, -net, fund_id)
+
+
+# --- Recording Transactions --- #
+INSERT_TRANSACTION = {
+    "income": """
+        INSERT INTO income (
+            name, user_id, type, description, amount, date, department, status, receipt_path, fund_id
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """,
+    "expense": """
+        INSERT INTO expenses (
+            name, user_id, type, description, amount, date, department, status, receipt_path, fund_id
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """,
+}
+
+
+@metrics.timed("ledger.record_income", rows=None)
+def record_income(name, user_id, i_type, description, amount, date, department, status, receipt_path=None,
+                  fund_id=FUND_ID):
+    with db.transaction() as cursor:
+        cursor.execute(
+            INSERT_TRANSACTION["income"],
+            (name, user_id, i_type, description, amount, date, department, status, receipt_path, fund_id),
+        )
+        income_id = cursor.lastrowid
+        rollups.apply(cursor, fund_id, "income", i_type, department, status, date, amount)
+        credit(cursor, amount, department, fund_id)
+        events.record(cursor, "insert", "income", income_id, fund_id, i_type, department, date, amount,
+                      new_status=status, user_id=user_id)
+        ensure_open(cursor, date)
+    cache.invalidate("income", "funds", "department_balances")
+    return income_id
+
+
+@metrics.timed("ledger.record_expense", rows=None)
+def record_expense(name, user_id, e_type, description, amount, date, department, status, receipt_path=None,
+                   fund_id=FUND_ID):
+    # InsufficientFunds propagates out of the transaction, rolling back the insert.
+    with db.transaction() as cursor:
+        cursor.execute(
+            INSERT_TRANSACTION["expense"],
+            (name, user_id, e_type, description, amount, date, department, status, receipt_path, fund_id),
+        )
+        expense_id = cursor.lastrowid
+        rollups.apply(cursor, fund_id, "expense", e_type, department, status, date, amount)
+        debit(cursor, amount, department, fund_id)
+        events.record(cursor, "insert", "expense", expense_id, fund_id, e_type, department, date, amount,
+                      new_status=status, user_id=user_id)
+        ensure_open(cursor, date)
+    cache.invalidate("expenses", "funds", "department_balances")
+    return expense_id
+
+
+# --- Status Changes and Reversals --- #
+# Rows are never edited beyond their status. A mistaken entry is reversed:
+# the row leaves the books, its posting and rollup are undone, and the
+# `reverse` event keeps the full row. Both paths are limited to open fiscal
+# years and to the caller's funds.
+TRANSACTION_FIELDS = ("fund_id", "name", "user_id", "type", "description", "amount", "date", "department",
+                      "status", "receipt_path", "created_at")
+MOVEMENT_FIELDS = ("fund_id", "type", "department", "date", "amount")
+
+
+def _load(cursor, kind, transaction_id, fund_ids):
+    cursor.execute(
+        f"SELECT {', '.join(TRANSACTION_FIELDS)} FROM {queries.TABLES[kind]} WHERE id = %s", (transaction_id,)
+    )
+    row = cursor.fetchone()
+    if row is None:
+        cursor.execute(f"SELECT date FROM {queries.ARCHIVE_TABLES[kind]} WHERE id = %s", (transaction_id,))
+        archived = cursor.fetchone()
+        if archived is not None:
+            raise PeriodClosed(archived[0], closed_through())
+        raise UnknownTransaction(kind, transaction_id)
+    row = dict(zip(TRANSACTION_FIELDS, row))
+    scope = queries.scope(fund_ids)
+    if scope is not None and row["fund_id"] not in scope:
+        raise UnknownTransaction(kind, transaction_id)
+    return row
+
+
+def _changed(kind, transaction_id):
+    return ValueError(f"{kind.title()} {transaction_id} was changed by someone else; reload and try again")
+
+
+@metrics.timed("ledger.set_status", rows=None)
+def set_status(kind, transaction_id, status, user_id=None, fund_ids=None):
+    if status not in constants.STATUSES[kind]:
+        raise ValueError(f"Unknown {kind} status '{status}'")
+    table = queries.TABLES[kind]
+    with db.transaction() as cursor:
+        row = _load(cursor, kind, transaction_id, fund_ids)
+        if row["status"] == status:
+            raise ValueError(f"{kind.title()} {transaction_id} is already {status}")
+        cursor.execute(
+            f"UPDATE {table} SET status = %s WHERE id = %s AND status = %s", (status, transaction_id, row["status"])
+        )
+        if cursor.rowcount == 0:
+            raise _changed(kind, transaction_id)
+        fund_id, t_type, department, date, amount = (row[key] for key in MOVEMENT_FIELDS)
+        rollups.apply(cursor, fund_id, kind, t_type, department, row["status"], date, -amount, count=-1)
+        rollups.apply(cursor, fund_id, kind, t_type, department, status, date, amount)
+        # No money moves, but the fund lock orders this against a fiscal close.
+        cursor.execute("UPDATE funds SET balance = balance WHERE id = %s", (fund_id,))
+        events.record(cursor, "status", kind, transaction_id, fund_id, t_type, department, date, amount,
+                      old_status=row["status"], new_status=status, user_id=user_id)
+        ensure_open(cursor, date)
+    cache.invalidate(table)
+
+
+@metrics.timed("ledger.reverse", rows=None)
+def reverse(kind, transaction_id, reason, user_id=None, fund_ids=None):
+    # Income that has since been spent cannot be reversed: the debit raises
+    # InsufficientFunds like any other expense.
+    if not reason.strip():
+        raise ValueError("A reason is required to reverse a transaction")
+    table = queries.TABLES[kind]
+    with db.transaction() as cursor:
+        row = _load(cursor, kind, transaction_id, fund_ids)
+        cursor.execute(f"DELETE FROM {table} WHERE id = %s AND status = %s", (transaction_id, row["status"]))
+        if cursor.rowcount == 0:
+            raise _changed(kind, transaction_id)
+        fund_id, t_type, department, date, amount = (row[key] for key in MOVEMENT_FIELDS)
+        rollups.apply(cursor, fund_id, kind, t_type, department, row["status"], date, -amount, count=-1)
+        if kind == "income":
+            debit(cursor, amount, department, fund_id)
+        else:
+            credit(cursor, amount, department, fund_id)
+        events.record(cursor, "reverse", kind, transaction_id, fund_id, t_type, department, date, amount,
+                      old_status=row["status"], user_id=user_id, detail=dict(row, reason=reason.strip()))
+        ensure_open(cursor, date)
+    cache.invalidate(table, "funds", "department_balances")
+    return row
+
+
+def _scoped(fund_ids, column="fund_id"):
+    fund_sql, params = queries.fund_clause(fund_ids, column)
+    return (f"WHERE {fund_sql}" if fund_sql else ""), params
+
+
+@metrics.timed("ledger.get_fund_balance", rows=None)
+@cache.cached(tags=("funds",))
+def get_fund_balance(fund_ids=None):
+    # Combined balance of `fund_ids` (every fund when None).
+    where, params = _scoped(fund_ids, "id")
+    row = db.fetch_one(f"SELECT SUM(balance) FROM funds {where}", params)
+    return row[0] if row and row[0] is not None else Decimal("0")
+
+
+@metrics.timed("ledger.get_department_balances")
+@cache.cached(tags=("department_balances",))
+def get_department_balances(fund_ids=None):
+    where, params = _scoped(fund_ids)
+    return db.read_frame(f"""
+        SELECT department, SUM(balance) AS balance FROM department_balances {where}
+        GROUP BY department ORDER BY department
+    """, params)
+
+
+@metrics.timed("ledger.opening_balance", rows=None)
+@cache.cached(tags=("fiscal",))
+def opening_balance(fund_ids=None):
+    # Balance of `fund_ids` at the end of the last closed fiscal year (0 before any close).
+    fund_sql, params = queries.fund_clause(fund_ids)
+    scope = f"AND {fund_sql}" if fund_sql else ""
+    row = db.fetch_one(f"""
+        SELECT SUM(balance) FROM closing_balances
+        WHERE fiscal_year = (SELECT MAX(fiscal_year) FROM fiscal_periods) {scope}
+    """, params)
+    return row[0] if row and row[0] is not None else Decimal("0")
+
+
+# --- Reconciliation --- #
+# Expected balances are the last fiscal close's snapshot plus the open
+# period's rows, so the recompute never has to read the archives.
+def _recompute(cursor):
+    cursor.execute("""
+        SELECT fund_id, department, SUM(amount) FROM (
+            SELECT fund_id, department, balance AS amount FROM closing_balances
+            WHERE fiscal_year = (SELECT MAX(fiscal_year) FROM fiscal_periods)
+            UNION ALL
+            SELECT fund_id, department, amount FROM income
+            UNION ALL
+            SELECT fund_id, department, -amount FROM expenses
+        ) movements
+        GROUP BY fund_id, department
+    """)
+    # Rounded to cents: SQLite sums DECIMAL columns as floating point.
+    return {(fund_id, department): Decimal(str(total or 0)).quantize(CENT)
+            for fund_id, department, total in cursor.fetchall()}
+
+
+def reconcile(fix=False):
+    """Recompute balances from the last close plus income/expenses and report any drift.
+
+    Drift is keyed by (fund_id, department), with department None for a
+    fund's total.
+    """
+    with db.transaction() as cursor:
+        # A no-op update takes every fund's row lock on both backends, so no
+        # posting can slip in between the recompute and the rewrite.
+        cursor.execute("UPDATE funds SET balance = balance")
+        expected = _recompute(cursor)
+
+        cursor.execute("SELECT fund_id, department, balance FROM department_balances")
+        stored = {(fund_id, department): Decimal(str(balance)).quantize(CENT)
+                  for fund_id, department, balance in cursor.fetchall()}
+        cursor.execute("SELECT id, balance FROM funds")
+        stored_totals = {fund_id: Decimal(str(balance)).quantize(CENT) for fund_id, balance in cursor.fetchall()}
+        expected_totals = dict.fromkeys(stored_totals, Decimal("0"))
+        for (fund_id, _), balance in expected.items():
+            expected_totals[fund_id] = expected_totals.get(fund_id, Decimal("0")) + balance
+
+        drift = {}
+        for key in sorted(set(expected) | set(stored)):
+            want = expected.get(key, Decimal("0"))
+            have = stored.get(key, Decimal("0"))
+            if want != have:
+                drift[key] = (have, want)
+        for fund_id in sorted(expected_totals):
+            want = expected_totals[fund_id]
+            have = stored_totals.get(fund_id, Decimal("0"))
+            if want != have:
+                drift[(fund_id, None)] = (have, want)
+
+        if fix and drift:
+            cursor.execute("DELETE FROM department_balances")
+            cursor.executemany(
+                "INSERT INTO department_balances (fund_id, department, balance) VALUES (%s, %s, %s)",
+                [(fund_id, department, balance) for (fund_id, department), balance in expected.items()],
+            )
+            cursor.executemany(
+                "UPDATE funds SET balance = %s WHERE id = %s",
+                [(balance, fund_id) for fund_id, balance in sorted(expected_totals.items())],
+            )
+    if fix and drift:
+        cache.invalidate("funds", "department_balances")
+    return drift
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile fund balances against income and expenses")
+    parser.add_argument("--fix", action="store_true", help="rewrite stored balances when they drift")
+    args = parser.parse_args()
+
+    schema.ensure_schema()
+    drift = reconcile(fix=args.fix)
+    if not drift:
+        print("Balances are consistent.")
+        return
+    for (fund_id, department), (have, want) in drift.items():
+        label = f"Fund {fund_id} total" if department is None else f"Fund {fund_id} {department}"
+        print(f"{label}: stored Rs.{have:,.2f}, expected Rs.{want:,.2f}")
+    print("Balances rewritten." if args.fix else "Run with --fix to rewrite stored balances.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Instrumentation --- #
+# Every instrumented call is recorded twice: into process-wide totals (for the
+# Prometheus dump) and into the current Streamlit rerun, if one is active, so
+# the admin page can show where a slow page spent its time.
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RECENT_RUNS = int(os.environ.get("FUNDS_METRICS_RECENT_RUNS", "100"))
+# The scrape endpoint has no authentication; only local scrapers reach it by default.
+METRICS_HOST = os.environ.get("FUNDS_METRICS_HOST", "127.0.0.1")
+
+
+class _Stat:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.buckets = [0] * len(BUCKETS)
+
+    def add(self, seconds, rows, error):
+        self.count += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        if rows is not None:
+            self.rows += rows
+        if error:
+            self.errors += 1
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+_runs = deque(maxlen=RECENT_RUNS)
+_current_run = contextvars.ContextVar("funds_metrics_run", default=None)
+_collectors = []
+
+
+def record(name, seconds, rows=None, error=False):
+    with _stats_lock:
+        _stats.setdefault(name, _Stat()).add(seconds, rows, error)
+    run = _current_run.get()
+    if run is not None:
+        run["calls"].setdefault(name, _Stat()).add(seconds, rows, error)
+
+
+def count_rows(result):
+    if isinstance(result, tuple) and result and hasattr(result[0], "__len__"):
+        result = result[0]
+    if isinstance(result, list) or hasattr(result, "shape"):
+        return len(result)
+    return None
+
+
+@contextmanager
+def span(name):
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        record(name, time.perf_counter() - started, error=error)
+
+
+def timed(name=None, rows=count_rows):
+    def decorator(func):
+        metric = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                record(metric, time.perf_counter() - started, error=True)
+                raise
+            record(metric, time.perf_counter() - started, rows(result) if rows else None)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+# --- Per-rerun Tracking --- #
+@contextmanager
+def rerun(label, user=None):
+    run = {"label": label, "user": user, "started": time.time(), "calls": {}}
+    token = _current_run.set(run)
+    started = time.perf_counter()
+    try:
+        yield run
+    finally:
+        run["seconds"] = time.perf_counter() - started
+        _current_run.reset(token)
+        _runs.append(run)
+
+
+def set_label(label):
+    run = _current_run.get()
+    if run is not None:
+        run["label"] = label
+
+
+def recent_runs():
+    rows = []
+    for run in list(_runs):
+        calls = run["calls"]
+        db_calls = [stat for name, stat in calls.items() if name.startswith("db.")]
+        rows.append({
+            "started": time.strftime("%H:%M:%S", time.localtime(run["started"])),
+            "page": run["label"],
+            "user": run["user"],
+            "seconds": round(run["seconds"], 4),
+            "calls": sum(stat.count for stat in calls.values()),
+            "db_queries": sum(stat.count for name, stat in calls.items() if name.startswith("db.query")),
+            "db_seconds": round(sum(stat.seconds for stat in db_calls), 4),
+            "rows": sum(stat.rows for name, stat in calls.items() if name.startswith("db.query")),
+            "connect_seconds": round(calls["db.connect"].seconds, 4) if "db.connect" in calls else 0.0,
+        })
+    return rows[::-1]
+
+
+def summary():
+    with _stats_lock:
+        items = [(name, stat.count, stat.errors, stat.seconds, stat.max_seconds, stat.rows)
+                 for name, stat in _stats.items()]
+    return [
+        {
+            "name": name, "calls": count, "errors": errors,
+            "total_seconds": round(seconds, 4),
+            "mean_ms": round(seconds / count * 1000, 3) if count else 0.0,
+            "max_ms": round(max_seconds * 1000, 3),
+            "rows": rows,
+        }
+        for name, count, errors, seconds, max_seconds, rows in sorted(items, key=lambda item: -item[3])
+    ]
+
+
+def reset():
+    with _stats_lock:
+        _stats.clear()
+    _runs.clear()
+
+
+# --- Prometheus Export --- #
+def register_collector(collector):
+    # collector() returns [(metric_name, {labels}, value), ...] gauges.
+    _collectors.append(collector)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def prometheus_text():
+    lines = [
+        "# HELP funds_call_seconds Duration of instrumented calls.",
+        "# TYPE funds_call_seconds histogram",
+    ]
+    with _stats_lock:
+        items = sorted(_stats.items())
+        snapshot = [(name, stat.count, stat.errors, stat.seconds, stat.rows, list(stat.buckets))
+                    for name, stat in items]
+    for name, count, _, seconds, _, buckets in snapshot:
+        for bound, bucket in zip(BUCKETS, buckets):
+            lines.append(f"funds_call_seconds_bucket{_labels({'name': name, 'le': bound})} {bucket}")
+        lines.append(f"funds_call_seconds_bucket{_labels({'name': name, 'le': '+Inf'})} {count}")
+        lines.append(f"funds_call_seconds_sum{_labels({'name': name})} {seconds:.6f}")
+        lines.append(f"funds_call_seconds_count{_labels({'name': name})} {count}")
+    lines.append("# HELP funds_call_errors_total Instrumented calls that raised.")
+    lines.append("# TYPE funds_call_errors_total counter")
+    for name, _, errors, _, _, _ in snapshot:
+        lines.append(f"funds_call_errors_total{_labels({'name': name})} {errors}")
+    lines.append("# HELP funds_call_rows_total Rows returned by instrumented calls.")
+    lines.append("# TYPE funds_call_rows_total counter")
+    for name, _, _, _, rows, _ in snapshot:
+        lines.append(f"funds_call_rows_total{_labels({'name': name})} {rows}")
+    for collector in _collectors:
+        for metric, labels, value in collector():
+            lines.append(f"{metric}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def serve(port, host=METRICS_HOST):
+    # Optional scrape endpoint; started once per process.
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    return _server
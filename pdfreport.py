@@ -0,0 +1,151 @@
+import functools
+from datetime import datetime
+from io import BytesIO
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+
+import exporter
+import queries
+import reports
+
+# --- PDF Rendering --- #
+# Everything that needs reportlab. reports.generate_financial_pdf imports this
+# module on the first report, so pages that never render a PDF never pay for
+# loading reportlab.
+TRANSACTION_TABLE_ROWS = 500
+
+TABLE_STYLE = TableStyle([
+    ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#34495e")),
+    ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+    ("FONTSIZE", (0, 0), (-1, -1), 8),
+    ("ALIGN", (1, 0), (-1, -1), "RIGHT"),
+    ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#f4f6f7")]),
+    ("GRID", (0, 0), (-1, -1), 0.25, colors.HexColor("#bdc3c7")),
+])
+
+TOTAL_ROW_STYLE = [("FONTNAME", (0, -1), (-1, -1), "Helvetica-Bold")]
+
+TRANSACTION_STYLE = TableStyle(TABLE_STYLE.getCommands() + [
+    ("ALIGN", (0, 0), (-2, -1), "LEFT"),
+])
+
+TRANSACTION_HEADER = ["Date", "Kind", "Type", "Name", "Department", "Status", "Amount"]
+
+
+@functools.lru_cache(maxsize=1)
+def get_styles():
+    # getSampleStyleSheet builds every style from scratch; do it once.
+    return getSampleStyleSheet()
+
+
+def _money(value):
+    return f"Rs.{float(value):,.2f}"
+
+
+def _breakdown_table(df, label):
+    total = float(df['total_amount'].sum())
+    rows = [[label, "Amount", "Share"]]
+    for t_type, amount in zip(df['type'], df['total_amount']):
+        share = float(amount) / total * 100 if total else 0.0
+        rows.append([t_type, _money(amount), f"{share:.1f}%"])
+    rows.append(["Total", _money(total), "100.0%"])
+    table = Table(rows, hAlign="LEFT")
+    table.setStyle(TABLE_STYLE)
+    table.setStyle(TableStyle(TOTAL_ROW_STYLE))
+    return table, total
+
+
+def _breakdown_section(story, heading, df, label, total_label, empty_text):
+    styles = get_styles()
+    story.append(Paragraph(heading, styles['Heading2']))
+    if df.empty:
+        story.append(Paragraph(empty_text, styles['Normal']))
+        return
+    table, total = _breakdown_table(df, label)
+    story.append(Paragraph(f"{total_label}: {_money(total)}", styles['Normal']))
+    story.append(Spacer(1, 12))
+    story.append(table)
+
+
+def _comparison_section(story, heading, column, label, filters):
+    # Income vs expenses side by side, grouped by a rollup column.
+    styles = get_styles()
+    income = {key: float(value) for key, value in zip(*_rollup_columns("income", column, filters))}
+    expense = {key: float(value) for key, value in zip(*_rollup_columns("expense", column, filters))}
+    story.append(Paragraph(heading, styles['Heading2']))
+    keys = sorted(set(income) | set(expense))
+    if not keys:
+        story.append(Paragraph("No data available", styles['Normal']))
+        return
+    rows = [[label, "Income", "Expenses", "Net"]]
+    for key in keys:
+        rows.append([key, _money(income.get(key, 0)), _money(expense.get(key, 0)),
+                     _money(income.get(key, 0) - expense.get(key, 0))])
+    total_income, total_expense = sum(income.values()), sum(expense.values())
+    rows.append(["Total", _money(total_income), _money(total_expense), _money(total_income - total_expense)])
+    table = Table(rows, hAlign="LEFT", repeatRows=1)
+    table.setStyle(TABLE_STYLE)
+    table.setStyle(TableStyle(TOTAL_ROW_STYLE))
+    story.append(table)
+
+
+def _rollup_columns(transaction_type, column, filters):
+    df = reports.breakdown(transaction_type, column, filters)
+    return df[column].tolist(), df['total_amount'].tolist()
+
+
+def _transaction_section(story, filters):
+    styles = get_styles()
+    story.append(PageBreak())
+    story.append(Paragraph("Transactions", styles['Heading2']))
+    count = 0
+    # One table per chunk keeps reportlab's layout work per flowable small;
+    # repeatRows carries the header onto every page.
+    for rows in exporter.iter_chunks(filters, TRANSACTION_TABLE_ROWS):
+        data = [TRANSACTION_HEADER]
+        for row in rows:
+            transaction_type, _, _, name, _, t_type, _, amount, date, department, status, _ = row
+            data.append([str(date)[:10], transaction_type, t_type, str(name)[:30], department, status, _money(amount)])
+        table = Table(data, hAlign="LEFT", repeatRows=1)
+        table.setStyle(TRANSACTION_STYLE)
+        story.append(table)
+        count += len(rows)
+    if not count:
+        story.append(Paragraph("No transactions match the selected filters", styles['Normal']))
+
+
+def render(income_df, expense_df, report_title, include_details=False, filters=None):
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, title=report_title)
+    styles = get_styles()
+    story = []
+
+    story.append(Paragraph(report_title, styles['Title']))
+    story.append(Spacer(1, 12))
+
+    _breakdown_section(story, "Income Breakdown", income_df, "Source", "Total Income", "No income data available")
+    story.append(Spacer(1, 24))
+    _breakdown_section(story, "Expense Breakdown", expense_df, "Category", "Total Expenses", "No expense data available")
+
+    if include_details:
+        filters = filters or queries.make_filters()
+        story.append(Spacer(1, 24))
+        _comparison_section(story, "By Department", "department", "Department", filters)
+        story.append(Spacer(1, 24))
+        _comparison_section(story, "Monthly Summary", "month", "Month", filters)
+        _transaction_section(story, filters)
+
+    story.append(Spacer(1, 36))
+    story.append(Paragraph(
+        f"Report generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+        styles['Italic']
+    ))
+
+    doc.build(story)
+    pdf = buffer.getvalue()
+    buffer.close()
+    return pdf
@@ -0,0 +1,238 @@
+import cache
+import db
+import metrics
+
+# --- Transaction Query Builder --- #
+# Filters are pushed into each branch of the income/expenses UNION so the
+# database can use the per-table indexes, and pages are fetched by keyset
+# (date DESC, transaction_type, id DESC) instead of OFFSET. Rows from closed
+# fiscal years live in the archive tables and are only read when the filters
+# ask for them. Filters carry the caller's tenant scope (`fund_ids`), which
+# always goes first so the fund-led indexes keep each campus's reads to its
+# own rows.
+
+TABLES = {"income": "income", "expense": "expenses"}
+
+ARCHIVE_TABLES = {"income": "income_archive", "expense": "expenses_archive"}
+
+COLUMNS = "id, fund_id, name, user_id, type, description, amount, date, department, status, created_at"
+
+# Page views leave the heavy description text out; see fetch_descriptions().
+PAGE_COLUMNS = "id, fund_id, name, user_id, type, amount, date, department, status, created_at"
+
+
+def scope(fund_ids):
+    # None means every fund; an empty scope (a campus with no funds yet)
+    # matches nothing rather than everything.
+    return None if fund_ids is None else tuple(sorted(int(fund_id) for fund_id in fund_ids))
+
+
+def fund_clause(fund_ids, column="fund_id"):
+    # Returns (SQL condition or "", params) restricting rows to `fund_ids`.
+    fund_ids = scope(fund_ids)
+    if fund_ids is None:
+        return "", []
+    if not fund_ids:
+        return "1 = 0", []
+    return f"{column} IN ({', '.join(['%s'] * len(fund_ids))})", list(fund_ids)
+
+
+def make_filters(transaction_types=None, types=None, departments=None, statuses=None,
+                 start_date=None, end_date=None, include_archived=False, fund_ids=None):
+    return {
+        "fund_ids": scope(fund_ids),
+        "transaction_types": list(transaction_types or []),
+        "types": list(types or []),
+        "departments": list(departments or []),
+        "statuses": list(statuses or []),
+        "start_date": start_date,
+        "end_date": end_date,
+        "include_archived": bool(include_archived),
+    }
+
+
+def _in_clause(column, values, clauses, params):
+    if values:
+        clauses.append(f"{column} IN ({', '.join(['%s'] * len(values))})")
+        params.extend(values)
+
+
+def _where(filters, clauses=None, params=None):
+    clauses = list(clauses or [])
+    params = list(params or [])
+    fund_sql, fund_params = fund_clause(filters.get("fund_ids"))
+    if fund_sql:
+        clauses.insert(0, fund_sql)
+        params[:0] = fund_params
+    _in_clause("type", filters.get("types"), clauses, params)
+    _in_clause("department", filters.get("departments"), clauses, params)
+    _in_clause("status", filters.get("statuses"), clauses, params)
+    if filters.get("start_date") is not None:
+        clauses.append("date >= %s")
+        params.append(filters["start_date"])
+    if filters.get("end_date") is not None:
+        clauses.append("date <= %s")
+        params.append(filters["end_date"])
+    sql = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return sql, params
+
+
+def _selected_kinds(filters):
+    kinds = filters.get("transaction_types") or list(TABLES)
+    return [kind for kind in TABLES if kind in kinds]
+
+
+def _tables(kind, filters):
+    if filters.get("include_archived"):
+        return [TABLES[kind], ARCHIVE_TABLES[kind]]
+    return [TABLES[kind]]
+
+
+def _keyset_clause(kind, after):
+    # `after` is the (date, transaction_type, id) of the last row already shown.
+    last_date, last_kind, last_id = after
+    if kind > last_kind:
+        return "date <= %s", [last_date]
+    if kind < last_kind:
+        return "date < %s", [last_date]
+    return "(date < %s OR (date = %s AND id < %s))", [last_date, last_date, last_id]
+
+
+def _branch(kind, table, filters, columns, after=None, limit=None):
+    clauses, params = [], []
+    if after is not None:
+        clause, params = _keyset_clause(kind, after)
+        clauses.append(clause)
+    where, params = _where(filters, clauses, params)
+    sql = f"SELECT '{kind}' AS transaction_type, {columns} FROM {table} {where}"
+    if limit is not None:
+        sql += " ORDER BY date DESC, id DESC LIMIT %s"
+        params.append(limit)
+    return f"SELECT * FROM ({sql}) {table}_rows", params
+
+
+def build_page_query(filters, after=None, limit=50, columns=COLUMNS):
+    branches, params = [], []
+    for kind in _selected_kinds(filters):
+        for table in _tables(kind, filters):
+            sql, branch_params = _branch(kind, table, filters, columns, after, limit)
+            branches.append(sql)
+            params.extend(branch_params)
+    query = " UNION ALL ".join(branches) + " ORDER BY date DESC, transaction_type, id DESC"
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+    return query, params
+
+
+@metrics.timed("queries.fetch_page")
+@cache.cached(tags=("income", "expenses"))
+def fetch_page(filters, after=None, page_size=50):
+    import frames
+
+    # One extra row tells us whether there is a next page.
+    query, params = build_page_query(filters, after, page_size + 1, PAGE_COLUMNS)
+    df = frames.compact(db.read_frame(query, params))
+    has_more = len(df) > page_size
+    df = df.head(page_size)
+    next_cursor = None
+    if has_more:
+        last = df.iloc[-1]
+        next_cursor = (last["date"].date(), str(last["transaction_type"]), int(last["id"]))
+    return df, next_cursor
+
+
+def _fetch_column(keys, column):
+    # keys: iterable of (transaction_type, id); returns {(transaction_type, id): value}.
+    # Ids not found in the live table are looked up in its archive.
+    values = {}
+    for kind in TABLES:
+        ids = [int(row_id) for key_kind, row_id in keys if key_kind == kind]
+        for table in (TABLES[kind], ARCHIVE_TABLES[kind]):
+            if not ids:
+                break
+            rows = db.fetch_all(
+                f"SELECT id, {column} FROM {table} WHERE id IN ({', '.join(['%s'] * len(ids))})", ids
+            )
+            values.update({(kind, row_id): value for row_id, value in rows})
+            found = {row_id for row_id, _ in rows}
+            ids = [row_id for row_id in ids if row_id not in found]
+    return values
+
+
+@metrics.timed("queries.fetch_descriptions")
+def fetch_descriptions(keys):
+    return _fetch_column(keys, "description")
+
+
+@metrics.timed("queries.fetch_receipts")
+def fetch_receipts(keys):
+    return {key: path for key, path in _fetch_column(keys, "receipt_path").items() if path}
+
+
+@metrics.timed("queries.receipt_funds")
+def receipt_funds(key):
+    # Funds of every transaction, live or archived, that references a receipt.
+    tables = [table for kind in TABLES for table in (TABLES[kind], ARCHIVE_TABLES[kind])]
+    query = " UNION ".join(f"SELECT fund_id FROM {table} WHERE receipt_path = %s" for table in tables)
+    return sorted(row[0] for row in db.fetch_all(query, [key] * len(tables)))
+
+
+@metrics.timed("queries.summarize", rows=None)
+@cache.cached(tags=("income", "expenses"))
+def summarize(filters):
+    branches, params = [], []
+    for kind in _selected_kinds(filters):
+        for table in _tables(kind, filters):
+            where, branch_params = _where(filters)
+            branches.append(
+                f"SELECT '{kind}' AS transaction_type, COUNT(*) AS row_count, "
+                f"COALESCE(SUM(amount), 0) AS total_amount FROM {table} {where}"
+            )
+            params.extend(branch_params)
+    rows = db.fetch_all(" UNION ALL ".join(branches), params)
+    summary = {"count": 0, "total_amount": 0.0, "income": 0.0, "expense": 0.0}
+    for kind, count, total in rows:
+        summary["count"] += int(count)
+        summary["total_amount"] += float(total)
+        summary[kind] += float(total)
+    return summary
+
+
+# Grouping expressions for breakdowns over raw rows; match rollups.GROUP_COLUMNS.
+GROUP_EXPRESSIONS = {"type": "type", "department": "department", "status": "status", "month": "SUBSTR(date, 1, 7)"}
+
+
+@metrics.timed("queries.breakdown")
+@cache.cached(tags=("income", "expenses"))
+def breakdown(filters, transaction_type, column="type"):
+    # Totals of one transaction type grouped by `column`, for date-bounded
+    # reports the all-time rollups cannot answer.
+    if column not in GROUP_EXPRESSIONS:
+        raise ValueError(f"Cannot break down by {column}")
+    branches, params = [], []
+    for table in _tables(transaction_type, filters):
+        where, branch_params = _where(filters)
+        branches.append(f"SELECT {GROUP_EXPRESSIONS[column]} AS {column}, amount FROM {table} {where}")
+        params.extend(branch_params)
+    return db.read_frame(f"""
+        SELECT {column}, SUM(amount) AS total_amount
+        FROM ({" UNION ALL ".join(branches)}) period_rows
+        GROUP BY {column}
+        ORDER BY {column}
+    """, params)
+
+
+@metrics.timed("queries.get_filter_options", rows=None)
+@cache.cached(tags=("income", "expenses"))
+def get_filter_options(fund_ids=None):
+    fund_sql, fund_params = fund_clause(fund_ids)
+    where = f"WHERE {fund_sql}" if fund_sql else ""
+    options = {}
+    for column in ("type", "department", "status"):
+        rows = db.fetch_all(
+            f"SELECT DISTINCT {column} FROM income {where} UNION SELECT DISTINCT {column} FROM expenses {where}",
+            fund_params * 2,
+        )
+        options[column] = sorted(row[0] for row in rows if row[0] is not None)
+    return options
@@ -0,0 +1,270 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import metrics
+
+# --- Receipt Storage --- #
+# Files are stored once per distinct content under their SHA-256 digest, e.g.
+# receipts/objects/3f/3fa9...c2.pdf; the "<digest><ext>" key is what goes into
+# the receipt_path column. Uploads are hashed while they are copied in chunks
+# to a temporary file, which is then renamed into place (or dropped if the
+# same content is already stored).
+
+RECEIPT_DIR = os.environ.get("FUNDS_RECEIPT_DIR", "receipts")
+MAX_RECEIPT_BYTES = int(os.environ.get("FUNDS_RECEIPT_MAX_BYTES", str(25 * 1024 * 1024)))
+# The file server has no authentication of its own; keep it on loopback and
+# publish it, if at all, through a proxy that authenticates.
+RECEIPT_HOST = os.environ.get("FUNDS_RECEIPT_HOST", "127.0.0.1")
+THUMBNAIL_WORKERS = int(os.environ.get("FUNDS_THUMBNAIL_WORKERS", "1"))
+CHUNK_SIZE = 1024 * 1024
+THUMBNAIL_SIZE = (320, 320)
+
+CONTENT_TYPES = {
+    ".pdf": "application/pdf",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp",
+}
+EXTENSIONS = [extension.lstrip(".") for extension in CONTENT_TYPES]
+
+_KEY = re.compile(r"^([0-9a-f]{64})(\.[a-z]+)$")
+
+
+class ReceiptTooLarge(ValueError):
+    pass
+
+
+def _split(key):
+    match = _KEY.match(key or "")
+    if not match or match.group(2) not in CONTENT_TYPES:
+        raise KeyError(key)
+    return match.group(1), match.group(2)
+
+
+def path_for(key):
+    digest, extension = _split(key)
+    return os.path.join(RECEIPT_DIR, "objects", digest[:2], digest + extension)
+
+
+def thumbnail_path(key):
+    digest, _ = _split(key)
+    return os.path.join(RECEIPT_DIR, "thumbnails", digest[:2], digest + ".jpg")
+
+
+def content_type(key):
+    return CONTENT_TYPES[_split(key)[1]]
+
+
+def exists(key):
+    try:
+        return os.path.exists(path_for(key))
+    except KeyError:
+        return False
+
+
+@metrics.timed("receipts.store", rows=None)
+def store(fileobj, filename):
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in CONTENT_TYPES:
+        raise ValueError(f"Unsupported receipt type '{extension}'; use one of: {', '.join(EXTENSIONS)}")
+
+    staging = os.path.join(RECEIPT_DIR, "tmp")
+    os.makedirs(staging, exist_ok=True)
+    digest, size = hashlib.sha256(), 0
+    with tempfile.NamedTemporaryFile(dir=staging, delete=False) as tmp:
+        try:
+            while True:
+                chunk = fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_RECEIPT_BYTES:
+                    raise ReceiptTooLarge(f"Receipts are limited to {MAX_RECEIPT_BYTES // (1024 * 1024)} MB")
+                digest.update(chunk)
+                tmp.write(chunk)
+        except BaseException:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+
+    key = digest.hexdigest() + extension
+    target = path_for(key)
+    if os.path.exists(target):
+        os.unlink(tmp.name)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(tmp.name, target)
+    request_thumbnail(key)
+    return key
+
+
+# --- Thumbnails --- #
+# Rendered off the request path by a small worker pool; needs Pillow and
+# skips PDFs. Until one exists callers fall back to the original file.
+# Pillow is imported with the first thumbnail, not with the login page.
+_thumbnail_executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix="thumbnail")
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def _pillow():
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+
+def _make_thumbnail(key):
+    try:
+        target = thumbnail_path(key)
+        if os.path.exists(target):
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with metrics.span("receipts.thumbnail"), _pillow().open(path_for(key)) as image:
+            image.draft("RGB", THUMBNAIL_SIZE)
+            image = image.convert("RGB")
+            image.thumbnail(THUMBNAIL_SIZE)
+            tmp = target + ".tmp"
+            image.save(tmp, "JPEG", quality=80)
+        os.replace(tmp, target)
+    finally:
+        with _pending_lock:
+            _pending.discard(key)
+
+
+def request_thumbnail(key):
+    if _pillow() is None or content_type(key) == "application/pdf":
+        return False
+    with _pending_lock:
+        if key in _pending:
+            return True
+        _pending.add(key)
+    _thumbnail_executor.submit(_make_thumbnail, key)
+    return True
+
+
+def thumbnail(key):
+    # Path of the thumbnail if it has been rendered, else None.
+    target = thumbnail_path(key)
+    if os.path.exists(target):
+        return target
+    if exists(key):
+        request_thumbnail(key)
+    return None
+
+
+# --- Receipt Server --- #
+# Content never changes under a key, so responses carry a strong ETag and a
+# long immutable Cache-Control, and single byte ranges are honoured so large
+# scans can be resumed or paged through by PDF viewers.
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header, size):
+    # Returns (start, end) inclusive, None for the whole file, or raises ValueError.
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        raise ValueError(header)
+    start, end = match.groups()
+    if start == "":
+        length = int(end)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+class _ReceiptHandler(BaseHTTPRequestHandler):
+    def _resolve(self):
+        parts = self.path.split("?", 1)[0].strip("/").split("/")
+        try:
+            if len(parts) == 2 and parts[0] == "receipts":
+                return path_for(parts[1]), content_type(parts[1]), parts[1]
+            if len(parts) == 3 and parts[0] == "receipts" and parts[2] == "thumbnail":
+                return thumbnail_path(parts[1]), "image/jpeg", parts[1] + ".thumbnail"
+        except KeyError:
+            pass
+        return None, None, None
+
+    def do_HEAD(self):
+        self._serve(body=False)
+
+    def do_GET(self):
+        self._serve(body=True)
+
+    def _serve(self, body):
+        path, mime, etag = self._resolve()
+        if path is None or not os.path.exists(path):
+            self.send_error(404)
+            return
+        etag = f'"{etag}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        stat = os.stat(path)
+        size = stat.st_size
+        try:
+            byte_range = parse_range(self.headers.get("Range"), size)
+        except ValueError:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.end_headers()
+            return
+        if byte_range and self.headers.get("If-Range") not in (None, etag):
+            byte_range = None
+
+        start, end = byte_range or (0, size - 1)
+        self.send_response(206 if byte_range else 200)
+        self.send_header("Content-Type", mime)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", formatdate(stat.st_mtime, usegmt=True))
+        self.send_header("Cache-Control", "private, max-age=31536000, immutable")
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if not body:
+            return
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def serve(port, host=RECEIPT_HOST):
+    # Optional file endpoint; started once per process.
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _ReceiptHandler)
+            threading.Thread(target=_server.serve_forever, name="receipts", daemon=True).start()
+    return _server
@@ -0,0 +1,89 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import ledger
+import metrics
+import queries
+import rollups
+
+# --- PDF Reports --- #
+REPORT_WORKERS = int(os.environ.get("FUNDS_REPORT_WORKERS", "2"))
+JOB_TTL = 3600
+
+
+def breakdown(transaction_type, column="type", filters=None):
+    # Reports without a date range read the rollups; a date-bounded report
+    # groups its period's rows instead. Like the transaction table, the totals
+    # cover only the open fiscal period unless closed years are included.
+    filters = filters or queries.make_filters()
+    if filters.get("start_date") is None and filters.get("end_date") is None:
+        closed_through = None if filters.get("include_archived") else ledger.closed_through()
+        after_month = rollups.month_of(closed_through) if closed_through is not None else None
+        return rollups.breakdown(transaction_type, column, filters.get("fund_ids"), after_month)
+    return queries.breakdown(filters, transaction_type, column)
+
+
+@metrics.timed("reports.generate_financial_pdf", rows=None)
+def generate_financial_pdf(income_df, expense_df, report_title, include_details=False, filters=None):
+    import pdfreport
+
+    return pdfreport.render(income_df, expense_df, report_title, include_details, filters)
+
+
+# --- Background Rendering --- #
+# Reports render on a small worker pool so the Streamlit script thread returns
+# immediately; the page polls job_status() and offers the result when done.
+_executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="report")
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def _render(report_title, include_details, filters):
+    return generate_financial_pdf(
+        breakdown("income", filters=filters), breakdown("expense", filters=filters),
+        report_title, include_details, filters
+    )
+
+
+def submit_job(title, func, *args, job_id=None):
+    # A job_id names work that should run once: while a job under it is still
+    # queued or running, submitting again returns the same job.
+    job_id = job_id or uuid.uuid4().hex
+    with _jobs_lock:
+        now = time.time()
+        for stale in [key for key, job in _jobs.items() if now - job["submitted"] > JOB_TTL]:
+            del _jobs[stale]
+        job = _jobs.get(job_id)
+        if job is None or job["future"].done():
+            _jobs[job_id] = {"title": title, "submitted": now, "future": _executor.submit(func, *args)}
+    return job_id
+
+
+def submit_report(report_title, include_details=True, filters=None):
+    return submit_job(report_title, _render, report_title, include_details, filters)
+
+
+def job_status(job_id):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is None:
+        return "unknown"
+    future = job["future"]
+    if future.done():
+        return "failed" if future.exception() is not None else "done"
+    return "running" if future.running() else "queued"
+
+
+def job_error(job_id):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    return job["future"].exception() if job else None
+
+
+def job_result(job_id):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    return job["future"].result() if job else None
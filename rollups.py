@@ -0,0 +1,148 @@
+import argparse
+
+import cache
+import db
+import metrics
+import queries
+import schema
+
+# --- Summary Rollups --- #
+# transaction_rollups holds one row per (fund_id, transaction_type, type,
+# department, status, month) with the running total and row count. The
+# ledger keeps it in step inside the same transaction as each insert, so
+# dashboards read O(categories) rows instead of scanning income/expenses.
+
+UPSERT_ROLLUP = {
+    "mysql": """
+        INSERT INTO transaction_rollups
+            (fund_id, transaction_type, type, department, status, month, total_amount, row_count)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            total_amount = total_amount + VALUES(total_amount),
+            row_count = row_count + VALUES(row_count)
+    """,
+    "sqlite": """
+        INSERT INTO transaction_rollups
+            (fund_id, transaction_type, type, department, status, month, total_amount, row_count)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT(fund_id, transaction_type, type, department, status, month) DO UPDATE SET
+            total_amount = total_amount + excluded.total_amount,
+            row_count = row_count + excluded.row_count
+    """,
+}
+
+GROUP_COLUMNS = ("type", "department", "status", "month")
+
+
+def month_of(date):
+    # Works for date objects and ISO strings alike.
+    return str(date)[:7]
+
+
+def apply(cursor, fund_id, transaction_type, t_type, department, status, date, amount, count=1):
+    cursor.execute(
+        UPSERT_ROLLUP[db.backend_name()],
+        (fund_id, transaction_type, t_type, department, status, month_of(date), amount, count),
+    )
+
+
+def apply_many(cursor, rows):
+    # rows: (fund_id, transaction_type, type, department, status, month, amount, count)
+    if rows:
+        cursor.executemany(UPSERT_ROLLUP[db.backend_name()], rows)
+
+
+def rebuild():
+    with db.transaction() as cursor:
+        # Hold every fund's row lock so no posting lands mid-rebuild.
+        cursor.execute("UPDATE funds SET balance = balance")
+        cursor.execute("DELETE FROM transaction_rollups")
+        # Rollups cover closed fiscal years too, so read the archives as well.
+        for transaction_type, table in (("income", "income"), ("expense", "expenses")):
+            cursor.execute(f"""
+                INSERT INTO transaction_rollups
+                    (fund_id, transaction_type, type, department, status, month, total_amount, row_count)
+                SELECT fund_id, '{transaction_type}', type, department, status, SUBSTR(date, 1, 7),
+                       SUM(amount), COUNT(*)
+                FROM (
+                    SELECT fund_id, type, department, status, date, amount FROM {table}
+                    UNION ALL
+                    SELECT fund_id, type, department, status, date, amount FROM {table}_archive
+                ) all_rows
+                GROUP BY fund_id, type, department, status, SUBSTR(date, 1, 7)
+            """)
+        cursor.execute("SELECT COUNT(*) FROM transaction_rollups")
+        count = cursor.fetchone()[0]
+    cache.invalidate("income", "expenses")
+    return count
+
+
+def _where(clauses, params, fund_ids):
+    # Rollups are keyed by fund first, so a scoped read stays on its funds' rows.
+    fund_sql, fund_params = queries.fund_clause(fund_ids)
+    if fund_sql:
+        clauses, params = [fund_sql] + clauses, fund_params + params
+    return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+
+@metrics.timed("rollups.breakdown")
+def breakdown(transaction_type, column="type", fund_ids=None, after_month=None):
+    # `after_month` ("YYYY-MM") limits the totals to later months, e.g. the
+    # open fiscal period; fiscal years always end on a month boundary.
+    if column not in GROUP_COLUMNS:
+        raise ValueError(f"Cannot break down by {column}")
+    clauses, params = ["transaction_type = %s"], [transaction_type]
+    if after_month is not None:
+        clauses.append("month > %s")
+        params.append(after_month)
+    where, params = _where(clauses, params, fund_ids)
+    return db.read_frame(f"""
+        SELECT {column}, SUM(total_amount) AS total_amount
+        FROM transaction_rollups
+        {where}
+        GROUP BY {column}
+        HAVING SUM(row_count) > 0
+        ORDER BY {column}
+    """, params)
+
+
+@metrics.timed("rollups.monthly_totals")
+def monthly_totals(fund_ids=None):
+    where, params = _where([], [], fund_ids)
+    return db.read_frame(f"""
+        SELECT transaction_type, month, SUM(total_amount) AS total_amount
+        FROM transaction_rollups
+        {where}
+        GROUP BY transaction_type, month
+        HAVING SUM(row_count) > 0
+    """, params)
+
+
+@metrics.timed("rollups.matrix")
+def matrix(transaction_type, rows="department", columns="type", fund_ids=None):
+    if rows not in GROUP_COLUMNS or columns not in GROUP_COLUMNS:
+        raise ValueError(f"Cannot break down by {rows}/{columns}")
+    where, params = _where(["transaction_type = %s"], [transaction_type], fund_ids)
+    return db.read_frame(f"""
+        SELECT {rows}, {columns}, SUM(total_amount) AS total_amount
+        FROM transaction_rollups
+        {where}
+        GROUP BY {rows}, {columns}
+        HAVING SUM(row_count) > 0
+    """, params)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the transaction summary rollups")
+    parser.add_argument("--rebuild", action="store_true", help="recompute all rollups from income/expenses")
+    args = parser.parse_args()
+
+    schema.ensure_schema()
+    if args.rebuild:
+        print(f"Rebuilt {rebuild():,} rollup rows.")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
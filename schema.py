@@ -0,0 +1,489 @@
+import argparse
+import threading
+
+import db
+
+# --- Dialect Tokens --- #
+# Table definitions are shared between MySQL and SQLite; the few places where
+# the dialects disagree are filled in from here.
+DIALECTS = {
+    "mysql": {
+        "pk": "INT AUTO_INCREMENT PRIMARY KEY",
+        "insert_ignore": "INSERT IGNORE",
+        "engine": " ENGINE=InnoDB",
+    },
+    "sqlite": {
+        "pk": "INTEGER PRIMARY KEY AUTOINCREMENT",
+        "insert_ignore": "INSERT OR IGNORE",
+        "engine": "",
+    },
+}
+
+MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    ){engine}
+"""
+
+LOCK_NAME = "funds_schema_migrations"
+LOCK_TIMEOUT = 60
+
+
+def render(statement, dialect=None):
+    return statement.format(**DIALECTS[dialect or db.backend_name()])
+
+
+def _index_exists(cursor, table, name):
+    if db.backend_name() == "mysql":
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        """, (table, name))
+    else:
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND name = %s", (name,))
+    return cursor.fetchone()[0] > 0
+
+
+def index(table, name, columns):
+    # Migration step; skips indexes that already exist so databases created
+    # before versioning can be adopted.
+    def create(cursor):
+        if not _index_exists(cursor, table, name):
+            cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+    return create
+
+
+# --- Migrations --- #
+# (version, name, steps). A step is SQL (with dialect tokens) or a callable
+# taking the cursor. Append new versions; never edit one that has shipped.
+MIGRATIONS = [
+    (1, "core tables", [
+        # users.username is UNIQUE, which also gives logins their index.
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id {pk},
+            username VARCHAR(100) NOT NULL UNIQUE,
+            password_hash VARCHAR(255) NOT NULL,
+            role VARCHAR(20) NOT NULL DEFAULT 'accountant',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ){engine}
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS income (
+            id {pk},
+            name VARCHAR(255) NOT NULL,
+            user_id INT,
+            type VARCHAR(50) NOT NULL,
+            description TEXT,
+            amount DECIMAL(14, 2) NOT NULL,
+            date DATE NOT NULL,
+            department VARCHAR(50) NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            receipt_path VARCHAR(255),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ){engine}
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS expenses (
+            id {pk},
+            name VARCHAR(255) NOT NULL,
+            user_id INT,
+            type VARCHAR(50) NOT NULL,
+            description TEXT,
+            amount DECIMAL(14, 2) NOT NULL,
+            date DATE NOT NULL,
+            department VARCHAR(50) NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            receipt_path VARCHAR(255),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ){engine}
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS funds (
+            id INT PRIMARY KEY,
+            balance DECIMAL(14, 2) NOT NULL DEFAULT 0
+        ){engine}
+        """,
+        "{insert_ignore} INTO funds (id, balance) VALUES (1, 0)",
+    ]),
+    (2, "department balances", [
+        """
+        CREATE TABLE IF NOT EXISTS department_balances (
+            department VARCHAR(50) PRIMARY KEY,
+            balance DECIMAL(14, 2) NOT NULL DEFAULT 0
+        ){engine}
+        """,
+    ]),
+    (3, "filter indexes", [
+        # Back the date/type/department/status filters and the keyset ordering
+        # used by queries.py.
+        index("income", "idx_income_date", "date, id"),
+        index("income", "idx_income_type_date", "type, date"),
+        index("income", "idx_income_dept_status_date", "department, status, date"),
+        index("expenses", "idx_expenses_date", "date, id"),
+        index("expenses", "idx_expenses_type_date", "type, date"),
+        index("expenses", "idx_expenses_dept_status_date", "department, status, date"),
+    ]),
+    (4, "transaction rollups", [
+        """
+        CREATE TABLE IF NOT EXISTS transaction_rollups (
+            transaction_type VARCHAR(10) NOT NULL,
+            type VARCHAR(50) NOT NULL,
+            department VARCHAR(50) NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            month CHAR(7) NOT NULL,
+            total_amount DECIMAL(16, 2) NOT NULL DEFAULT 0,
+            row_count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (transaction_type, type, department, status, month)
+        ){engine}
+        """,
+    ]),
+    (5, "write queue checkpoints", [
+        """
+        CREATE TABLE IF NOT EXISTS journal_checkpoints (
+            journal VARCHAR(100) PRIMARY KEY,
+            last_seq BIGINT NOT NULL DEFAULT 0
+        ){engine}
+        """,
+    ]),
+    (6, "status filter indexes", [
+        # Status-only filters (e.g. everything still Pending) cannot use the
+        # department-led index; found by explain.py.
+        index("income", "idx_income_status_date", "status, date"),
+        index("expenses", "idx_expenses_status_date", "status, date"),
+    ]),
+    (7, "fiscal close and archives", [
+        """
+        CREATE TABLE IF NOT EXISTS fiscal_periods (
+            fiscal_year INT PRIMARY KEY,
+            start_date DATE NOT NULL,
+            end_date DATE NOT NULL,
+            closing_balance DECIMAL(14, 2) NOT NULL,
+            income_rows INT NOT NULL DEFAULT 0,
+            expense_rows INT NOT NULL DEFAULT 0,
+            closed_by INT,
+            closed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ){engine}
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS closing_balances (
+            fiscal_year INT NOT NULL,
+            department VARCHAR(50) NOT NULL,
+            balance DECIMAL(14, 2) NOT NULL,
+            PRIMARY KEY (fiscal_year, department)
+        ){engine}
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS closing_totals (
+            fiscal_year INT NOT NULL,
+            transaction_type VARCHAR(10) NOT NULL,
+            type VARCHAR(50) NOT NULL,
+            department VARCHAR(50) NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            total_amount DECIMAL(16, 2) NOT NULL,
+            row_count INT NOT NULL,
+            PRIMARY KEY (fiscal_year, transaction_type, type, department, status)
+        ){engine}
+        """,
+        # Archived rows keep their original ids, so (date, kind, id) keysets
+        # and description lookups work across live and archived rows.
+        """
+        CREATE TABLE IF NOT EXISTS income_archive (
+            id INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            user_id INT,
+            type VARCHAR(50) NOT NULL,
+            description TEXT,
+            amount DECIMAL(14, 2) NOT NULL,
+            date DATE NOT NULL,
+            department VARCHAR(50) NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            receipt_path VARCHAR(255),
+            created_at TIMESTAMP NULL
+        ){engine}
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS expenses_archive (
+            id INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            user_id INT,
+            type VARCHAR(50) NOT NULL,
+            description TEXT,
+            amount DECIMAL(14, 2) NOT NULL,
+            date DATE NOT NULL,
+            department VARCHAR(50) NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            receipt_path VARCHAR(255),
+            created_at TIMESTAMP NULL
+        ){engine}
+        """,
+        index("income_archive", "idx_income_archive_date", "date, id"),
+        index("income_archive", "idx_income_archive_type_date", "type, date"),
+        index("income_archive", "idx_income_archive_dept_status_date", "department, status, date"),
+        index("income_archive", "idx_income_archive_status_date", "status, date"),
+        index("expenses_archive", "idx_expenses_archive_date", "date, id"),
+        index("expenses_archive", "idx_expenses_archive_type_date", "type, date"),
+        index("expenses_archive", "idx_expenses_archive_dept_status_date", "department, status, date"),
+        index("expenses_archive", "idx_expenses_archive_status_date", "status, date"),
+    ]),
+    (8, "funds and institutions", [
+        # Every campus (institution) owns one or more funds; every row and
+        # balance belongs to exactly one fund. Existing data becomes the
+        # General Fund of the default institution.
+        """
+        CREATE TABLE IF NOT EXISTS institutions (
+            id {pk},
+            code VARCHAR(20) NOT NULL UNIQUE,
+            name VARCHAR(255) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ){engine}
+        """,
+        "{insert_ignore} INTO institutions (id, code, name) VALUES (1, 'MAIN', 'Main Campus')",
+        "ALTER TABLE funds ADD COLUMN institution_id INT NOT NULL DEFAULT 1",
+        "ALTER TABLE funds ADD COLUMN name VARCHAR(100) NOT NULL DEFAULT 'General Fund'",
+        "ALTER TABLE funds ADD COLUMN purpose VARCHAR(50) NOT NULL DEFAULT 'General'",
+        index("funds", "idx_funds_institution", "institution_id, id"),
+        # NULL means the user may see every institution.
+        "ALTER TABLE users ADD COLUMN institution_id INT NULL",
+        "ALTER TABLE income ADD COLUMN fund_id INT NOT NULL DEFAULT 1",
+        "ALTER TABLE expenses ADD COLUMN fund_id INT NOT NULL DEFAULT 1",
+        "ALTER TABLE income_archive ADD COLUMN fund_id INT NOT NULL DEFAULT 1",
+        "ALTER TABLE expenses_archive ADD COLUMN fund_id INT NOT NULL DEFAULT 1",
+        # Balances, rollups and closing snapshots are keyed by fund first, so
+        # postings to different funds never touch the same rows. The primary
+        # keys change, which SQLite can only do by rebuilding the table.
+        """
+        CREATE TABLE department_balances_v8 (
+            fund_id INT NOT NULL,
+            department VARCHAR(50) NOT NULL,
+            balance DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (fund_id, department)
+        ){engine}
+        """,
+        "INSERT INTO department_balances_v8 (fund_id, department, balance) "
+        "SELECT 1, department, balance FROM department_balances",
+        "DROP TABLE department_balances",
+        "ALTER TABLE department_balances_v8 RENAME TO department_balances",
+        """
+        CREATE TABLE transaction_rollups_v8 (
+            fund_id INT NOT NULL,
+            transaction_type VARCHAR(10) NOT NULL,
+            type VARCHAR(50) NOT NULL,
+            department VARCHAR(50) NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            month CHAR(7) NOT NULL,
+            total_amount DECIMAL(16, 2) NOT NULL DEFAULT 0,
+            row_count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (fund_id, transaction_type, type, department, status, month)
+        ){engine}
+        """,
+        "INSERT INTO transaction_rollups_v8 "
+        "SELECT 1, transaction_type, type, department, status, month, total_amount, row_count "
+        "FROM transaction_rollups",
+        "DROP TABLE transaction_rollups",
+        "ALTER TABLE transaction_rollups_v8 RENAME TO transaction_rollups",
+        """
+        CREATE TABLE closing_balances_v8 (
+            fiscal_year INT NOT NULL,
+            fund_id INT NOT NULL,
+            department VARCHAR(50) NOT NULL,
+            balance DECIMAL(14, 2) NOT NULL,
+            PRIMARY KEY (fiscal_year, fund_id, department)
+        ){engine}
+        """,
+        "INSERT INTO closing_balances_v8 SELECT fiscal_year, 1, department, balance FROM closing_balances",
+        "DROP TABLE closing_balances",
+        "ALTER TABLE closing_balances_v8 RENAME TO closing_balances",
+        """
+        CREATE TABLE closing_totals_v8 (
+            fiscal_year INT NOT NULL,
+            fund_id INT NOT NULL,
+            transaction_type VARCHAR(10) NOT NULL,
+            type VARCHAR(50) NOT NULL,
+            department VARCHAR(50) NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            total_amount DECIMAL(16, 2) NOT NULL,
+            row_count INT NOT NULL,
+            PRIMARY KEY (fiscal_year, fund_id, transaction_type, type, department, status)
+        ){engine}
+        """,
+        "INSERT INTO closing_totals_v8 SELECT fiscal_year, 1, transaction_type, type, department, status, "
+        "total_amount, row_count FROM closing_totals",
+        "DROP TABLE closing_totals",
+        "ALTER TABLE closing_totals_v8 RENAME TO closing_totals",
+        # Tenant-scoped filters lead with fund_id so one campus's queries only
+        # walk that campus's slice of the index.
+        index("income", "idx_income_fund_date", "fund_id, date, id"),
+        index("income", "idx_income_fund_dept_status_date", "fund_id, department, status, date"),
+        index("income", "idx_income_fund_status_date", "fund_id, status, date"),
+        index("expenses", "idx_expenses_fund_date", "fund_id, date, id"),
+        index("expenses", "idx_expenses_fund_dept_status_date", "fund_id, department, status, date"),
+        index("expenses", "idx_expenses_fund_status_date", "fund_id, status, date"),
+        index("income_archive", "idx_income_archive_fund_date", "fund_id, date, id"),
+        index("expenses_archive", "idx_expenses_archive_fund_date", "fund_id, date, id"),
+    ]),
+    (9, "report artifacts", [
+        # One prebuilt report per (kind, period, fund scope, format); the file
+        # itself lives on disk under its content hash.
+        """
+        CREATE TABLE IF NOT EXISTS report_artifacts (
+            kind VARCHAR(10) NOT NULL,
+            period VARCHAR(10) NOT NULL,
+            scope VARCHAR(255) NOT NULL,
+            format VARCHAR(10) NOT NULL,
+            content_hash CHAR(64) NOT NULL,
+            watermark VARCHAR(100) NOT NULL,
+            size_bytes INT NOT NULL,
+            row_count INT NOT NULL,
+            generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (kind, period, scope, format)
+        ){engine}
+        """,
+    ]),
+    (10, "transaction events", [
+        # Append-only: one row per insert, status change or reversal, read in
+        # seq order (see events.py). Reversals keep the removed row in `detail`.
+        """
+        CREATE TABLE IF NOT EXISTS transaction_events (
+            seq {pk},
+            event VARCHAR(10) NOT NULL,
+            transaction_type VARCHAR(10) NOT NULL,
+            transaction_id INT NOT NULL,
+            fund_id INT NOT NULL,
+            type VARCHAR(50) NOT NULL,
+            department VARCHAR(50) NOT NULL,
+            date DATE NOT NULL,
+            amount DECIMAL(14, 2) NOT NULL,
+            old_status VARCHAR(20),
+            new_status VARCHAR(20),
+            user_id INT,
+            detail TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ){engine}
+        """,
+        index("transaction_events", "idx_events_transaction", "transaction_type, transaction_id, seq"),
+        # Existing rows start the log as inserts, closed years first.
+        *[
+            f"""
+            INSERT INTO transaction_events
+                (event, transaction_type, transaction_id, fund_id, type, department, date, amount,
+                 new_status, user_id, created_at)
+            SELECT 'insert', '{kind}', id, fund_id, type, department, date, amount, status, user_id, created_at
+            FROM {table} ORDER BY id
+            """
+            for table, kind in (("income_archive", "income"), ("expenses_archive", "expense"),
+                                ("income", "income"), ("expenses", "expense"))
+        ],
+        # Artifact watermarks switch from row counts to event sequence numbers.
+        "DELETE FROM report_artifacts",
+    ]),
+    (11, "receipt indexes", [
+        # The API looks up which funds a receipt belongs to before serving it.
+        index("income", "idx_income_receipt", "receipt_path"),
+        index("expenses", "idx_expenses_receipt", "receipt_path"),
+        index("income_archive", "idx_income_archive_receipt", "receipt_path"),
+        index("expenses_archive", "idx_expenses_archive_receipt", "receipt_path"),
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _lock(cursor):
+    # One migrator at a time. On SQLite the write lock also makes the whole
+    # run a single transaction (its DDL is transactional); MySQL commits DDL
+    # implicitly, so an advisory lock serialises concurrent starts instead.
+    if db.backend_name() == "mysql":
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_TIMEOUT))
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("Timed out waiting for another process to finish migrating the schema")
+    else:
+        cursor.execute("BEGIN IMMEDIATE")
+
+
+def _unlock(cursor):
+    if db.backend_name() == "mysql":
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+        cursor.fetchall()
+
+
+def applied_versions(cursor):
+    cursor.execute(render(MIGRATIONS_TABLE))
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(target=None):
+    # Applies pending migrations up to `target` and returns their versions.
+    applied_now = []
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            _lock(cursor)
+            try:
+                applied = applied_versions(cursor)
+                for version, name, steps in MIGRATIONS:
+                    if version in applied or (target is not None and version > target):
+                        continue
+                    for step in steps:
+                        if callable(step):
+                            step(cursor)
+                        else:
+                            cursor.execute(render(step))
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name)
+                    )
+                    applied_now.append(version)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                _unlock(cursor)
+        finally:
+            cursor.close()
+    return applied_now
+
+
+def status():
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        applied = applied_versions(cursor)
+        conn.commit()
+        cursor.close()
+    return [(version, name, version in applied) for version, name, _ in MIGRATIONS]
+
+
+_initialized = False
+_init_lock = threading.Lock()
+
+
+def ensure_schema():
+    # Streamlit reruns the script on every interaction; only migrate once per
+    # process.
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if not _initialized:
+            migrate()
+            _initialized = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply or list schema migrations")
+    parser.add_argument("--status", action="store_true", help="list migrations without applying them")
+    parser.add_argument("--target", type=int, help="migrate up to this version only")
+    args = parser.parse_args()
+
+    if not args.status:
+        applied = migrate(args.target)
+        print(f"Applied migrations: {', '.join(map(str, applied))}" if applied else "Schema is up to date")
+    for version, name, done in status():
+        print(f"{version:>4}  {'applied' if done else 'pending':<8} {name}")
+
+
+if __name__ == "__main__":
+    main()
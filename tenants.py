@@ -0,0 +1,150 @@
+import argparse
+
+import cache
+import db
+import ledger
+import metrics
+import queries
+import schema
+
+# --- Institutions and Funds --- #
+# Every campus is an institution owning one or more funds (General,
+# Scholarship, ...). Transactions, balances and rollups all carry a fund_id,
+# and a user tied to an institution only ever sees that institution's funds;
+# users with no institution (the original accounts) see every campus.
+
+FUND_PURPOSES = ["General", "Scholarship", "Building", "Endowment", "Grant"]
+CREATE_FUND_ATTEMPTS = 10
+
+
+@metrics.timed("tenants.list_institutions")
+@cache.cached(tags=("institutions",))
+def list_institutions():
+    return db.read_frame("SELECT id, code, name FROM institutions ORDER BY name")
+
+
+@metrics.timed("tenants.institution_names")
+@cache.cached(tags=("institutions",))
+def institution_names():
+    # {id: name} straight from the cursor: the register form on the login
+    # page runs before pandas has been imported.
+    return dict(db.fetch_all("SELECT id, name FROM institutions ORDER BY name"))
+
+
+@metrics.timed("tenants.list_funds")
+@cache.cached(tags=("institutions", "funds"))
+def list_funds(institution_id=None):
+    where, params = ("WHERE funds.institution_id = %s", (institution_id,)) if institution_id is not None else ("", ())
+    return db.read_frame(f"""
+        SELECT funds.id, funds.institution_id, institutions.name AS institution, funds.name,
+               funds.purpose, funds.balance
+        FROM funds JOIN institutions ON institutions.id = funds.institution_id
+        {where}
+        ORDER BY institutions.name, funds.name
+    """, params)
+
+
+def fund_scope(institution_id):
+    # The fund ids a user of `institution_id` may read and post to; None
+    # (no institution) means every fund.
+    if institution_id is None:
+        return None
+    return tuple(int(fund_id) for fund_id in list_funds(institution_id)["id"])
+
+
+def fund_labels(institution_id=None):
+    # {fund_id: "Institution / Fund"} for pickers and tables.
+    funds = list_funds(institution_id)
+    return {int(row.id): f"{row.institution} / {row.name}" for row in funds.itertuples()}
+
+
+def create_institution(code, name):
+    code = code.strip().upper()
+    if not code or not name.strip():
+        raise ValueError("Institution code and name are required")
+    try:
+        with db.transaction() as cursor:
+            cursor.execute("INSERT INTO institutions (code, name) VALUES (%s, %s)", (code, name.strip()))
+            institution_id = cursor.lastrowid
+    except db.integrity_errors():
+        raise ValueError(f"Institution code '{code}' is already in use")
+    cache.invalidate("institutions")
+    return institution_id
+
+
+def create_fund(institution_id, name, purpose="General"):
+    if not name.strip():
+        raise ValueError("Fund name is required")
+    if purpose not in FUND_PURPOSES:
+        raise ValueError(f"Unknown fund purpose '{purpose}'")
+    # funds.id predates tenancy and is not auto-increment; a concurrent
+    # create collides on the primary key, and the loser takes the next id.
+    for _ in range(CREATE_FUND_ATTEMPTS):
+        try:
+            with db.transaction() as cursor:
+                cursor.execute("SELECT 1 FROM institutions WHERE id = %s", (institution_id,))
+                if cursor.fetchone() is None:
+                    raise ValueError(f"Institution {institution_id} does not exist")
+                cursor.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM funds")
+                fund_id = int(cursor.fetchone()[0])
+                cursor.execute(
+                    "INSERT INTO funds (id, institution_id, name, purpose, balance) VALUES (%s, %s, %s, %s, 0)",
+                    (fund_id, institution_id, name.strip(), purpose),
+                )
+        except db.integrity_errors():
+            continue
+        cache.invalidate("funds")
+        return fund_id
+    raise ValueError("Funds are being created concurrently, please retry")
+
+
+def assign_user(username, institution_id):
+    with db.transaction() as cursor:
+        cursor.execute("UPDATE users SET institution_id = %s WHERE username = %s", (institution_id, username))
+        if cursor.rowcount == 0:
+            raise ValueError(f"No user named '{username}'")
+
+
+def check_fund(fund_id, institution_id):
+    # Raises unless a user of `institution_id` may post to `fund_id`.
+    scope = fund_scope(institution_id)
+    if scope is not None and int(fund_id) not in scope:
+        raise ledger.UnknownFund(fund_id)
+
+
+def may_see_receipt(key, institution_id):
+    # A receipt is visible to users who may see a transaction, live or
+    # archived, that references it.
+    for fund_id in queries.receipt_funds(key):
+        try:
+            check_fund(fund_id, institution_id)
+        except ledger.UnknownFund:
+            continue
+        return True
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage institutions (campuses) and their funds")
+    parser.add_argument("--add-institution", nargs=2, metavar=("CODE", "NAME"))
+    parser.add_argument("--add-fund", nargs=2, metavar=("INSTITUTION_ID", "NAME"))
+    parser.add_argument("--purpose", default="General", choices=FUND_PURPOSES)
+    parser.add_argument("--assign", nargs=2, metavar=("USERNAME", "INSTITUTION_ID"),
+                        help="tie a user to an institution ('none' for every institution)")
+    args = parser.parse_args()
+
+    schema.ensure_schema()
+    if args.add_institution:
+        print(f"Created institution {create_institution(*args.add_institution)}")
+    if args.add_fund:
+        print(f"Created fund {create_fund(int(args.add_fund[0]), args.add_fund[1], args.purpose)}")
+    if args.assign:
+        username, institution = args.assign
+        assign_user(username, None if institution.lower() == "none" else int(institution))
+        print(f"Assigned {username}")
+    for row in list_funds().itertuples():
+        print(f"{row.id:>4}  {row.institution:<30} {row.name:<30} {row.purpose:<12} Rs.{float(row.balance):,.2f}")
+
+
+if __name__ == "__main__":
+    main()
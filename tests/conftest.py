@@ -0,0 +1,37 @@
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache
+import db
+import ledger
+import schema
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path):
+    # Every test gets its own fully migrated SQLite file.
+    db.configure(db.SQLiteBackend(str(tmp_path / "funds.db")))
+    schema.migrate()
+    cache.clear()
+    yield
+    cache.clear()
+    db.get_pool().close()
+
+
+def add_income(amount, day=None, department="Science", fund_id=ledger.FUND_ID, status="Received"):
+    return ledger.record_income("Donor", 1, "Other Income", "", amount, day or date.today(), department, status,
+                                fund_id=fund_id)
+
+
+def add_expense(amount, day=None, department="Science", fund_id=ledger.FUND_ID, status="Paid"):
+    return ledger.record_expense("Vendor", 1, "Maintenance", "", amount, day or date.today(), department, status,
+                                 fund_id=fund_id)
+
+
+def balance(fund_id=ledger.FUND_ID):
+    return float(ledger.get_fund_balance([fund_id]))
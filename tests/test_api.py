@@ -0,0 +1,155 @@
+import asyncio
+import base64
+import io
+import time
+from datetime import date
+
+import pytest
+
+pytest.importorskip("aiohttp")
+from aiohttp.test_utils import TestClient, TestServer
+
+import api
+import auth
+import receipts
+import tenants
+from conftest import balance
+
+INCOME = {"name": "Donor", "type": "Other Income", "amount": 100, "date": date.today().isoformat(),
+          "department": "Science", "status": "Received"}
+
+
+def get(path, institution_id=None):
+    async def run():
+        async with TestClient(TestServer(api.create_app())) as client:
+            response = await client.get(path, headers={
+                "Authorization": f"Bearer {api.issue_token(1, 'viewer', institution_id)}",
+            })
+            return response.status, await response.read()
+
+    return asyncio.run(run())
+
+
+def post(path, body, role="accountant", headers=None):
+    async def run():
+        async with TestClient(TestServer(api.create_app())) as client:
+            response = await client.post(path, json=body, headers={
+                "Authorization": f"Bearer {api.issue_token(1, role)}", **(headers or {}),
+            })
+            return response.status, await response.json()
+
+    return asyncio.run(run())
+
+
+def test_token_round_trip():
+    assert api.read_token(api.issue_token(7, "viewer", 3)) == {"user_id": 7, "role": "viewer", "institution_id": 3}
+    assert api.read_token(api.issue_token(7, "admin"))["institution_id"] is None
+
+
+def test_tampered_or_expired_tokens_are_refused(monkeypatch):
+    payload, signature = base64.urlsafe_b64decode(api.issue_token(7, "viewer")).decode().rsplit(":", 1)
+    forged = base64.urlsafe_b64encode(f"{payload.replace('viewer', 'admin')}:{signature}".encode()).decode()
+    non_ascii = base64.urlsafe_b64encode(f"{payload}:{'é' * len(signature)}".encode()).decode()
+    assert api.read_token(forged) is None
+    assert api.read_token(non_ascii) is None
+    assert api.read_token("not a token") is None
+
+    token = api.issue_token(7, "viewer")
+    monkeypatch.setattr(time, "time", lambda: float(payload.split(":")[-1]) + 10)
+    assert api.read_token(token) is None
+
+
+def test_create_income():
+    status, body = post("/api/income", INCOME)
+    assert status == 201
+    assert body["transaction_type"] == "income"
+    assert balance() == 100
+
+
+@pytest.mark.parametrize("body", [[INCOME], [], {}])
+def test_create_takes_exactly_one_object(body):
+    status, response = post("/api/income", body)
+    assert status == 400
+    assert balance() == 0
+
+
+def test_create_rejects_invalid_record():
+    status, body = post("/api/income", dict(INCOME, department="Nowhere"))
+    assert status == 422
+    assert body["rejected"][0]["reason"] == "unknown department"
+
+
+def test_create_requires_a_write_role():
+    status, _ = post("/api/income", INCOME, role="viewer")
+    assert status == 403
+
+
+def test_bulk_loads_valid_rows_and_reports_the_rest():
+    records = [dict(INCOME, transaction_type="income"), dict(INCOME, transaction_type="expense", type="Maintenance",
+                                                             status="Paid", amount=30),
+               dict(INCOME, transaction_type="income", amount=-5)]
+    status, body = post("/api/transactions/bulk", records)
+    assert status == 201
+    assert body["imported"] == 2
+    assert body["rejected"] == [{"index": 2, "reason": "amount must be positive"}]
+    assert balance() == 70
+
+
+@pytest.mark.parametrize("body", [[], ["not an object"], "text"])
+def test_bulk_rejects_malformed_bodies(body):
+    status, _ = post("/api/transactions/bulk", body)
+    assert status == 400
+
+
+@pytest.mark.parametrize("body", [["reason"], "entered twice", {"reason": 5}, {}])
+def test_reverse_rejects_malformed_bodies(body):
+    status, response = post("/api/income/1/reverse", body)
+    assert status == 400
+    assert "reason" in response["error"]
+
+
+@pytest.mark.parametrize("body", [["status"], {"status": ["Received"]}])
+def test_status_change_rejects_malformed_bodies(body):
+    status, _ = post("/api/income/1/status", body)
+    assert status == 400
+
+
+def test_reverse_income():
+    _, created = post("/api/income", INCOME)
+    status, body = post(f"/api/income/{created['id']}/reverse", {"reason": "entered twice"})
+    assert status == 200
+    assert body["reason"] == "entered twice"
+    assert balance() == 0
+
+
+@pytest.mark.parametrize("body", [["admin", "secret"], {"username": ["admin"], "password": "secret"}])
+def test_token_rejects_malformed_bodies(body):
+    status, _ = post("/api/token", body)
+    assert status == 400
+
+
+def test_token_throttles_the_forwarded_client(monkeypatch):
+    monkeypatch.setattr(auth, "_failures", auth.OrderedDict())
+    monkeypatch.setattr(auth, "TRUSTED_PROXY_HOPS", 1)
+    monkeypatch.setattr(auth, "MAX_FAILURES_PER_IP", 2)
+    auth.create_user("alice", "right", "accountant")
+    attacker = {"X-Forwarded-For": "203.0.113.9"}
+    for _ in range(2):
+        assert post("/api/token", {"username": "mallory", "password": "x"}, headers=attacker)[0] == 401
+
+    assert post("/api/token", {"username": "alice", "password": "wrong"}, headers=attacker)[0] == 429
+    status, body = post("/api/token", {"username": "alice", "password": "right"},
+                        headers={"X-Forwarded-For": "198.51.100.7"})
+    assert status == 200
+    assert api.read_token(body["token"])["role"] == "accountant"
+
+
+def test_receipts_are_served_only_to_campuses_that_reference_them(tmp_path, monkeypatch):
+    monkeypatch.setattr(receipts, "RECEIPT_DIR", str(tmp_path / "receipts"))
+    key = receipts.store(io.BytesIO(b"%PDF-1.4 receipt"), "scan.pdf")
+    north = tenants.create_institution("north", "North Campus")
+    post(f"/api/income?fund_id={tenants.create_fund(north, 'General Fund')}", dict(INCOME, receipt_path=key))
+
+    assert get(f"/api/receipts/{key}", north) == (200, b"%PDF-1.4 receipt")
+    assert get(f"/api/receipts/{key}", 1)[0] == 404
+    assert get(f"/api/receipts/{'0' * 64}.pdf", north)[0] == 404
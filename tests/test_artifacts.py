@@ -0,0 +1,117 @@
+import os
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+import artifacts
+import fiscal
+import ledger
+import reports
+import tenants
+from conftest import add_expense, add_income
+
+TODAY = date.today().isoformat()
+
+
+@pytest.fixture(autouse=True)
+def artifact_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, "ARTIFACT_DIR", str(tmp_path / "artifacts"))
+
+
+def test_built_artifact_is_served_until_its_period_changes():
+    add_income(100)
+    artifact, rebuilt = artifacts.build("daily", TODAY, "csv")
+
+    assert rebuilt and artifact["row_count"] == 1
+    assert os.path.exists(artifact["path"])
+    assert artifacts.fresh("daily", TODAY, "csv")["content_hash"] == artifact["content_hash"]
+    assert artifacts.build("daily", TODAY, "csv") == (artifact, False)
+
+    add_income(5, day=date.today() - timedelta(days=1))
+    assert artifacts.fresh("daily", TODAY, "csv") is not None
+
+    add_expense(30)
+    assert artifacts.fresh("daily", TODAY, "csv") is None
+    artifact = artifacts.get("daily", TODAY, "csv")
+    assert artifact["row_count"] == 2
+    assert artifacts.fresh("daily", TODAY, "csv") is not None
+
+
+def test_status_change_and_reversal_make_the_period_stale():
+    income_id = add_income(100, status="Pending")
+    artifacts.build("daily", TODAY, "csv")
+
+    ledger.set_status("income", income_id, "Received", user_id=1)
+    assert artifacts.fresh("daily", TODAY, "csv") is None
+
+    artifacts.build("daily", TODAY, "csv")
+    ledger.reverse("income", income_id, "entered twice", user_id=1)
+    assert artifacts.fresh("daily", TODAY, "csv") is None
+
+
+def test_postings_to_other_funds_leave_a_scoped_artifact_fresh():
+    fund_id = tenants.create_fund(1, "Building Fund", "Building")
+    add_income(100)
+    artifacts.build("daily", TODAY, "csv", [ledger.FUND_ID])
+    artifacts.build("daily", TODAY, "csv")
+
+    add_income(20, fund_id=fund_id)
+    assert artifacts.fresh("daily", TODAY, "csv", [ledger.FUND_ID]) is not None
+    assert artifacts.fresh("daily", TODAY, "csv") is None
+
+
+def test_a_posting_during_the_build_leaves_the_artifact_stale(monkeypatch):
+    add_income(100)
+    render = artifacts.render
+
+    def render_then_post(*args):
+        result = render(*args)
+        add_income(40)
+        return result
+
+    monkeypatch.setattr(artifacts, "render", render_then_post)
+    artifact, _ = artifacts.build("daily", TODAY, "csv")
+
+    assert artifact["row_count"] == 1
+    assert artifacts.fresh("daily", TODAY, "csv") is None
+
+
+def test_pdf_artifacts_and_identical_files_are_stored_once():
+    add_income(100)
+    pdf, _ = artifacts.build("daily", TODAY, "pdf")
+    with open(pdf["path"], "rb") as f:
+        assert f.read(5) == b"%PDF-"
+
+    first, _ = artifacts.build("monthly", date.today().strftime("%Y-%m"), "csv")
+    second, rebuilt = artifacts.build("monthly", date.today().strftime("%Y-%m"), "csv", force=True)
+    assert rebuilt and second["path"] == first["path"]
+    assert artifacts.prune() == 0
+
+
+def test_period_bounds():
+    assert artifacts.period_bounds("monthly", "2024-02") == (date(2024, 2, 1), date(2024, 2, 29))
+    assert artifacts.period_bounds("monthly", "2024-12") == (date(2024, 12, 1), date(2024, 12, 31))
+    assert artifacts.period_bounds("fiscal", "2024") == fiscal.period(2024)
+    with pytest.raises(ValueError):
+        artifacts.period_bounds("weekly", "2024-01")
+
+
+def test_a_job_id_runs_once_while_pending():
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(10)
+        return "built"
+
+    job_id = reports.submit_job("Report", slow, job_id="artifact-test")
+    assert reports.submit_job("Report", slow, job_id="artifact-test") == job_id
+    release.set()
+    assert reports.job_result(job_id) == "built"
+    assert calls == [1]
+
+    reports.submit_job("Report", slow, job_id="artifact-test")
+    assert reports.job_result(job_id) == "built"
+    assert calls == [1, 1]
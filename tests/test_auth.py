@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+import auth
+
+
+@pytest.fixture(autouse=True)
+def failures(monkeypatch):
+    monkeypatch.setattr(auth, "_failures", auth.OrderedDict())
+    return auth._failures
+
+
+def test_forwarded_for_is_ignored_without_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(auth, "TRUSTED_PROXY_HOPS", 0)
+    assert auth.client_ip("203.0.113.9", "10.0.0.1") == "10.0.0.1"
+
+
+def test_client_ip_is_the_address_the_outermost_trusted_proxy_saw(monkeypatch):
+    monkeypatch.setattr(auth, "TRUSTED_PROXY_HOPS", 1)
+    assert auth.client_ip("1.1.1.1, 203.0.113.9", "10.0.0.1") == "203.0.113.9"
+
+    monkeypatch.setattr(auth, "TRUSTED_PROXY_HOPS", 2)
+    assert auth.client_ip("1.1.1.1, 203.0.113.9, 10.0.0.2", "10.0.0.1") == "203.0.113.9"
+    assert auth.client_ip("203.0.113.9", "10.0.0.1") == "203.0.113.9"
+    assert auth.client_ip("", "10.0.0.1") == "10.0.0.1"
+
+
+def test_throttle_trips_per_user_and_per_ip(monkeypatch):
+    monkeypatch.setattr(auth, "MAX_FAILURES_PER_USER", 2)
+    monkeypatch.setattr(auth, "MAX_FAILURES_PER_IP", 3)
+    for _ in range(2):
+        auth.record_failure("Alice", "203.0.113.9")
+
+    with pytest.raises(auth.LoginThrottled):
+        auth.check_throttle("alice")
+    auth.check_throttle("bob", "203.0.113.9")
+    auth.record_failure("bob", "203.0.113.9")
+    with pytest.raises(auth.LoginThrottled):
+        auth.check_throttle("carol", "203.0.113.9")
+
+    auth.clear_failures("alice")
+    auth.check_throttle("alice")
+
+
+def test_throttle_table_is_bounded(monkeypatch, failures):
+    monkeypatch.setattr(auth, "MAX_TRACKED_KEYS", 10)
+    for number in range(100):
+        auth.record_failure(f"user{number}", "203.0.113.9")
+
+    assert len(failures) <= 10
+    assert "ip:203.0.113.9" in failures
+    assert "user:user99" in failures
+
+
+def test_expired_failures_are_pruned(monkeypatch, failures):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    auth.record_failure("alice")
+    now[0] += auth.THROTTLE_WINDOW + 1
+    auth.record_failure("bob")
+
+    assert list(failures) == ["user:bob"]
@@ -0,0 +1,99 @@
+import time
+
+import pandas as pd
+
+import cache
+import ledger
+from conftest import add_income
+
+
+def counting(tags=("income",), ttl=60):
+    calls = []
+
+    @cache.cached(tags=tags, ttl=ttl)
+    def read(key):
+        calls.append(key)
+        return len(calls)
+
+    return read, calls
+
+
+def test_repeat_reads_hit_the_cache():
+    read, calls = counting()
+
+    assert read("a") == read("a") == 1
+    assert read("b") == 2
+    assert calls == ["a", "b"]
+
+
+def test_invalidate_drops_only_tagged_entries():
+    # Both readers share a qualified name, hence a key prefix: use distinct arguments.
+    income, income_calls = counting(("income",))
+    funds, funds_calls = counting(("funds", "department_balances"))
+    income("income")
+    funds("funds")
+
+    cache.invalidate("department_balances")
+    income("income")
+    funds("funds")
+
+    assert income_calls == ["income"]
+    assert funds_calls == ["funds", "funds"]
+
+
+def test_value_computed_across_a_write_is_not_cached():
+    calls = []
+
+    @cache.cached(tags=("income",))
+    def read():
+        calls.append(1)
+        if len(calls) == 1:
+            # A writer commits and invalidates while this read is running.
+            cache.invalidate("income")
+        return len(calls)
+
+    assert read() == 1
+    assert read() == 2
+    assert read() == 2
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    read, calls = counting(ttl=5)
+    read("a")
+    now[0] += 6
+    read("a")
+
+    assert calls == ["a", "a"]
+    assert cache.stats()["expired"] == 1
+
+
+def test_least_recently_used_entries_are_evicted(monkeypatch):
+    monkeypatch.setattr(cache, "_cache", cache.QueryCache(max_entries=2))
+    read, calls = counting()
+    read("a")
+    read("b")
+    read("a")
+    read("c")
+    read("a")
+    read("b")
+
+    assert calls == ["a", "b", "c", "b"]
+    assert cache.stats()["evictions"] == 2
+
+
+def test_callers_get_their_own_frames():
+    @cache.cached(tags=("income",))
+    def frame():
+        return pd.DataFrame({"amount": [1, 2]})
+
+    first = frame()
+    first.loc[:, "amount"] = 0
+    assert frame()["amount"].tolist() == [1, 2]
+
+
+def test_ledger_writes_invalidate_balances():
+    assert float(ledger.get_fund_balance()) == 0
+    add_income(25)
+    assert float(ledger.get_fund_balance()) == 25
@@ -0,0 +1,137 @@
+from datetime import date
+
+import pandas as pd
+
+import cache
+import db
+import events
+import importer
+import ledger
+import tenants
+from conftest import add_expense, add_income
+
+
+def add_event(seq, age=0):
+    # An event row with an explicit seq, written `age` seconds ago.
+    created_at = {"sqlite": f"datetime('now', '-{age} seconds')"}[db.backend_name()]
+    with db.transaction() as cursor:
+        cursor.execute(f"""
+            INSERT INTO transaction_events
+                (seq, event, transaction_type, transaction_id, fund_id, type, department, date, amount,
+                 new_status, created_at)
+            VALUES (%s, 'insert', 'income', %s, 1, 'Other Income', 'Science', %s, 1, 'Received', {created_at})
+        """, (seq, 1000 + seq, date.today()))
+
+
+def seqs(after=0, fund_ids=None):
+    rows, next_after = events.tail(after, fund_ids=fund_ids)
+    return [row["seq"] for row in rows], next_after
+
+
+def test_every_change_is_logged_in_order():
+    income_id = add_income(100, status="Pending")
+    ledger.set_status("income", income_id, "Received", user_id=7)
+    expense_id = add_expense(30)
+    ledger.reverse("expense", expense_id, "duplicate", user_id=7)
+
+    rows, next_after = events.tail(0)
+    assert [(row["event"], row["transaction_type"]) for row in rows] == [
+        ("insert", "income"), ("status", "income"), ("insert", "expense"), ("reverse", "expense"),
+    ]
+    assert next_after == rows[-1]["seq"] == 4
+    assert (rows[1]["old_status"], rows[1]["new_status"], rows[1]["user_id"]) == ("Pending", "Received", 7)
+    assert events.history("income", income_id)["event"].tolist() == ["insert", "status"]
+
+
+def test_bulk_inserts_log_one_event_per_row():
+    add_income(5)
+    clean, _ = importer.validate(pd.DataFrame([
+        {"transaction_type": kind, "name": "Row", "type": t_type, "amount": "1", "date": date.today().isoformat(),
+         "department": "Arts", "status": status}
+        for kind, t_type, status in [("income", "Hostel Fees", "Received"), ("expense", "Maintenance", "Paid"),
+                                     ("income", "Admission Fees", "Pending")]
+    ]))
+    importer.load_batch(clean, user_id=3)
+
+    rows, _ = events.tail(1)
+    logged = sorted((row["transaction_type"], row["transaction_id"], row["type"]) for row in rows)
+    stored = sorted(
+        [("income", row_id, t_type) for row_id, t_type in db.fetch_all("SELECT id, type FROM income WHERE id > 1")]
+        + [("expense", row_id, t_type) for row_id, t_type in db.fetch_all("SELECT id, type FROM expenses")]
+    )
+    assert logged == stored
+    assert {row["user_id"] for row in rows} == {3}
+
+
+def test_tail_pages_and_skips_other_funds():
+    fund_id = tenants.create_fund(1, "Building Fund", "Building")
+    add_income(1)
+    add_income(2, fund_id=fund_id)
+    add_income(3)
+
+    assert seqs(fund_ids=[fund_id]) == ([2], 3)
+    rows, next_after = events.tail(0, limit=2)
+    assert ([row["seq"] for row in rows], next_after) == ([1, 2], 2)
+    assert seqs(next_after) == ([3], 3)
+    assert seqs(3) == ([], 3)
+
+
+def test_high_water_waits_below_a_young_gap():
+    for seq in (1, 2, 3):
+        add_event(seq)
+    add_event(5)
+
+    assert events.high_water() == 3
+    assert seqs() == ([1, 2, 3], 3)
+
+    add_event(4)
+    assert events.high_water() == 5
+
+
+def test_high_water_skips_an_old_gap():
+    add_event(1, age=events.GAP_GRACE + 60)
+    add_event(3, age=events.GAP_GRACE + 30)
+    add_event(4)
+
+    assert events.high_water() == 4
+    add_event(6)
+    assert events.high_water() == 4
+
+
+def test_high_water_only_scans_the_gap_window(monkeypatch):
+    monkeypatch.setattr(events, "GAP_WINDOW", 2)
+    add_event(1)
+    add_event(3)
+    add_event(4)
+    add_event(5)
+
+    # The young gap at 2 is older than the last GAP_WINDOW seqs.
+    assert events.high_water() == 5
+
+
+def test_changed_since_is_bounded_by_period_and_scope():
+    fund_id = tenants.create_fund(1, "Building Fund", "Building")
+    add_income(1, day=date(2024, 5, 1))
+    mark = events.high_water()
+    add_income(2, day=date(2024, 6, 1), fund_id=fund_id)
+
+    assert not events.changed_since(mark, date(2024, 5, 1), date(2024, 5, 31))
+    assert events.changed_since(mark, date(2024, 6, 1), date(2024, 6, 30))
+    assert not events.changed_since(mark, date(2024, 6, 1), date(2024, 6, 30), [ledger.FUND_ID])
+
+
+def test_follower_drops_cache_entries_for_writes_from_elsewhere():
+    follower = events.Follower()
+    assert float(ledger.get_fund_balance()) == 0
+
+    # Another process posts: its cache.invalidate() never reaches this one.
+    invalidate = cache.invalidate
+    cache.invalidate = lambda *tags: None
+    try:
+        add_income(40)
+    finally:
+        cache.invalidate = invalidate
+    assert float(ledger.get_fund_balance()) == 0
+
+    assert follower.poll() == 1
+    assert float(ledger.get_fund_balance()) == 40
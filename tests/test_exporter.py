@@ -0,0 +1,89 @@
+import csv
+import gzip
+import io
+from datetime import date, timedelta
+
+import pytest
+
+import db
+import exporter
+import queries
+from conftest import add_expense, add_income
+
+
+@pytest.fixture
+def rows():
+    # Several rows per day on both sides, so pages break inside ties.
+    day = date.today() - timedelta(days=10)
+    for offset in range(10):
+        add_income(100, day=day + timedelta(days=offset))
+        add_income(50, day=day + timedelta(days=offset), department="Arts")
+        add_expense(10, day=day + timedelta(days=offset))
+    return 30
+
+
+def keys(rows):
+    return [(str(row[exporter.KEY_COLUMNS[0]])[:10], row[0], row[1]) for row in rows]
+
+
+def test_chunks_cover_every_row_once_in_page_order(rows):
+    chunks = list(exporter.iter_chunks(queries.make_filters(), chunk_size=4))
+
+    assert [len(chunk) for chunk in chunks] == [4] * 7 + [2]
+    streamed = keys([row for chunk in chunks for row in chunk])
+    expected = sorted(streamed, key=lambda key: (key[0], key[1] == "expense", key[2]), reverse=True)
+    assert streamed == expected
+    assert len(set(streamed)) == rows
+
+
+def test_chunks_respect_filters(rows):
+    filters = queries.make_filters(transaction_types=["income"], departments=["Arts"])
+    chunks = list(exporter.iter_chunks(filters, chunk_size=3))
+
+    assert sum(len(chunk) for chunk in chunks) == 10
+    assert {row[exporter.COLUMN_NAMES.index("department")] for chunk in chunks for row in chunk} == {"Arts"}
+    assert list(exporter.iter_chunks(queries.make_filters(fund_ids=[]))) == []
+
+
+def test_connection_is_released_between_chunks(rows, tmp_path):
+    db.configure(db.SQLiteBackend(str(tmp_path / "funds.db")), size=1, timeout=1)
+    chunks = exporter.iter_chunks(queries.make_filters(), chunk_size=4)
+
+    next(chunks)
+    # Only possible if the paused export holds no connection.
+    assert db.fetch_one("SELECT COUNT(*) FROM income")[0] == 20
+    assert sum(len(chunk) for chunk in chunks) == rows - 4
+
+
+def test_csv_export(rows):
+    export_file, count = exporter.export(queries.make_filters(), "csv", chunk_size=7)
+    with export_file:
+        lines = list(csv.reader(io.TextIOWrapper(export_file, encoding="utf-8")))
+
+    assert count == rows
+    assert lines[0] == exporter.COLUMN_NAMES
+    assert len(lines) == rows + 1
+
+
+def test_gzip_export_matches_csv(rows):
+    plain, _ = exporter.export(queries.make_filters(), "csv")
+    compressed, count = exporter.export(queries.make_filters(), "csv.gz")
+    with plain, compressed:
+        assert gzip.decompress(compressed.read()) == plain.read()
+    assert count == rows
+
+
+def test_parquet_export(rows):
+    pq = pytest.importorskip("pyarrow.parquet")
+    export_file, count = exporter.export(queries.make_filters(), "parquet", chunk_size=8)
+    with export_file:
+        table = pq.read_table(export_file)
+
+    assert count == table.num_rows == rows
+    assert table.column_names == exporter.COLUMN_NAMES
+    assert sum(table.column("amount").to_pylist()) == 10 * (100 + 50 + 10)
+
+
+def test_unknown_format_is_refused():
+    with pytest.raises(ValueError):
+        exporter.export(queries.make_filters(), "xlsx")
@@ -0,0 +1,123 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import db
+import exporter
+import fiscal
+import importer
+import ledger
+import queries
+import reports
+import writequeue
+from conftest import add_expense, add_income, balance
+
+FISCAL_YEAR = fiscal.fiscal_year_of(date.today()) - 2
+START, END = fiscal.period(FISCAL_YEAR)
+
+
+def test_close_archives_the_year_and_keeps_balances():
+    add_income(100, day=START)
+    add_expense(30, day=END)
+    add_income(5)
+
+    result = fiscal.close_year(FISCAL_YEAR)
+
+    assert (result["income_rows"], result["expense_rows"]) == (1, 1)
+    assert float(result["closing_balance"]) == 70
+    assert db.fetch_one("SELECT COUNT(*) FROM income")[0] == 1
+    assert db.fetch_one("SELECT COUNT(*) FROM income_archive")[0] == 1
+    assert balance() == 75
+    assert ledger.reconcile() == {}
+
+
+def test_posting_into_a_closed_year_is_refused():
+    add_income(100, day=START)
+    fiscal.close_year(FISCAL_YEAR)
+
+    with pytest.raises(ledger.PeriodClosed):
+        add_income(10, day=END)
+    with pytest.raises(ledger.PeriodClosed):
+        add_expense(10, day=END)
+    assert balance() == 100
+    assert ledger.reconcile() == {}
+
+
+def test_bulk_load_into_a_closed_year_is_refused():
+    add_income(100, day=START)
+    fiscal.close_year(FISCAL_YEAR)
+    chunk = pd.DataFrame([
+        {"transaction_type": "income", "name": "Donor", "type": "Other Income", "amount": 10,
+         "date": END.isoformat(), "department": "Science", "status": "Received"},
+    ])
+
+    clean, rejected = importer.validate(chunk, closed_through=ledger.closed_through())
+    assert clean.empty
+    assert rejected["reason"].tolist() == ["date is in a closed fiscal year"]
+
+    clean, _ = importer.validate(chunk)
+    with pytest.raises(ledger.PeriodClosed):
+        importer.load_batch(clean, user_id=1)
+    assert db.fetch_one("SELECT COUNT(*) FROM income")[0] == 0
+    assert balance() == 100
+
+
+def test_write_queue_rejects_a_closed_year(tmp_path):
+    add_income(100, day=START)
+    fiscal.close_year(FISCAL_YEAR)
+    queue = writequeue.WriteQueue(str(tmp_path / "writes.log"), flush_interval=0.01).start()
+    try:
+        queue.submit("income", "Donor", 1, "Other Income", "", 10, END, "Science", "Received")
+        assert queue.flush(10)
+    finally:
+        queue.stop(5)
+    assert queue.stats["rejected"] == 1
+    assert balance() == 100
+
+
+def test_close_refuses_pending_rows_unless_allowed():
+    add_income(100, day=START, status="Pending")
+
+    with pytest.raises(ValueError, match="Pending"):
+        fiscal.close_year(FISCAL_YEAR)
+    assert fiscal.close_year(FISCAL_YEAR, allow_pending=True)["income_rows"] == 1
+
+
+def test_close_refuses_an_open_or_closed_year():
+    with pytest.raises(ValueError, match="has not ended"):
+        fiscal.close_year(fiscal.fiscal_year_of(date.today()))
+
+    fiscal.close_year(FISCAL_YEAR)
+    with pytest.raises(ValueError, match="already closed"):
+        fiscal.close_year(FISCAL_YEAR)
+
+
+def test_close_refuses_to_skip_an_earlier_year():
+    add_income(100, day=START)
+
+    with pytest.raises(ValueError, match="close the earlier year first"):
+        fiscal.close_year(FISCAL_YEAR + 1)
+
+
+def totals(df, column="type"):
+    return {key: float(total) for key, total in zip(df[column], df["total_amount"])}
+
+
+def test_report_totals_cover_the_open_period_like_its_rows():
+    add_income(100, day=START)
+    fiscal.close_year(FISCAL_YEAR)
+    add_income(30)
+    add_income(20, department="Arts")
+
+    open_period = queries.make_filters()
+    listed = sum(len(rows) for rows in exporter.iter_chunks(open_period))
+    assert listed == 2
+    assert totals(reports.breakdown("income", filters=open_period)) == {"Other Income": 50}
+    assert totals(reports.breakdown("income", "department"), "department") == {"Arts": 20, "Science": 30}
+
+    everything = queries.make_filters(include_archived=True)
+    assert sum(len(rows) for rows in exporter.iter_chunks(everything)) == 3
+    assert totals(reports.breakdown("income", filters=everything)) == {"Other Income": 150}
+    bounded = queries.make_filters(start_date=START, end_date=END, include_archived=True)
+    assert totals(reports.breakdown("income", filters=bounded)) == {"Other Income": 100}
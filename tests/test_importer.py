@@ -0,0 +1,125 @@
+import io
+import sqlite3
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+import db
+import fiscal
+import importer
+import ledger
+from conftest import add_income, balance
+
+TODAY = date.today().isoformat()
+
+
+def record(**overrides):
+    return dict({"transaction_type": "income", "name": "Donor", "type": "Other Income", "description": "",
+                 "amount": "100", "date": TODAY, "department": "Science", "status": "Received"}, **overrides)
+
+
+def csv_file(records):
+    return io.StringIO(pd.DataFrame(records).to_csv(index=False))
+
+
+@pytest.mark.parametrize("overrides, reason", [
+    ({"transaction_type": "gift"}, "unknown transaction_type; unknown type; unknown status"),
+    ({"name": " "}, "missing name"),
+    ({"amount": "ten"}, "amount is not a number"),
+    ({"amount": "nan"}, "amount is not a number"),
+    ({"amount": "-5"}, "amount must be positive"),
+    ({"amount": "inf"}, "amount is too large"),
+    ({"amount": "1e12"}, "amount is too large"),
+    ({"date": "31/31/2024"}, "invalid date"),
+    ({"type": "Maintenance"}, "unknown type"),
+    ({"department": "Nowhere"}, "unknown department"),
+    ({"status": "Paid"}, "unknown status"),
+    ({"name": "x" * 256}, "name is longer than 255 characters"),
+    ({"receipt_path": "r" * 256}, "receipt_path is longer than 255 characters"),
+    ({"description": "é" * 40000}, "description is too long"),
+])
+def test_validate_rejects(overrides, reason):
+    clean, rejected = importer.validate(pd.DataFrame([record(), record(**overrides)]))
+
+    assert len(clean) == 1
+    assert rejected["row"].tolist() == [3]
+    assert rejected["reason"].tolist() == [reason]
+
+
+def test_validate_accepts_the_largest_values():
+    clean, rejected = importer.validate(pd.DataFrame([
+        record(name="x" * 255, amount="999999999999.99", description="d" * 65535),
+    ]))
+    assert rejected.empty
+    assert len(clean) == 1
+
+
+def test_validate_requires_columns():
+    with pytest.raises(ValueError, match="Missing columns: amount"):
+        importer.validate(pd.DataFrame([record()]).drop(columns=["amount"]))
+
+
+def test_import_loads_valid_rows_and_reports_rejects():
+    stats, rejected = importer.run_import(csv_file([record(), record(amount="-1"), record(amount="50")]),
+                                          chunk_size=2, user_id=1)
+
+    assert (stats["read"], stats["imported"], stats["rejected"], stats["batches"]) == (3, 2, 1, 2)
+    assert rejected["row"].tolist() == [3]
+    assert balance() == 150
+    assert ledger.reconcile() == {}
+
+
+def test_overdrawn_chunk_is_rejected_whole():
+    records = [record(amount="100"),
+               record(transaction_type="expense", type="Maintenance", status="Paid", amount="60"),
+               record(transaction_type="expense", type="Maintenance", status="Paid", amount="60"),
+               record(amount="10")]
+    stats, rejected = importer.run_import(csv_file(records), chunk_size=2)
+
+    # The second chunk nets to -50 against a balance of 40.
+    assert stats["imported"] == 2
+    assert rejected["row"].tolist() == [4, 5]
+    assert rejected["reason"].str.startswith("batch rejected: ").all()
+    assert balance() == 40
+    assert db.fetch_one("SELECT COUNT(*) FROM expenses")[0] == 1
+    assert ledger.reconcile() == {}
+
+
+def test_closed_year_rows_are_rejected():
+    fiscal_year = fiscal.fiscal_year_of(date.today()) - 2
+    start, _ = fiscal.period(fiscal_year)
+    add_income(10, day=start)
+    fiscal.close_year(fiscal_year)
+
+    stats, rejected = importer.run_import(csv_file([record(date=(start + timedelta(days=1)).isoformat()), record()]))
+
+    assert stats["imported"] == 1
+    assert rejected["reason"].tolist() == ["date is in a closed fiscal year"]
+
+
+def test_rows_the_database_refuses_are_rejected_alone(monkeypatch):
+    load_batch = importer.load_batch
+
+    def refuse_bad_names(clean, user_id=None, fund_id=ledger.FUND_ID):
+        if clean["name"].eq("Bad").any():
+            raise sqlite3.IntegrityError("Data too long for column 'name'")
+        load_batch(clean, user_id, fund_id)
+
+    monkeypatch.setattr(importer, "load_batch", refuse_bad_names)
+    stats, rejected = importer.run_import(csv_file([record(), record(name="Bad"), record(amount="5")]))
+
+    assert stats["imported"] == 2
+    assert rejected["row"].tolist() == [3]
+    assert rejected["reason"].tolist() == ["Data too long for column 'name'"]
+    assert balance() == 105
+    assert ledger.reconcile() == {}
+
+
+def test_transient_errors_abort_the_import(monkeypatch):
+    def locked(clean, user_id=None, fund_id=ledger.FUND_ID):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(importer, "load_batch", locked)
+    with pytest.raises(sqlite3.OperationalError):
+        importer.run_import(csv_file([record()]))
@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+
+import db
+import ledger
+from conftest import add_expense, add_income, balance
+
+
+def test_income_credits_fund_and_department():
+    add_income(100)
+    add_income(50, department="Arts")
+
+    assert balance() == 150
+    departments = ledger.get_department_balances([ledger.FUND_ID])
+    assert dict(zip(departments["department"], departments["balance"].astype(float))) == {"Science": 100, "Arts": 50}
+
+
+def test_expense_debits_balance():
+    add_income(100)
+    add_expense(30)
+
+    assert balance() == 70
+    assert ledger.reconcile() == {}
+
+
+def test_overdraft_is_rejected_and_rolled_back():
+    add_income(20)
+
+    with pytest.raises(ledger.InsufficientFunds):
+        add_expense(30)
+
+    assert balance() == 20
+    assert db.fetch_one("SELECT COUNT(*) FROM expenses")[0] == 0
+    assert ledger.reconcile() == {}
+
+
+def test_concurrent_expenses_never_overdraw():
+    add_income(100)
+    results = []
+
+    def spend():
+        try:
+            add_expense(30)
+            results.append(True)
+        except ledger.InsufficientFunds:
+            results.append(False)
+
+    threads = [threading.Thread(target=spend) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 3
+    assert balance() == 10
+    assert ledger.reconcile() == {}
+
+
+def test_unknown_fund_is_rejected():
+    with pytest.raises(ledger.UnknownFund):
+        add_income(10, fund_id=999)
+    assert db.fetch_one("SELECT COUNT(*) FROM income")[0] == 0
+
+
+def test_reconcile_reports_and_fixes_drift():
+    add_income(100)
+    with db.transaction() as cursor:
+        cursor.execute("UPDATE department_balances SET balance = balance + 5 WHERE department = %s", ("Science",))
+
+    drift = ledger.reconcile()
+    assert {key: tuple(map(float, values)) for key, values in drift.items()} == {
+        (ledger.FUND_ID, "Science"): (105, 100),
+    }
+
+    ledger.reconcile(fix=True)
+    assert ledger.reconcile() == {}
+    assert balance() == 100
+
+
+def test_reverse_undoes_the_posting():
+    add_income(100)
+    expense_id = add_expense(40)
+
+    ledger.reverse("expense", expense_id, "entered twice")
+
+    assert balance() == 100
+    assert db.fetch_one("SELECT COUNT(*) FROM expenses")[0] == 0
+    assert ledger.reconcile() == {}
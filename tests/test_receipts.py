@@ -0,0 +1,116 @@
+import hashlib
+import io
+import threading
+import urllib.error
+import urllib.request
+from datetime import date
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import ledger
+import receipts
+import tenants
+
+CONTENT = bytes(range(256)) * 40
+
+
+@pytest.fixture(autouse=True)
+def receipt_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(receipts, "RECEIPT_DIR", str(tmp_path / "receipts"))
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), receipts._ReceiptHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def fetch(url, **headers):
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers)) as response:
+            return response.status, dict(response.headers), response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers), b""
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-200", (800, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=900-5000", (900, 999)),
+    (" bytes=0-0 ", (0, 0)),
+])
+def test_parse_range(header, expected):
+    assert receipts.parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=-", "bytes=1000-", "bytes=5-4", "bytes=-0", "items=0-1", "bytes=0-1,5-6"])
+def test_parse_range_rejects(header):
+    with pytest.raises(ValueError):
+        receipts.parse_range(header, 1000)
+
+
+def test_store_is_content_addressed():
+    key = receipts.store(io.BytesIO(CONTENT), "Scan.PDF")
+
+    assert key == hashlib.sha256(CONTENT).hexdigest() + ".pdf"
+    assert receipts.store(io.BytesIO(CONTENT), "copy.pdf") == key
+    with open(receipts.path_for(key), "rb") as f:
+        assert f.read() == CONTENT
+    assert receipts.content_type(key) == "application/pdf"
+
+
+def test_store_refuses_bad_uploads(monkeypatch):
+    with pytest.raises(ValueError, match="Unsupported receipt type"):
+        receipts.store(io.BytesIO(CONTENT), "receipt.exe")
+    monkeypatch.setattr(receipts, "MAX_RECEIPT_BYTES", 100)
+    with pytest.raises(receipts.ReceiptTooLarge):
+        receipts.store(io.BytesIO(CONTENT), "receipt.pdf")
+
+
+@pytest.mark.parametrize("key", ["../../etc/passwd", "0" * 64 + ".exe", "abc.pdf", None])
+def test_keys_are_validated(key):
+    with pytest.raises(KeyError):
+        receipts.path_for(key)
+    assert not receipts.exists(key)
+
+
+def test_server_honours_ranges_and_etags(server):
+    key = receipts.store(io.BytesIO(CONTENT), "scan.pdf")
+    url = f"{server}/receipts/{key}"
+
+    status, headers, body = fetch(url)
+    assert (status, body) == (200, CONTENT)
+    assert headers["Accept-Ranges"] == "bytes"
+
+    status, headers, body = fetch(url, Range="bytes=10-19")
+    assert (status, body) == (206, CONTENT[10:20])
+    assert headers["Content-Range"] == f"bytes 10-19/{len(CONTENT)}"
+
+    assert fetch(url, Range="bytes=-5")[2] == CONTENT[-5:]
+    assert fetch(url, Range=f"bytes={len(CONTENT)}-")[0] == 416
+    assert fetch(url, **{"If-None-Match": headers["ETag"]})[0] == 304
+    assert fetch(url, Range="bytes=0-9", **{"If-Range": '"stale"'})[0] == 200
+    assert fetch(f"{server}/receipts/../{key}")[0] == 404
+
+
+def test_receipts_are_visible_only_to_campuses_that_reference_them():
+    key = receipts.store(io.BytesIO(CONTENT), "scan.pdf")
+    north = tenants.create_institution("north", "North Campus")
+    north_fund = tenants.create_fund(north, "General Fund")
+    south = tenants.create_institution("south", "South Campus")
+
+    assert not tenants.may_see_receipt(key, None)
+    ledger.record_income("Donor", 1, "Other Income", "", 10, date.today(), "Science", "Received", key,
+                         fund_id=north_fund)
+
+    assert tenants.may_see_receipt(key, north)
+    assert tenants.may_see_receipt(key, None)
+    assert not tenants.may_see_receipt(key, south)
+    assert not tenants.may_see_receipt(key, 1)  # Main Campus
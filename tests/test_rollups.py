@@ -0,0 +1,90 @@
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+import db
+import fiscal
+import importer
+import ledger
+import rollups
+from conftest import add_expense, add_income
+
+MONTH_AGO = date.today() - timedelta(days=31)
+
+
+def snapshot():
+    rows = db.fetch_all("""
+        SELECT fund_id, transaction_type, type, department, status, month, total_amount, row_count
+        FROM transaction_rollups WHERE row_count <> 0
+        ORDER BY fund_id, transaction_type, type, department, status, month
+    """)
+    return [(*row[:6], round(float(row[6]), 2), int(row[7])) for row in rows]
+
+
+def totals(df, column):
+    return {key: float(total) for key, total in zip(df[column], df["total_amount"])}
+
+
+def test_postings_keep_rollups_equal_to_a_rebuild():
+    add_income(100, day=MONTH_AGO)
+    add_income(40, department="Arts", status="Pending")
+    add_expense(30)
+    importer.load_batch(importer.validate(pd.DataFrame([
+        {"transaction_type": "expense", "name": "Vendor", "type": "Lab Equipment", "amount": "12.5",
+         "date": date.today().isoformat(), "department": "Science", "status": "Paid"},
+    ]))[0], user_id=1)
+    maintained = snapshot()
+
+    assert rollups.rebuild() == len(maintained)
+    assert snapshot() == maintained
+
+
+def test_breakdowns_group_by_each_column():
+    add_income(100, day=MONTH_AGO)
+    add_income(40, department="Arts", status="Pending")
+
+    assert totals(rollups.breakdown("income", "department"), "department") == {"Arts": 40, "Science": 100}
+    assert totals(rollups.breakdown("income", "status"), "status") == {"Pending": 40, "Received": 100}
+    assert totals(rollups.breakdown("income", "month"), "month") == {
+        rollups.month_of(MONTH_AGO): 100, rollups.month_of(date.today()): 40,
+    }
+    assert totals(rollups.breakdown("income", "month", after_month=rollups.month_of(MONTH_AGO)), "month") == {
+        rollups.month_of(date.today()): 40,
+    }
+    with pytest.raises(ValueError):
+        rollups.breakdown("income", "name")
+
+
+def test_status_change_moves_the_row_between_buckets():
+    income_id = add_income(40, status="Pending")
+
+    ledger.set_status("income", income_id, "Received")
+
+    assert totals(rollups.breakdown("income", "status"), "status") == {"Received": 40}
+    rollups.rebuild()
+    assert totals(rollups.breakdown("income", "status"), "status") == {"Received": 40}
+
+
+def test_reversal_empties_its_bucket():
+    add_income(100)
+    expense_id = add_expense(30)
+
+    ledger.reverse("expense", expense_id, "duplicate")
+
+    assert rollups.breakdown("expense").empty
+    assert totals(rollups.breakdown("income"), "type") == {"Other Income": 100}
+
+
+def test_rebuild_keeps_closed_years():
+    fiscal_year = fiscal.fiscal_year_of(date.today()) - 2
+    start, _ = fiscal.period(fiscal_year)
+    add_income(70, day=start)
+    fiscal.close_year(fiscal_year)
+    add_income(30)
+
+    rollups.rebuild()
+
+    assert totals(rollups.breakdown("income"), "type") == {"Other Income": 100}
+    assert totals(rollups.breakdown("income", fund_ids=[ledger.FUND_ID]), "type") == {"Other Income": 100}
+    assert rollups.breakdown("income", fund_ids=[]).empty
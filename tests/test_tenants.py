@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+import ledger
+import queries
+import tenants
+from conftest import add_income, balance
+
+
+def test_fund_scope_follows_the_institution():
+    north = tenants.create_institution("north", "North Campus")
+    fund_id = tenants.create_fund(north, "Scholarship Fund", "Scholarship")
+
+    assert tenants.fund_scope(north) == (fund_id,)
+    assert tenants.fund_scope(ledger.FUND_ID) == (ledger.FUND_ID,)
+    assert tenants.fund_scope(None) is None
+    assert tenants.fund_scope(tenants.create_institution("empty", "Empty Campus")) == ()
+
+
+def test_check_fund_refuses_other_campuses():
+    north = tenants.create_institution("north", "North Campus")
+    fund_id = tenants.create_fund(north, "General Fund")
+
+    tenants.check_fund(fund_id, north)
+    tenants.check_fund(fund_id, None)
+    with pytest.raises(ledger.UnknownFund):
+        tenants.check_fund(fund_id, 1)
+    with pytest.raises(ledger.UnknownFund):
+        tenants.check_fund(ledger.FUND_ID, north)
+
+
+def test_reads_are_scoped_to_the_fund():
+    fund_id = tenants.create_fund(1, "Building Fund", "Building")
+    add_income(100)
+    add_income(40, fund_id=fund_id)
+
+    assert balance() == 100
+    assert balance(fund_id) == 40
+    assert float(ledger.get_fund_balance()) == 140
+    assert queries.summarize(queries.make_filters(fund_ids=[fund_id]))["count"] == 1
+    assert queries.summarize(queries.make_filters(fund_ids=[]))["count"] == 0
+
+
+def test_fund_creation_validates_input():
+    with pytest.raises(ValueError):
+        tenants.create_fund(1, " ")
+    with pytest.raises(ValueError):
+        tenants.create_fund(1, "Fund", "Unknown")
+    with pytest.raises(ValueError):
+        tenants.create_fund(999, "Fund")
+    with pytest.raises(ValueError, match="already in use"):
+        tenants.create_institution("MAIN", "Main Campus Again")
+
+
+def test_concurrent_fund_creates_get_distinct_ids():
+    start = threading.Barrier(6)
+    created, failed = [], []
+
+    def create(number):
+        start.wait()
+        try:
+            created.append(tenants.create_fund(1, f"Fund {number}"))
+        except Exception as e:
+            failed.append(e)
+
+    threads = [threading.Thread(target=create, args=(number,)) for number in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert failed == []
+    assert sorted(created) == list(range(2, 8))
@@ -0,0 +1,136 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+import db
+import ledger
+import writequeue
+from conftest import add_income, balance
+
+
+@pytest.fixture
+def queue(tmp_path):
+    # Long enough for a test's submits to land in one batch.
+    queue = writequeue.WriteQueue(str(tmp_path / "writes.log"), flush_interval=0.2)
+    yield queue
+    queue.stop(5)
+
+
+def submit(queue, kind, amount, name="Vendor"):
+    t_type = "Other Income" if kind == "income" else "Maintenance"
+    status = "Received" if kind == "income" else "Paid"
+    return queue.submit(kind, name, 1, t_type, "", amount, date.today(), "Science", status)
+
+
+def test_batch_commits_and_checkpoints(queue):
+    queue.start()
+    submit(queue, "income", 100)
+    submit(queue, "expense", 40)
+
+    assert queue.flush(10)
+    assert queue.stats["committed"] == 2
+    assert balance() == 60
+    assert writequeue.last_checkpoint(queue.name) == 2
+    assert ledger.reconcile() == {}
+
+
+def test_overdraft_is_rejected_without_blocking_the_batch(queue):
+    add_income(50)
+    queue.start()
+    submit(queue, "expense", 80)
+    submit(queue, "expense", 30)
+
+    assert queue.flush(10)
+    assert queue.stats["committed"] == 1
+    assert queue.stats["rejected"] == 1
+    assert balance() == 20
+    assert [r["amount"] for r in queue.take_rejections(1)] == [80]
+    assert writequeue.last_checkpoint(queue.name) == 2
+    assert ledger.reconcile() == {}
+
+
+def test_invalid_entry_is_rejected_not_retried(queue):
+    queue.start()
+    submit(queue, "income", 10, name=None)
+    submit(queue, "income", 25)
+
+    assert queue.flush(10)
+    assert queue.stats["rejected"] == 1
+    assert queue.stats["errors"] == 0
+    assert balance() == 25
+    assert writequeue.last_checkpoint(queue.name) == 2
+
+
+def test_replay_applies_journal_once(tmp_path):
+    path = tmp_path / "writes.log"
+    row = ("Donor", 1, "Other Income", "", "70.00", date.today(), "Science", "Received", None, ledger.FUND_ID)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(writequeue._encode(1, "income", row))
+        f.write(writequeue._encode(2, "income", row))
+        f.write(writequeue._encode(3, "income", row)[:20])
+
+    queue = writequeue.WriteQueue(str(path), flush_interval=0.01)
+    queue.start()
+    assert queue.flush(10)
+    queue.stop(5)
+    assert queue.stats["recovered"] == 2
+    assert balance() == 140
+
+    restarted = writequeue.WriteQueue(str(path), flush_interval=0.01)
+    assert restarted.recover() == 0
+    assert db.fetch_one("SELECT COUNT(*) FROM income")[0] == 2
+
+
+def lock_on_call(monkeypatch, number):
+    # Make the `number`th apply_entries call fail as if the rows were locked.
+    apply_entries = writequeue.apply_entries
+    calls = []
+
+    def apply(cursor, entries):
+        calls.append(len(entries))
+        if len(calls) == number:
+            raise sqlite3.OperationalError("database is locked")
+        apply_entries(cursor, entries)
+
+    monkeypatch.setattr(writequeue, "apply_entries", apply)
+    monkeypatch.setattr(writequeue, "RETRY_DELAY", 0.01)
+    return calls
+
+
+def test_lock_error_keeps_batch_queued(queue, monkeypatch):
+    calls = lock_on_call(monkeypatch, 1)
+    queue.start()
+    submit(queue, "income", 40)
+
+    assert queue.flush(10)
+    assert calls == [1, 1]
+    assert (queue.stats["errors"], queue.stats["rejected"], queue.stats["committed"]) == (1, 0, 1)
+    assert balance() == 40
+
+
+def test_lock_error_while_posting_entries_one_by_one(queue, monkeypatch):
+    # The overdraft sends the batch down the per-entry path, where the
+    # second entry then meets a lock: it must be retried, not rejected.
+    add_income(50)
+    calls = lock_on_call(monkeypatch, 3)
+    queue.start()
+    submit(queue, "expense", 80)
+    submit(queue, "expense", 30)
+
+    assert queue.flush(10)
+    assert (queue.stats["errors"], queue.stats["rejected"], queue.stats["committed"]) == (1, 1, 1)
+    assert [r["amount"] for r in queue.rejections] == [80]
+    assert balance() == 20
+    assert ledger.reconcile() == {}
+
+
+def test_mysql_lock_errors_are_transient():
+    errors = pytest.importorskip("mysql.connector.errors")
+    backend = db.MySQLBackend()
+
+    assert backend.is_transient(errors.InternalError(msg="Deadlock found", errno=1213))
+    assert backend.is_transient(errors.DatabaseError(msg="Lock wait timeout exceeded", errno=1205))
+    assert backend.is_transient(errors.OperationalError(msg="Lost connection", errno=2013))
+    assert not backend.is_transient(errors.DataError(msg="Data too long", errno=1406))
+    assert not backend.is_transient(errors.IntegrityError(msg="Column cannot be null", errno=1048))
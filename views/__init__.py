@@ -0,0 +1,32 @@
+import importlib
+import os
+
+# --- Pages --- #
+# Each menu entry lives in its own module under views/, imported the first
+# time someone opens it. Streamlit re-runs main.py on every interaction, so
+# anything main.py imports is paid for by the login page too; plotly
+# (views.analysis), reportlab (pdfreport, via reports) and the importer's
+# pandas/openpyxl (views.bulk_import) load only with the pages that use them.
+
+RECEIPT_PORT = int(os.environ.get("FUNDS_RECEIPT_PORT", "0"))
+RECEIPT_URL = os.environ.get("FUNDS_RECEIPT_URL") or (f"http://localhost:{RECEIPT_PORT}" if RECEIPT_PORT else "")
+
+# Menu entry -> (module, function)
+PAGES = {
+    "Add Income": ("entry", "add_income"),
+    "Add Expense": ("entry", "add_expense"),
+    "Bulk Import": ("bulk_import", "render"),
+    "View Transactions": ("transactions", "view"),
+    "Generate Report": ("transactions", "generate_report"),
+    "Financial Analysis": ("analysis", "render"),
+    "Funds": ("admin", "funds"),
+    "Fiscal Close": ("admin", "fiscal_close"),
+    "Performance": ("admin", "performance"),
+}
+
+ADMIN_PAGES = {"Funds", "Fiscal Close", "Performance"}
+
+
+def show(choice, scope):
+    module, function = PAGES[choice]
+    getattr(importlib.import_module(f"views.{module}"), function)(scope)
@@ -0,0 +1,138 @@
+import pandas as pd
+import streamlit as st
+
+import cache
+import db
+import explain
+import fiscal
+import metrics
+import tenants
+
+# --- Streamlit UI --- #
+def funds(scope):
+    st.subheader("Institutions and Funds")
+    st.write("Each campus keeps its own funds; transactions and balances are recorded per fund, "
+             "and users tied to a campus only see that campus's funds.")
+    st.dataframe(tenants.list_funds(), hide_index=True)
+
+    institution_names = tenants.institution_names()
+    col1, col2 = st.columns(2)
+    with col1:
+        with st.form("institution_form"):
+            st.markdown("### Add Campus")
+            code = st.text_input("Code")
+            name = st.text_input("Name")
+            if st.form_submit_button("Add Campus"):
+                try:
+                    tenants.create_institution(code, name)
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    st.success(f"Added {name}")
+                    st.rerun()
+    with col2:
+        with st.form("fund_form"):
+            st.markdown("### Add Fund")
+            institution_id = st.selectbox("Campus", list(institution_names), format_func=institution_names.get)
+            name = st.text_input("Fund Name")
+            purpose = st.selectbox("Purpose", tenants.FUND_PURPOSES)
+            if st.form_submit_button("Add Fund"):
+                try:
+                    tenants.create_fund(institution_id, name, purpose)
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    st.success(f"Added {name}")
+                    st.rerun()
+
+    with st.form("assign_form"):
+        st.markdown("### Assign User to Campus")
+        username = st.text_input("Username")
+        institution_id = st.selectbox("Campus", [None] + list(institution_names),
+                                      format_func=lambda i: "All campuses" if i is None else institution_names[i])
+        if st.form_submit_button("Assign"):
+            try:
+                tenants.assign_user(username, institution_id)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.success(f"{username} now sees {'all campuses' if institution_id is None else institution_names[institution_id]}")
+
+def fiscal_close(scope):
+    st.subheader("Fiscal Year Close")
+    st.write("Closing a year snapshots its closing balances and category totals and moves its "
+             "transactions to the archive. Archived rows are only shown when "
+             "\"Include closed fiscal years\" is ticked.")
+
+    periods = fiscal.closed_periods()
+    if periods.empty:
+        st.info("No fiscal year has been closed yet.")
+    else:
+        st.dataframe(periods.assign(fiscal_year=periods["fiscal_year"].map(fiscal.label)), hide_index=True)
+        year = st.selectbox("Closing snapshot", periods["fiscal_year"].tolist()[::-1], format_func=fiscal.label)
+        balances, totals = fiscal.closing_snapshot(year)
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            st.dataframe(balances, hide_index=True)
+        with col2:
+            st.dataframe(totals, hide_index=True)
+
+    next_year = fiscal.next_closable()
+    if next_year is None:
+        st.caption("No ended fiscal year with open transactions.")
+    else:
+        start, end = fiscal.period(next_year)
+        st.markdown(f"### Close {fiscal.label(next_year)} ({start} to {end})")
+        allow_pending = st.checkbox("Close even if some transactions are still Pending")
+        if st.button(f"Close {fiscal.label(next_year)}"):
+            try:
+                with st.spinner("Closing..."):
+                    result = fiscal.close_year(next_year, st.session_state.user_id, allow_pending)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.success(
+                    f"Closed {fiscal.label(next_year)}: archived {result['income_rows']:,} income and "
+                    f"{result['expense_rows']:,} expense rows."
+                )
+
+def performance(scope):
+    st.subheader("Performance")
+
+    st.markdown("### Recent Page Runs")
+    st.dataframe(pd.DataFrame(metrics.recent_runs()), hide_index=True)
+
+    st.markdown("### Hot Paths")
+    st.dataframe(pd.DataFrame(metrics.summary()), hide_index=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("### Connection Pool")
+        pool = db.get_pool()
+        st.write(f"Backend: {pool.backend.name} / Size: {pool.size}")
+        st.json(pool.stats)
+    with col2:
+        st.markdown("### Query Cache")
+        stats = cache.stats()
+        st.write(f"Hits: {stats['hits']:,} / Misses: {stats['misses']:,} ({stats['hit_ratio']:.0%} hit ratio)")
+        st.write(f"Entries: {stats['size']:,} / Invalidations: {stats['invalidations']:,} / Evictions: {stats['evictions']:,}")
+
+    with st.expander("Prometheus Metrics"):
+        text = metrics.prometheus_text()
+        st.code(text, language="text")
+        st.download_button("Download Metrics", text, "metrics.txt", "text/plain")
+
+    with st.expander("Query Plans"):
+        if st.button("Check for Full Scans"):
+            findings = explain.check()
+            unexpected = [finding for finding in findings if not finding["expected"]]
+            if unexpected:
+                st.warning(f"{len(unexpected)} unexpected full table scan(s)")
+            else:
+                st.success("No unexpected full table scans")
+            if findings:
+                st.dataframe(pd.DataFrame(findings), hide_index=True)
+
+    if st.button("Reset Metrics"):
+        metrics.reset()
+        st.rerun()
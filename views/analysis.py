@@ -0,0 +1,205 @@
+import plotly.express as px
+import streamlit as st
+
+import analytics
+import cache
+import metrics
+import queries
+import reports
+import rollups
+
+# --- Financial Analysis Functions --- #
+@metrics.timed("get_income_breakdown")
+@cache.cached(tags=("income",))
+def get_income_breakdown(fund_ids=None):
+    return rollups.breakdown("income", fund_ids=fund_ids)
+
+@metrics.timed("get_expense_breakdown")
+@cache.cached(tags=("expenses",))
+def get_expense_breakdown(fund_ids=None):
+    return rollups.breakdown("expense", fund_ids=fund_ids)
+
+# --- Streamlit UI --- #
+def render(scope):
+    st.subheader("Financial Analysis")
+
+    income_colors = ['#2ecc71', '#27ae60', '#16a085']
+    expense_colors = ['#e74c3c', '#c0392b', '#d35400', '#e67e22', '#f39c12']
+
+    with st.container():
+        st.markdown("### Income Sources Breakdown")
+        income_df = get_income_breakdown(scope)
+
+        if not income_df.empty:
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                with metrics.span("plotly.income_pie"):
+                    fig_income = px.pie(
+                        income_df,
+                        values='total_amount',
+                        names='type',
+                        color_discrete_sequence=income_colors,
+                        hole=0.4,
+                        title="Income Distribution"
+                    )
+                    fig_income.update_traces(
+                        textposition='inside',
+                        textinfo='percent+label+value',
+                        hovertemplate="<b>%{label}</b><br>Amount: Rs.%{value:,.2f}<br>%{percent}",
+                        pull=[0.1 if i == income_df['total_amount'].idxmax() else 0 for i in range(len(income_df))],
+                        marker=dict(line=dict(color='#FFFFFF', width=2))
+                    )
+                st.plotly_chart(fig_income, use_container_width=True)
+
+            with col2:
+                income_df = income_df.rename(columns={
+                    'type': 'Source',
+                    'total_amount': 'Amount (Rs.)'
+                })
+                income_df['Percentage'] = (income_df['Amount (Rs.)'] / income_df['Amount (Rs.)'].sum() * 100).round(1)
+                st.dataframe(
+                    income_df.style.format({
+                        'Amount (Rs.)': 'Rs.{:,.2f}',
+                        'Percentage': '{:.1f}%'
+                    }).background_gradient(cmap='Greens'),
+                    height=300,
+                    hide_index=True
+                )
+        else:
+            st.warning("No income data available")
+
+    st.markdown("---")
+
+    with st.container():
+        st.markdown("### Expenses Breakdown")
+        expense_df = get_expense_breakdown(scope)
+
+        if not expense_df.empty:
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                with metrics.span("plotly.expense_pie"):
+                    fig_expense = px.pie(
+                        expense_df,
+                        values='total_amount',
+                        names='type',
+                        color_discrete_sequence=expense_colors,
+                        hole=0.4,
+                        title="Expense Distribution"
+                    )
+                    fig_expense.update_traces(
+                        textposition='inside',
+                        textinfo='percent+label+value',
+                        hovertemplate="<b>%{label}</b><br>Amount: Rs.%{value:,.2f}<br>%{percent}",
+                        pull=[0.1 if i == expense_df['total_amount'].idxmax() else 0 for i in range(len(expense_df))],
+                        marker=dict(line=dict(color='#FFFFFF', width=2))
+                    )
+                st.plotly_chart(fig_expense, use_container_width=True)
+
+            with col2:
+                expense_df = expense_df.rename(columns={
+                    'type': 'Category',
+                    'total_amount': 'Amount (Rs.)'
+                })
+                expense_df['Percentage'] = (expense_df['Amount (Rs.)'] / expense_df['Amount (Rs.)'].sum() * 100).round(1)
+                st.dataframe(
+                    expense_df.style.format({
+                        'Amount (Rs.)': 'Rs.{:,.2f}',
+                        'Percentage': '{:.1f}%'
+                    }).background_gradient(cmap='Reds'),
+                    height=300,
+                    hide_index=True
+                )
+        else:
+            st.warning("No expense data available")
+
+    st.markdown("---")
+
+    with st.container():
+        st.markdown("### Cash Flow Trends")
+        frequency = st.radio("Period", list(analytics.FREQUENCIES), horizontal=True)
+        flow = analytics.cash_flow(analytics.FREQUENCIES[frequency], scope)
+
+        if not flow.empty:
+            with metrics.span("plotly.cash_flow"):
+                fig_flow = px.bar(
+                    flow.reset_index(),
+                    x='date',
+                    y=['income', 'expense'],
+                    barmode='group',
+                    color_discrete_sequence=[income_colors[0], expense_colors[0]],
+                    labels={'value': 'Amount (Rs.)', 'date': '', 'variable': ''},
+                    title=f"{frequency} Income vs Expenses"
+                )
+                fig_flow.add_scatter(x=flow.index, y=flow['net'], mode='lines', name='net')
+            st.plotly_chart(fig_flow, use_container_width=True)
+
+            forecast_months = st.slider("Forecast months", 1, 12, 6)
+            forecast = analytics.forecast_balance(forecast_months, scope)
+            monthly = flow if frequency == "Monthly" else analytics.cash_flow("MS", scope)
+            with metrics.span("plotly.balance"):
+                fig_balance = px.line(
+                    monthly.reset_index(),
+                    x='date',
+                    y='balance',
+                    labels={'balance': 'Balance (Rs.)', 'date': ''},
+                    title="Running Balance and Forecast"
+                )
+                if not forecast.empty:
+                    fig_balance.add_scatter(x=forecast.index, y=forecast['balance'], mode='lines',
+                                            name='forecast', line=dict(dash='dash'))
+                    fig_balance.add_scatter(x=forecast.index, y=forecast['upper'], mode='lines',
+                                            line=dict(width=0), showlegend=False)
+                    fig_balance.add_scatter(x=forecast.index, y=forecast['lower'], mode='lines',
+                                            line=dict(width=0), fill='tonexty', name='forecast range')
+            st.plotly_chart(fig_balance, use_container_width=True)
+        else:
+            st.warning("No transactions available for trends")
+
+        col1, col2 = st.columns(2)
+        for column, transaction_type, scale in ((col1, "income", "Greens"), (col2, "expense", "Reds")):
+            with column:
+                heatmap = analytics.department_heatmap(transaction_type, scope)
+                if not heatmap.empty:
+                    with metrics.span("plotly.heatmap"):
+                        fig_heatmap = px.imshow(
+                            heatmap,
+                            text_auto='.3s',
+                            aspect='auto',
+                            color_continuous_scale=scale,
+                            title=f"{transaction_type.title()} by Department and Type"
+                        )
+                    st.plotly_chart(fig_heatmap, use_container_width=True)
+
+    with st.expander("Generate PDF Report"):
+        st.write("Create a detailed financial report in PDF format")
+        report_title = st.text_input("Report Title", "University Financial Report")
+
+        include_details = st.checkbox("Include department, monthly and transaction sections", value=True)
+
+        if st.button("Generate PDF Report"):
+            if not income_df.empty or not expense_df.empty:
+                st.session_state.report_job = reports.submit_report(
+                    report_title, include_details, queries.make_filters(fund_ids=scope)
+                )
+                st.session_state.report_name = f"{report_title.replace(' ', '_')}.pdf"
+            else:
+                st.warning("No financial data available to generate report")
+
+        job_id = st.session_state.get("report_job")
+        if job_id:
+            status = reports.job_status(job_id)
+            if status in ("queued", "running"):
+                st.info(f"PDF report is {status}...")
+                st.button("Refresh Status")
+            elif status == "done":
+                st.success("PDF report generated successfully!")
+                st.download_button(
+                    "Download PDF Report",
+                    reports.job_result(job_id),
+                    st.session_state.report_name,
+                    "application/pdf"
+                )
+            elif status == "failed":
+                st.error(f"PDF report failed: {reports.job_error(job_id)}")
+                st.session_state.report_job = None
+
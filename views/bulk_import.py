@@ -0,0 +1,40 @@
+import streamlit as st
+
+import importer
+from views.session import fund_picker
+
+# --- Streamlit UI --- #
+def render(scope):
+    st.subheader("Bulk Import")
+    st.write("Upload a CSV or Excel file with the columns: name, type, description, amount, date, department, status "
+             "(plus transaction_type when the file mixes income and expenses).")
+    kind = st.selectbox("Records", ["income", "expense", "From transaction_type column"])
+    fund_id = fund_picker("Import into fund", "import_fund")
+    uploaded = st.file_uploader("File", type=["csv", "xlsx"])
+
+    if uploaded is not None and fund_id is not None and st.button("Import"):
+        progress = st.empty()
+        try:
+            with st.spinner("Importing..."):
+                stats, rejected = importer.run_import(
+                    uploaded, kind if kind in ("income", "expense") else None,
+                    st.session_state.user_id, filename=uploaded.name,
+                    progress=lambda s: progress.write(f"{s['read']:,} rows read, {s['imported']:,} imported"),
+                    fund_id=fund_id
+                )
+        except ValueError as e:
+            st.error(f"Import failed: {e}")
+        else:
+            st.success(
+                f"Imported {stats['imported']:,} of {stats['read']:,} rows in {stats['seconds']:.1f}s "
+                f"({stats['rows_per_second']:,.0f} rows/s)"
+            )
+            if not rejected.empty:
+                st.warning(f"{stats['rejected']:,} rows were rejected")
+                st.dataframe(rejected, hide_index=True)
+                st.download_button(
+                    "Download Rejected Rows",
+                    rejected.to_csv(index=False),
+                    "rejected_rows.csv",
+                    "text/csv"
+                )
@@ -0,0 +1,119 @@
+from datetime import datetime
+
+import streamlit as st
+
+import constants
+import ledger
+import metrics
+import receipts
+import tenants
+import writequeue
+from views.session import fund_picker
+
+# --- Transaction Functions --- #
+@metrics.timed("insert_income")
+def insert_income(name, user_id, i_type, description, amount, date, department, status, receipt_path=None,
+                  fund_id=ledger.FUND_ID):
+    try:
+        tenants.check_fund(fund_id, st.session_state.get("institution_id"))
+        if writequeue.ENABLED:
+            writequeue.get_queue().submit(
+                "income", name, user_id, i_type, description, amount, date, department, status, receipt_path,
+                fund_id
+            )
+            return True
+        ledger.record_income(name, user_id, i_type, description, amount, date, department, status, receipt_path,
+                             fund_id)
+        return True
+    except (ledger.PeriodClosed, ledger.UnknownFund) as e:
+        st.error(f"Transaction failed: {e}")
+        return False
+    except Exception as e:
+        st.error(f"Error inserting income: {e}")
+        return False
+
+@metrics.timed("insert_expense")
+def insert_expense(name, user_id, e_type, description, amount, date, department, status, receipt_path=None,
+                   fund_id=ledger.FUND_ID):
+    try:
+        tenants.check_fund(fund_id, st.session_state.get("institution_id"))
+        if writequeue.ENABLED:
+            # Journaled now; the balance check happens when the batch commits.
+            writequeue.get_queue().submit(
+                "expense", name, user_id, e_type, description, amount, date, department, status, receipt_path,
+                fund_id
+            )
+            return True
+        ledger.record_expense(name, user_id, e_type, description, amount, date, department, status, receipt_path,
+                              fund_id)
+        return True
+    except (ledger.InsufficientFunds, ledger.PeriodClosed, ledger.UnknownFund) as e:
+        st.error(f"Transaction failed: {e}")
+        return False
+    except Exception as e:
+        st.error(f"Error inserting expense: {e}")
+        return False
+
+def store_receipt(uploaded):
+    # Returns (ok, receipt key or None); the form is not submitted if storing fails.
+    if uploaded is None:
+        return True, None
+    try:
+        return True, receipts.store(uploaded, uploaded.name)
+    except (ValueError, OSError) as e:
+        st.error(f"Could not store receipt: {e}")
+        return False, None
+
+# --- Streamlit UI --- #
+def add_income(scope):
+    st.subheader("Add New Income")
+    with st.form("income_form"):
+        fund_id = fund_picker("Fund", "income_fund")
+        name = st.text_input("Full Name")
+        i_type = st.selectbox("Income Type", constants.INCOME_TYPES)
+        description = st.text_area("Description")
+        amount = st.number_input("Amount (Rs.)", min_value=0.0)
+        date = st.date_input("Date", value=datetime.today())
+        department = st.selectbox("Department", constants.DEPARTMENTS)
+        status = st.selectbox("Status", constants.INCOME_STATUSES)
+        receipt = st.file_uploader("Receipt (optional)", type=receipts.EXTENSIONS)
+
+        if st.form_submit_button("Submit"):
+            if name and fund_id is not None:
+                stored, receipt_path = store_receipt(receipt)
+                success = stored and insert_income(
+                    name, st.session_state.user_id, i_type,
+                    description, amount, date, department, status, receipt_path, fund_id
+                )
+                if success:
+                    st.success("Income record queued!" if writequeue.ENABLED else "Income record added successfully!")
+                    st.rerun()
+            else:
+                st.warning("Please enter name")
+
+def add_expense(scope):
+    st.subheader("Add New Expense")
+    with st.form("expense_form"):
+        fund_id = fund_picker("Fund", "expense_fund")
+        name = st.text_input("Full Name")
+        e_type = st.selectbox("Expense Type", constants.EXPENSE_TYPES)
+        description = st.text_area("Description")
+        amount = st.number_input("Amount (Rs.)", min_value=0.0)
+        date = st.date_input("Date", value=datetime.today())
+        department = st.selectbox("Department", constants.DEPARTMENTS)
+        status = st.selectbox("Status", constants.EXPENSE_STATUSES)
+        receipt = st.file_uploader("Receipt (optional)", type=receipts.EXTENSIONS)
+
+        if st.form_submit_button("Submit"):
+            if name and fund_id is not None:
+                # The balance check happens atomically inside insert_expense.
+                stored, receipt_path = store_receipt(receipt)
+                success = stored and insert_expense(
+                    name, st.session_state.user_id, e_type,
+                    description, amount, date, department, status, receipt_path, fund_id
+                )
+                if success:
+                    st.success("Expense record queued!" if writequeue.ENABLED else "Expense record added successfully!")
+                    st.rerun()
+            else:
+                st.warning("Please enter name")
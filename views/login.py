@@ -0,0 +1,73 @@
+import streamlit as st
+
+import auth
+import db
+import metrics
+import tenants
+
+# --- User Functions --- #
+@metrics.timed("add_user")
+def add_user(username, password, role='accountant', institution_id=None):
+    try:
+        auth.create_user(username, password, role, institution_id)
+        return True
+    except db.integrity_errors():
+        st.warning("Username already exists.")
+        return False
+    except auth.AuthBusy as e:
+        st.warning(str(e))
+        return False
+
+def get_client_ip():
+    context = getattr(st, "context", None)
+    if context is None:
+        return None
+    forwarded = (context.headers or {}).get("X-Forwarded-For", "")
+    return auth.client_ip(forwarded, getattr(context, "ip_address", None))
+
+@metrics.timed("login_user")
+def login_user(username, password):
+    try:
+        return auth.authenticate(username, password, get_client_ip())
+    except (auth.LoginThrottled, auth.AuthBusy) as e:
+        st.error(str(e))
+        return False
+
+# --- Streamlit UI --- #
+def render():
+    auth_option = st.sidebar.radio("Select", ["Login", "Register"])
+
+    if auth_option == "Register":
+        st.subheader("Register New Account")
+        with st.form("register_form"):
+            username = st.text_input("Username")
+            password = st.text_input("Password", type="password")
+            role = st.selectbox("Role", ["accountant", "viewer"])
+            institutions = tenants.institution_names()
+            institution_id = st.selectbox("Campus", list(institutions), format_func=institutions.get)
+
+            if st.form_submit_button("Register"):
+                if username and password:
+                    if add_user(username, password, role, institution_id):
+                        st.success("Registration successful! Please login.")
+                else:
+                    st.warning("Username and password are required")
+
+    else:
+        st.subheader("User Login")
+        with st.form("login_form"):
+            username = st.text_input("Username")
+            password = st.text_input("Password", type="password")
+
+            if st.form_submit_button("Login"):
+                user = login_user(username, password)
+                if user:
+                    st.session_state.logged_in = True
+                    st.session_state.user_id = user[0]
+                    st.session_state.username = user[1]
+                    st.session_state.role = user[2]
+                    st.session_state.institution_id = user[3]
+                    st.success(f"Welcome {user[1]} ({user[2]})!")
+                    st.rerun()
+                elif user is None:
+                    st.error("Invalid credentials")
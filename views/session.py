@@ -0,0 +1,23 @@
+import streamlit as st
+
+import tenants
+
+# --- Funds --- #
+def fund_scope():
+    # Funds the current page reads: the sidebar choice, else every fund of
+    # the user's institution (None = every fund, for users without one).
+    selected = st.session_state.get("fund_choice")
+    if selected:
+        return (selected,)
+    return tenants.fund_scope(st.session_state.get("institution_id"))
+
+def fund_picker(label, key):
+    # The fund a form posts to, defaulting to the sidebar choice.
+    labels = tenants.fund_labels(st.session_state.get("institution_id"))
+    if not labels:
+        st.warning("No funds have been set up for your institution yet.")
+        return None
+    fund_ids = list(labels)
+    selected = st.session_state.get("fund_choice")
+    index = fund_ids.index(selected) if selected in fund_ids else 0
+    return st.selectbox(label, fund_ids, index=index, format_func=labels.get, key=key)
@@ -0,0 +1,200 @@
+import streamlit as st
+
+import artifacts
+import constants
+import events
+import exporter
+import frames
+import ledger
+import queries
+import receipts
+import reports
+import tenants
+import views
+from views.session import fund_scope
+
+# --- Transaction Views --- #
+def transaction_filters(key):
+    scope = fund_scope()
+    options = queries.get_filter_options(scope)
+    with st.expander("Filter Options"):
+        col1, col2 = st.columns(2)
+        with col1:
+            transaction_type = st.multiselect("Transaction Type", ['income', 'expense'], key=f"{key}_kind")
+            t_type = st.multiselect("Specific Type", options['type'], key=f"{key}_type")
+            department = st.multiselect("Department", options['department'], key=f"{key}_department")
+        with col2:
+            status = st.multiselect("Status", options['status'], key=f"{key}_status")
+            date_range = st.date_input("Date Range", [], key=f"{key}_dates")
+            include_archived = st.checkbox("Include closed fiscal years", key=f"{key}_archived")
+
+    start_date, end_date = (date_range[0], date_range[1]) if len(date_range) == 2 else (None, None)
+    return queries.make_filters(transaction_type, t_type, department, status, start_date, end_date,
+                                include_archived, scope)
+
+def render_receipts(page_df, key):
+    keys = list(zip(page_df['transaction_type'].astype(str), page_df['id']))
+    stored = {k: path for k, path in queries.fetch_receipts(keys).items() if receipts.exists(path)}
+    if not stored:
+        st.caption("No receipts on this page")
+        return
+    choice = st.selectbox(
+        "Receipt", list(stored), key=f"{key}_receipt_choice",
+        format_func=lambda k: f"{k[0].title()} #{k[1]}"
+    )
+    receipt_path = stored[choice]
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        thumbnail = receipts.thumbnail(receipt_path)
+        if thumbnail:
+            st.image(thumbnail)
+        else:
+            st.caption("No preview available")
+    with col2:
+        if views.RECEIPT_URL:
+            # Served with range support and immutable caching by receipts.serve().
+            st.link_button("Open Receipt", f"{views.RECEIPT_URL}/receipts/{receipt_path}")
+        elif st.button("Prepare Download", key=f"{key}_receipt_download"):
+            with open(receipts.path_for(receipt_path), "rb") as f:
+                st.download_button("Download Receipt", f, receipt_path, receipts.content_type(receipt_path))
+
+def render_transactions(key):
+    filters = transaction_filters(key)
+
+    # Start again from the first page whenever the filters change.
+    pages_key = f"{key}_pages"
+    if st.session_state.get(f"{key}_filters") != filters:
+        st.session_state[f"{key}_filters"] = filters
+        st.session_state[pages_key] = [None]
+    pages = st.session_state[pages_key]
+
+    page_size = st.selectbox("Rows per page", [25, 50, 100, 250], index=1, key=f"{key}_page_size")
+    page_df, next_cursor = queries.fetch_page(filters, after=pages[-1], page_size=page_size)
+    page_df = frames.for_display(page_df)
+    if st.checkbox("Show descriptions", key=f"{key}_descriptions"):
+        keys = list(zip(page_df['transaction_type'].astype(str), page_df['id']))
+        descriptions = queries.fetch_descriptions(keys)
+        page_df.insert(4, 'description', [descriptions.get((kind, int(row_id))) for kind, row_id in keys])
+    st.dataframe(page_df)
+    if st.checkbox("Show receipts", key=f"{key}_receipts"):
+        render_receipts(page_df, key)
+
+    col1, col2, col3 = st.columns([1, 1, 4])
+    with col1:
+        if st.button("Previous", key=f"{key}_prev", disabled=len(pages) == 1):
+            pages.pop()
+            st.rerun()
+    with col2:
+        if st.button("Next", key=f"{key}_next", disabled=next_cursor is None):
+            pages.append(next_cursor)
+            st.rerun()
+    with col3:
+        st.caption(f"Page {len(pages)}")
+
+    summary = queries.summarize(filters)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Total Amount", f"Rs.{summary['total_amount']:,.2f}")
+    with col2:
+        st.metric("Matching Transactions", f"{summary['count']:,}")
+    with col3:
+        fmt = st.selectbox("Export Format", list(exporter.FORMATS), key=f"{key}_export_format")
+        if st.button("Prepare Export", key=f"{key}_prepare_export"):
+            mime, extension = exporter.FORMATS[fmt]
+            try:
+                export_file, row_count = exporter.export(filters, fmt)
+            except RuntimeError as e:
+                st.error(str(e))
+            else:
+                with export_file:
+                    st.download_button(
+                        f"Download {row_count:,} rows",
+                        export_file,
+                        f"transactions_report{extension}",
+                        mime
+                    )
+
+def render_changes():
+    # Status changes and reversals, within the funds the user may post to.
+    scope = tenants.fund_scope(st.session_state.institution_id)
+    col1, col2 = st.columns(2)
+    kind = col1.selectbox("Transaction Type", ["income", "expense"], format_func=str.title, key="change_kind")
+    transaction_id = int(col2.number_input("Transaction ID", min_value=1, step=1, key="change_id"))
+
+    history = events.history(kind, transaction_id, scope)
+    if history.empty:
+        st.caption("No recorded changes for this transaction.")
+    else:
+        st.dataframe(history.drop(columns=["detail"]), hide_index=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        with st.form("status_form"):
+            status = st.selectbox("New Status", constants.STATUSES[kind])
+            if st.form_submit_button("Update Status"):
+                try:
+                    ledger.set_status(kind, transaction_id, status, st.session_state.user_id, scope)
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    st.success(f"{kind.title()} {transaction_id} marked {status}")
+                    st.rerun()
+    with col2:
+        with st.form("reverse_form"):
+            reason = st.text_input("Reason for reversal")
+            if st.form_submit_button("Reverse Transaction"):
+                try:
+                    ledger.reverse(kind, transaction_id, reason, st.session_state.user_id, scope)
+                except (ValueError, ledger.InsufficientFunds) as e:
+                    st.error(str(e))
+                else:
+                    st.success(f"{kind.title()} {transaction_id} reversed")
+                    st.rerun()
+
+def render_prebuilt(scope):
+    # Reports the scheduler keeps built; fresh ones download straight from disk.
+    col1, col2, col3 = st.columns(3)
+    kind = col1.selectbox("Period", artifacts.KINDS, format_func=str.title, key="prebuilt_kind")
+    periods = [period for k, period in reversed(artifacts.due_periods()) if k == kind]
+    period = col2.selectbox("Report", periods, format_func=lambda p: artifacts.label(kind, p), key="prebuilt_period")
+    fmt = col3.selectbox("Format", list(artifacts.FORMATS), format_func=str.upper, key="prebuilt_format")
+
+    artifact = artifacts.fresh(kind, period, fmt, scope)
+    if artifact is None:
+        # Built on the report worker pool, like on-demand PDFs; a fiscal-year
+        # report can take a while. Sessions asking for the same artifact
+        # share one job.
+        job_id = f"artifact:{kind}:{period}:{fmt}:{artifacts.scope_key(scope)}"
+        status = reports.job_status(job_id)
+        if status in ("queued", "running"):
+            st.info(f"Report is {status}...")
+            st.button("Refresh Status", key="prebuilt_refresh")
+            return
+        if status == "failed":
+            st.error(f"Building the report failed: {reports.job_error(job_id)}")
+        st.info("This report has changed since it was last built." if artifacts.lookup(kind, period, fmt, scope)
+                else "This report has not been built yet.")
+        if st.button("Build Report"):
+            reports.submit_job(f"{kind} report {period}", artifacts.build, kind, period, fmt, scope, job_id=job_id)
+            st.rerun()
+        return
+    st.caption(f"Built {artifact['generated_at']} from {artifact['row_count']:,} transactions")
+    with open(artifact["path"], "rb") as f:
+        st.download_button(
+            f"Download {fmt.upper()}", f,
+            f"{kind}_report_{period}{artifacts.FORMATS[fmt][1]}", artifacts.FORMATS[fmt][0]
+        )
+
+# --- Streamlit UI --- #
+def view(scope):
+    st.subheader("All Transactions")
+    render_transactions("view")
+    if st.session_state.role != 'viewer':
+        with st.expander("Update or Reverse a Transaction"):
+            render_changes()
+
+def generate_report(scope):
+    st.subheader("Transaction Summary Report")
+    with st.expander("Prebuilt Reports", expanded=True):
+        render_prebuilt(scope)
+    render_transactions("report")
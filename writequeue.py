@@ -0,0 +1,355 @@
+import argparse
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import date
+from decimal import Decimal
+
+import cache
+import db
+import events
+import ledger
+import metrics
+import rollups
+import schema
+
+# --- Write-Behind Queue --- #
+# Optional (FUNDS_WRITE_QUEUE=1). A submitted transaction is appended to a
+# local journal and fsynced, then acknowledged; a single worker thread commits
+# whatever has accumulated as one database transaction with one adjustment
+# per (fund, department) and one update per fund. The highest committed journal
+# sequence number is stored in `journal_checkpoints` inside that same
+# transaction, so replaying the journal after a crash applies every entry
+# exactly once.
+#
+# Because balances are checked at commit time, an expense can be accepted
+# into the journal and later rejected for insufficient funds; rejections are
+# kept for the submitting user to see.
+
+ENABLED = os.environ.get("FUNDS_WRITE_QUEUE", "0") == "1"
+JOURNAL_PATH = os.environ.get("FUNDS_JOURNAL_PATH", os.path.join("journal", "writes.log"))
+BATCH_SIZE = int(os.environ.get("FUNDS_WRITE_BATCH_SIZE", "500"))
+FLUSH_INTERVAL = float(os.environ.get("FUNDS_WRITE_FLUSH_INTERVAL", "0.2"))
+FSYNC = os.environ.get("FUNDS_JOURNAL_FSYNC", "1") == "1"
+COMPACT_BYTES = 1024 * 1024
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 30.0
+
+FIELDS = ("name", "user_id", "type", "description", "amount", "date", "department", "status", "receipt_path",
+          "fund_id")
+
+UPSERT_CHECKPOINT = {
+    "mysql": """
+        INSERT INTO journal_checkpoints (journal, last_seq) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE last_seq = GREATEST(last_seq, VALUES(last_seq))
+    """,
+    "sqlite": """
+        INSERT INTO journal_checkpoints (journal, last_seq) VALUES (%s, %s)
+        ON CONFLICT(journal) DO UPDATE SET last_seq = MAX(last_seq, excluded.last_seq)
+    """,
+}
+
+
+def _encode(seq, kind, row):
+    row = dict(zip(FIELDS, row))
+    row["amount"] = str(Decimal(str(row["amount"])).quantize(ledger.CENT))
+    row["date"] = str(row["date"])[:10]
+    return json.dumps({"seq": seq, "kind": kind, "row": row}, separators=(",", ":")) + "\n"
+
+
+def _decode(line):
+    entry = json.loads(line)
+    row = entry["row"]
+    row["amount"] = Decimal(row["amount"])
+    row["date"] = date.fromisoformat(row["date"])
+    # Journals written before funds existed posted to the default fund.
+    row.setdefault("fund_id", ledger.FUND_ID)
+    return entry
+
+
+def read_journal(path):
+    # A crash mid-append can leave a torn last line; it was never acknowledged.
+    entries = []
+    if not os.path.exists(path):
+        return entries
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entries.append(_decode(line))
+            except (ValueError, KeyError):
+                break
+    return entries
+
+
+def last_checkpoint(name):
+    row = db.fetch_one("SELECT last_seq FROM journal_checkpoints WHERE journal = %s", (name,))
+    return int(row[0]) if row else 0
+
+
+def apply_entries(cursor, entries):
+    # Inserts, rollups and balances for a batch; the caller records the checkpoint.
+    rollup = defaultdict(lambda: [Decimal(0), 0])
+    deltas = defaultdict(Decimal)
+    inserted = {}
+    for kind in ("income", "expense"):
+        rows = [entry["row"] for entry in entries if entry["kind"] == kind]
+        if not rows:
+            continue
+        inserted[kind] = (events.last_id(cursor, kind), len(rows))
+        cursor.executemany(ledger.INSERT_TRANSACTION[kind], [tuple(row[field] for field in FIELDS) for row in rows])
+        for row in rows:
+            key = (row["fund_id"], kind, row["type"], row["department"], row["status"], rollups.month_of(row["date"]))
+            rollup[key][0] += row["amount"]
+            rollup[key][1] += 1
+            deltas[(row["fund_id"], row["department"])] += row["amount"] if kind == "income" else -row["amount"]
+    rollups.apply_many(cursor, [(*key, total, count) for key, (total, count) in rollup.items()])
+    ledger.post_batch(cursor, dict(deltas))
+    ledger.ensure_open(cursor, min(entry["row"]["date"] for entry in entries))
+    # After the fund lock, as in importer.load_batch.
+    for kind, (after_id, count) in inserted.items():
+        events.record_inserts(cursor, kind, after_id, count)
+
+
+class WriteQueue:
+    def __init__(self, path=JOURNAL_PATH, name=None, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.name = name or os.path.basename(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._pending = deque()
+        self._in_flight = 0
+        self._next_seq = None
+        self._file = None
+        self._thread = None
+        self._stopping = False
+        self.rejections = deque(maxlen=1000)
+        self.stats = {"queued": 0, "committed": 0, "batches": 0, "rejected": 0, "recovered": 0, "errors": 0}
+        self.last_error = None
+
+    # --- Lifecycle --- #
+    def recover(self):
+        # Re-queue journaled entries the database has not seen yet.
+        schema.ensure_schema()
+        applied = last_checkpoint(self.name)
+        entries = read_journal(self.path)
+        missing = [entry for entry in entries if entry["seq"] > applied]
+        with self._lock:
+            self._pending.extend(missing)
+            self._next_seq = max([applied] + [entry["seq"] for entry in entries]) + 1
+            self.stats["recovered"] += len(missing)
+        return len(missing)
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self.recover()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Drop a torn tail before appending after it.
+        if os.path.exists(self.path):
+            with open(self.path, "rb+") as f:
+                data = f.read()
+                f.truncate(data.rfind(b"\n") + 1)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        with self._lock:
+            self._stopping = True
+            self._changed.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def flush(self, timeout=None):
+        # Block until everything submitted so far is committed (or rejected).
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+        return True
+
+    # --- Producers --- #
+    def submit(self, kind, name, user_id, t_type, description, amount, date, department, status, receipt_path=None,
+               fund_id=ledger.FUND_ID):
+        if kind not in ledger.INSERT_TRANSACTION:
+            raise ValueError(f"Unknown transaction kind '{kind}'")
+        row = (name, user_id, t_type, description, amount, date, department, status, receipt_path, fund_id)
+        with self._lock:
+            if self._file is None:
+                raise RuntimeError("Write queue is not running")
+            seq = self._next_seq
+            line = _encode(seq, kind, row)
+            self._file.write(line)
+            self._file.flush()
+            if FSYNC:
+                os.fsync(self._file.fileno())
+            self._next_seq += 1
+            self._pending.append(_decode(line))
+            self.stats["queued"] += 1
+            self._changed.notify_all()
+        return seq
+
+    def depth(self):
+        with self._lock:
+            return len(self._pending) + self._in_flight
+
+    def take_rejections(self, user_id):
+        with self._lock:
+            mine = [r for r in self.rejections if r["user_id"] == user_id]
+            for r in mine:
+                self.rejections.remove(r)
+        return mine
+
+    # --- Worker --- #
+    def _next_batch(self):
+        with self._lock:
+            while not self._pending and not self._stopping:
+                self._changed.wait()
+            if not self._pending:
+                return None
+            # Group commit: give concurrent submitters a moment to join the batch.
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._pending) < self.batch_size and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            self._in_flight = len(batch)
+            return batch
+
+    def _run(self):
+        delay = RETRY_DELAY
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._commit(batch)
+                delay = RETRY_DELAY
+            except Exception as e:
+                # Database unavailable: keep the entries (they are still in the
+                # journal) and try again later.
+                self.last_error = str(e)
+                with self._lock:
+                    self.stats["errors"] += 1
+                    self._pending.extendleft(reversed(batch))
+                    self._in_flight = 0
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+                continue
+            with self._lock:
+                self._in_flight = 0
+                if not self._pending:
+                    self._compact()
+                self._changed.notify_all()
+
+    @metrics.timed("writequeue.commit", rows=None)
+    def _commit(self, batch):
+        # Entries at or below the checkpoint were committed by an attempt that
+        # failed part way (see _commit_each); never apply them twice.
+        applied = last_checkpoint(self.name)
+        batch = [entry for entry in batch if entry["seq"] > applied]
+        if not batch:
+            return
+        try:
+            with db.transaction() as cursor:
+                apply_entries(cursor, batch)
+                cursor.execute(UPSERT_CHECKPOINT[db.backend_name()], (self.name, batch[-1]["seq"]))
+            committed = batch
+        except Exception as e:
+            if db.is_transient(e):
+                raise
+            # Some entry is at fault: an overdraft, a closed year, a missing
+            # fund or a value the database refuses.
+            committed = self._commit_each(batch)
+        with self._lock:
+            self.stats["committed"] += len(committed)
+            self.stats["batches"] += 1
+        cache.invalidate("income", "expenses", "funds", "department_balances")
+
+    def _commit_each(self, batch):
+        # Post entries one at a time so only the offending ones are rejected.
+        # Anything but a connection or lock error that fails an entry on its
+        # own would fail it on every retry, so it is checkpointed past too.
+        committed = []
+        for entry in batch:
+            try:
+                with db.transaction() as cursor:
+                    apply_entries(cursor, [entry])
+                    cursor.execute(UPSERT_CHECKPOINT[db.backend_name()], (self.name, entry["seq"]))
+                committed.append(entry)
+            except Exception as e:
+                if db.is_transient(e):
+                    raise
+                with db.transaction() as cursor:
+                    cursor.execute(UPSERT_CHECKPOINT[db.backend_name()], (self.name, entry["seq"]))
+                with self._lock:
+                    self.stats["rejected"] += 1
+                    self.rejections.append({
+                        "seq": entry["seq"], "user_id": entry["row"]["user_id"], "kind": entry["kind"],
+                        "name": entry["row"]["name"], "amount": entry["row"]["amount"], "reason": str(e),
+                    })
+        return committed
+
+    def _compact(self):
+        # Called with the lock held once every journaled entry is committed.
+        if self._file is not None and self._file.tell() > COMPACT_BYTES:
+            self._file.truncate(0)
+            self._file.seek(0)
+            if FSYNC:
+                os.fsync(self._file.fileno())
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    # Started once per process, replaying anything left from a previous run.
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = WriteQueue().start()
+    return _queue
+
+
+def _queue_metrics():
+    if _queue is None:
+        return []
+    gauges = [("funds_write_queue_depth", {}, _queue.depth())]
+    gauges += [(f"funds_write_queue_{key}", {}, value) for key, value in _queue.stats.items()]
+    return gauges
+
+
+metrics.register_collector(_queue_metrics)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the write-behind journal into the database")
+    parser.add_argument("--journal", default=JOURNAL_PATH)
+    args = parser.parse_args()
+
+    queue = WriteQueue(args.journal).start()
+    print(f"Replaying {queue.stats['recovered']} journaled transactions")
+    queue.flush()
+    queue.stop()
+    print(f"Committed {queue.stats['committed']}, rejected {queue.stats['rejected']}")
+    for rejection in queue.rejections:
+        print(f"  #{rejection['seq']} {rejection['kind']} {rejection['name']}: {rejection['reason']}")
+
+
+if __name__ == "__main__":
+    main()